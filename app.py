@@ -1,14 +1,148 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, stream_with_context
+from dhcp_logic.arp_probe import ARPProber
+from dhcp_logic.bulk import acquire_many, release_many
 from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_transport import DHCPTransport, TransportConfig
+from dhcp_logic.events import DHCPEvent, EventBroker, FAILED
+from dhcp_logic.executor import BoundedExecutor
+from dhcp_logic.interfaces import InterfaceCache
+from dhcp_logic.lease import Lease
+from dhcp_logic.lease_cache import lease_cache
+from dhcp_logic.lease_manager import LeaseManager
+from dhcp_logic.lease_store import LeaseStore
+from dhcp_logic.metrics import REGISTRY
+from dhcp_logic.offer_selection import POLICIES, preferred_servers, requested_ip, server_stats
+from dhcp_logic.packet_transport import PacketTransport
+from dhcp_logic.task_store import MemoryTaskStore, TaskRecord
+from dhcp_logic.virtual_clients import CLIENT_ID_DUID, CLIENT_ID_MAC, VirtualClients, client_id_for
+from dhcp_logic.worker_pool import WorkerPool
+from concurrent.futures import TimeoutError as FutureTimeout
+import functools
+import json
+import logging
 import netifaces
-import threading
+import os
 import uuid
 
 
 app = Flask(__name__)
 
-# use redis caching on production for in-memory storage
-dhcp_tasks = {}
+# the client logs each D-O-R-A step at INFO; DHCP_LOG_LEVEL=WARNING keeps bulk runs quiet
+logging.basicConfig(level=os.environ.get('DHCP_LOG_LEVEL', 'INFO').upper(), format='%(message)s')
+logger = logging.getLogger(__name__)
+
+# ports, interface, source address and SO_REUSEPORT of the shared client socket,
+# so several instances can run per host (see TransportConfig.from_env);
+# DHCP_LINK_LAYER=1 sends raw frames on DHCP_INTERFACE with each client's own MAC
+transport_config = TransportConfig.from_env()
+
+# DHCP_WORKERS > 1 spreads bulk requests over that many processes, sharded by MAC;
+# they bind the client port with SO_REUSEPORT, so this process must as well
+dhcp_workers = int(os.environ.get('DHCP_WORKERS', 1))
+if dhcp_workers > 1:
+    transport_config.reuse_port = True
+
+# bounded, expiring task registry; swap in RedisTaskStore when running several workers
+dhcp_tasks = MemoryTaskStore(max_size=int(os.environ.get('DHCP_MAX_TASKS', 10000)),
+                             ttl=float(os.environ.get('DHCP_TASK_TTL', 3600)))
+
+# state-transition events of every task, streamed to dashboards over SSE
+dhcp_events = EventBroker()
+
+# DHCP_OFFER_WINDOW > 0 waits that many seconds for OFFERs from other servers and picks
+# one with DHCP_OFFER_POLICY (first_arrival or lowest_rtt); the rest are fallbacks on NAK
+offer_window = float(os.environ.get('DHCP_OFFER_WINDOW', 0))
+offer_policy = POLICIES[os.environ.get('DHCP_OFFER_POLICY', 'lowest_rtt')]
+decline_delay = float(os.environ.get('DHCP_DECLINE_DELAY', 10))
+
+# set up by init_app(), in the serving process only
+lease_store = None
+lease_manager = None
+bulk_pool = None
+arp_prober = None
+dhcp_executor = None
+default_mac = None
+
+def _default_mac_address() -> str:
+    default_gateway = netifaces.gateways()['default'][netifaces.AF_INET]
+    interface_name = default_gateway[1]
+    return netifaces.ifaddresses(interface_name)[netifaces.AF_LINK][0]['addr']
+
+def init_app() -> Flask:
+    """
+    Opens the lease journal, resumes renewing its leases and starts the executor, worker
+    pool and ARP prober. Importing this module does none of it, because the spawned
+    DHCP_WORKERS processes import it again; only `python app.py` calls this, once.
+    """
+    global lease_store, lease_manager, bulk_pool, arp_prober, dhcp_executor, default_mac
+    if lease_manager is not None: return app
+
+    DHCPTransport.configure(transport_config, PacketTransport if transport_config.link_layer else None)
+
+    # renews every lease we hold at T1/T2 from a single background thread,
+    # journaling them to disk so a restart resumes renewing instead of losing them
+    lease_store = LeaseStore(os.environ.get('DHCP_LEASE_DIR', 'leases'))
+    lease_manager = LeaseManager(store=lease_store)
+    if lease_manager.restore():
+        lease_manager.start()
+
+    # last lease of every MAC, so asking again for a MAC INIT-REBOOTs instead of a full D-O-R-A;
+    # seeded with the journaled leases so this also holds across restarts
+    for restored in list(lease_manager.leases.values()):
+        lease_cache.put(restored)
+
+    # leases from the DHCP_WORKERS processes still come back here so the lease manager renews them
+    bulk_pool = WorkerPool(workers=dhcp_workers) if dhcp_workers > 1 else None
+
+    # DHCP_ARP_PROBE=1 ARP-probes every ACKed address on DHCP_INTERFACE before using it and
+    # DECLINEs it if another host answers, asking again after DHCP_DECLINE_DELAY seconds;
+    # bulk runs probe all their leases together. Not done by DHCP_WORKERS processes.
+    if os.environ.get('DHCP_ARP_PROBE', '').lower() in ('1', 'true', 'yes'):
+        try:
+            arp_prober = ARPProber(transport_config.interface, wait=float(os.environ.get('DHCP_ARP_WAIT', 1.0))).open()
+        except OSError as ex:
+            logger.warning("[!] ARP probing disabled: %s", ex)
+
+    # runs DHCP exchanges on a fixed pool of threads; beyond DHCP_MAX_WORKERS running and
+    # DHCP_MAX_QUEUED waiting, requests are refused with 429 instead of spawning threads
+    dhcp_executor = BoundedExecutor(max_workers=int(os.environ.get('DHCP_MAX_WORKERS', 32)),
+                                    max_queued=int(os.environ.get('DHCP_MAX_QUEUED', 256)))
+
+    # the default interface's MAC, looked up again on netlink changes or after DHCP_INTERFACE_TTL seconds
+    default_mac = InterfaceCache(_default_mac_address, ttl=float(os.environ.get('DHCP_INTERFACE_TTL', 60)))
+
+    REGISTRY.gauge('dhcp_leases_tracked', "Leases held and renewed by the lease manager.").set_function(lambda: len(lease_manager))
+    REGISTRY.gauge('dhcp_web_in_flight', "DHCP tasks running or queued on the executor.").set_function(dhcp_executor.in_flight)
+    REGISTRY.gauge('dhcp_web_rejected', "Requests refused with 429 since start.").set_function(lambda: dhcp_executor.rejected)
+    return app
+
+def remember_lease(lease):
+    lease_cache.put(lease)
+    lease_manager.add(lease)
+    lease_manager.start()
+
+# how long a request thread waits for a release or inform (DHCP_REQUEST_TIMEOUT) or a bulk
+# run (DHCP_BULK_TIMEOUT) handed to the executor before it answers 504
+request_timeout = float(os.environ.get('DHCP_REQUEST_TIMEOUT', 30))
+bulk_timeout = float(os.environ.get('DHCP_BULK_TIMEOUT', 600))
+
+def _too_busy():
+    response = jsonify(success=False, message="Too many DHCP requests in flight. Try again shortly.")
+    response.status_code = 429
+    response.headers['Retry-After'] = '1'
+    return response
+
+def _timed_out(future, timeout, on_cancel=None):
+    # work still queued behind other tasks is dropped; work already running finishes in the background
+    if future.cancel():
+        if on_cancel:
+            on_cancel()
+        outcome = "it was still queued and has been cancelled"
+    else:
+        outcome = "it goes on in the background"
+    response = jsonify(success=False, message=f"No result after {timeout:g}s; {outcome}.")
+    response.status_code = 504
+    return response
 
 @app.route("/")
 def index():
@@ -18,18 +152,28 @@ def index():
 def get_mac_address():
 
     try:
-        default_gateway = netifaces.gateways()['default'][netifaces.AF_INET]
-        interface_name = default_gateway[1]
-
-        mac_address = netifaces.ifaddresses(interface_name)[netifaces.AF_LINK][0]['addr']
+        mac_address = default_mac.get()
         return jsonify(success=True,mac_address=mac_address)
     
     except Exception as ex:
-        print(f"Could not auto-detect MAC address: {ex}")
+        logger.warning("Could not auto-detect MAC address: %s", ex)
         return jsonify(success=False,error=str(ex))
 
-def run_dhcp_process(client):
-    client.request_ip_address()
+def run_dhcp_process(task_id, client):
+    try:
+        if client.request_ip_address() and client.lease:
+            lease_manager.add(client.lease)
+            lease_manager.start()
+    except Exception as ex:
+        # the client emits FAILED only when it returns; without one /events/<task_id> never ends
+        logger.exception("[!] DHCP task %s failed: %s", task_id, ex)
+        client.state = f"FAILED: {ex}"
+        client.close()
+        dhcp_events.publish(task_id, DHCPEvent(FAILED, client.mac_addr_str, client.xid, client.state,
+                                               assigned_ip=client.assigned_ip, server_id=client.server_id))
+    finally:
+        # keep only the outcome, not the client
+        dhcp_tasks.finish(task_id)
 
 @app.route('/start-dhcp', methods=['POST'])
 def start_dhcp():
@@ -39,32 +183,69 @@ def start_dhcp():
     if not mac_address:
         return jsonify(success=False, message="MAC address is required.")
 
+    # optional per-request preferences: servers to take first, or the address we want back
+    policy = offer_policy
+    if data.get('requested_ip'):
+        policy = requested_ip(data['requested_ip'], fallback=offer_policy)
+    elif data.get('preferred_servers'):
+        policy = preferred_servers(data['preferred_servers'], fallback=offer_policy)
+
     task_id = str(uuid.uuid4())
-    client = DHCPClient(mac_addr_str=mac_address)
+    client = DHCPClient(mac_addr_str=mac_address, offer_window=offer_window, offer_policy=policy, cache=lease_cache,
+                        prober=arp_prober, decline_delay=decline_delay)
     
     # If socket binding failed, report error immediately.
     if client.state.startswith("ERROR"):
         return jsonify(success=False, message=client.state)
 
-    dhcp_tasks[task_id] = client
+    client.add_listener(dhcp_events.listener_for(task_id))
+    dhcp_tasks.put(TaskRecord(task_id, client=client))
     
-    thread = threading.Thread(target=run_dhcp_process, args=(client,))
-    thread.start()
+    if dhcp_executor.try_submit(run_dhcp_process, task_id, client) is None:
+        dhcp_tasks.delete(task_id)
+        client.close()
+        return _too_busy()
     
     return jsonify(success=True, task_id=task_id)
 
-# Endpoint for the frontend to poll for status updates.
+# Endpoint for one-off status checks; the frontend streams /events/<task_id> instead.
 @app.route('/status/<task_id>')
 def status(task_id):
-    client = dhcp_tasks.get(task_id)
-    if not client:
+    record = dhcp_tasks.get(task_id)
+    if not record:
         return jsonify(status="NOT_FOUND")
         
-    return jsonify(
-        status=client.state,
-        assigned_ip=client.assigned_ip,
-        server_id=client.server_id
-    )
+    return jsonify(**record.to_dict())
+
+def _event_stream(subscription, stop_after_terminal: bool):
+    """Yields Server-Sent Events from a subscription, with a keep-alive comment when idle."""
+    try:
+        while True:
+            event = subscription.get(timeout=15)
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {json.dumps(event.to_dict())}\n\n"
+            if stop_after_terminal and event.terminal:
+                break
+    finally:
+        subscription.close()
+
+def _sse_response(generator):
+    return Response(stream_with_context(generator), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Streams the events of one task until it succeeds or fails.
+@app.route('/events/<task_id>')
+def task_events(task_id):
+    if not dhcp_tasks.get(task_id) and not dhcp_events.last_event(task_id):
+        return jsonify(status="NOT_FOUND"), 404
+    return _sse_response(_event_stream(dhcp_events.subscribe(task_id), stop_after_terminal=True))
+
+# Streams the events of every task.
+@app.route('/events')
+def all_events():
+    return _sse_response(_event_stream(dhcp_events.subscribe(), stop_after_terminal=False))
 
 @app.route('/release-ip', methods=['POST'])
 def release_ip():
@@ -77,17 +258,149 @@ def release_ip():
         return jsonify(success=False, message="Missing required data for release.")
 
     try:
-        client = DHCPClient(mac_addr_str=mac_address)
-        if client.socket:
-            client.release_ip_address(ip_to_release, server_id)
-            return jsonify(success=True, message=f"Release message sent for {ip_to_release}.")
-        else:
-            return jsonify(success=False, message="Could not create socket for release.")
+        # stop renewing the lease before handing it back
+        lease_manager.remove(mac_address)
+        future = dhcp_executor.try_submit(release_many, [Lease(mac_address, ip_to_release, server_id)])
+        if future is None:
+            return _too_busy()
+        try:
+            errors = future.result(timeout=request_timeout)
+        except FutureTimeout:
+            return _timed_out(future, request_timeout)
+        if errors:
+            return jsonify(success=False, message=f"Could not send release: {errors[mac_address]}")
+        return jsonify(success=True, message=f"Release message sent for {ip_to_release}.")
     except Exception as ex:
         return jsonify(success=False, message=f"An error occurred during release: {ex}")
-    
+
+# Fetches the network configuration for an address the client already has (DHCPINFORM)
+@app.route('/inform', methods=['POST'])
+def inform():
+    data = request.get_json()
+    mac_address = data.get('mac_address')
+    ip_address = data.get('ip_address')
+    if not mac_address or not ip_address:
+        return jsonify(success=False, message="MAC address and IP address are required.")
+
+    client = DHCPClient(mac_addr_str=mac_address)
+    if client.state.startswith("ERROR"):
+        return jsonify(success=False, message=client.state)
+    future = dhcp_executor.try_submit(client.inform, ip_address, data.get('server_id'))
+    if future is None:
+        client.close()
+        return _too_busy()
+    try:
+        options = future.result(timeout=request_timeout)
+    except FutureTimeout:
+        return _timed_out(future, request_timeout, on_cancel=client.close)
+    if options is None:
+        return jsonify(success=False, message=client.state)
+    # option codes as keys; values JSON cannot hold (e.g. option 82 sub-options) as their repr
+    return jsonify(success=True, server_id=client.server_id,
+                   options={str(code): value if isinstance(value, (str, int, list)) else repr(value)
+                            for code, value in options.items()})
+
+# Acquires leases for a batch of MACs, pipelining the exchanges over the shared socket.
+# Instead of mac_addresses, virtual_clients: {count, seed, start, prefix, client_id}
+# generates them; rate caps the new exchanges per second.
+@app.route('/start-dhcp-bulk', methods=['POST'])
+def start_dhcp_bulk():
+    data = request.get_json()
+    mac_addresses = data.get('mac_addresses')
+    client_ids = None
+    on_lease = remember_lease
+    if data.get('virtual_clients'):
+        spec = data['virtual_clients']
+        try:
+            mac_addresses = VirtualClients(int(spec.get('count', 0)), seed=int(spec.get('seed', 0)),
+                                           start=int(spec.get('start', 0)), prefix=spec.get('prefix', "02"),
+                                           client_id=spec.get('client_id'))
+        except ValueError as ex:
+            return jsonify(success=False, message=str(ex))
+        if mac_addresses.client_id_kind:
+            client_ids = mac_addresses.client_id
+            # renewals do not carry a client id, so these leases are reported but not renewed
+            on_lease = None
+    if not mac_addresses:
+        return jsonify(success=False, message="mac_addresses is required.")
+    try:
+        concurrency = int(data.get('concurrency', 64))
+        rate = float(data['rate']) if data.get('rate') else None
+    except (TypeError, ValueError):
+        return jsonify(success=False, message="concurrency and rate must be numbers."), 400
+    # a window of 0 would never start an exchange
+    if concurrency < 1:
+        return jsonify(success=False, message="concurrency must be at least 1."), 400
+
+    if bulk_pool:
+        future = dhcp_executor.try_submit(bulk_pool.acquire, mac_addresses, concurrency=concurrency,
+                                          on_lease=on_lease, rate=rate, client_ids=client_ids)
+    else:
+        future = dhcp_executor.try_submit(acquire_many, mac_addresses, concurrency=concurrency, on_lease=on_lease,
+                                          rate=rate, client_ids=client_ids, prober=arp_prober,
+                                          decline_delay=decline_delay)
+    if future is None:
+        return _too_busy()
+    try:
+        result = future.result(timeout=bulk_timeout)
+    except FutureTimeout:
+        # leases acquired meanwhile still reach the lease manager through on_lease
+        return _timed_out(future, bulk_timeout)
+    except OSError as ex:
+        return jsonify(success=False, message=f"ERROR: Could not bind to port {DHCPTransport.shared_config().client_port}. {ex}")
+    return jsonify(success=True, **result.to_dict())
+
+# Releases a batch of leases: [{mac_address, ip_address, server_id}, ...], plus the
+# client_id kind ('mac' or 'duid') they were acquired with, if any
+@app.route('/release-ip-bulk', methods=['POST'])
+def release_ip_bulk():
+    data = request.get_json()
+    entries = data.get('leases')
+    if not entries:
+        return jsonify(success=False, message="leases is required.")
+    if not all(entry.get('mac_address') and entry.get('ip_address') and entry.get('server_id') for entry in entries):
+        return jsonify(success=False, message="Missing required data for release.")
+
+    leases = [Lease(entry['mac_address'], entry['ip_address'], entry['server_id']) for entry in entries]
+    client_ids = None
+    if data.get('client_id'):
+        if data['client_id'] not in (CLIENT_ID_MAC, CLIENT_ID_DUID):
+            return jsonify(success=False, message=f"Unknown client_id kind {data['client_id']!r}.")
+        client_ids = functools.partial(client_id_for, kind=data['client_id'])
+    for lease in leases:
+        lease_manager.remove(lease.mac_addr_str)
+    future = dhcp_executor.try_submit(bulk_pool.release if bulk_pool else release_many, leases, client_ids=client_ids)
+    if future is None:
+        return _too_busy()
+    try:
+        errors = future.result(timeout=bulk_timeout)
+    except FutureTimeout:
+        return _timed_out(future, bulk_timeout)
+    except OSError as ex:
+        return jsonify(success=False, message=f"ERROR: Could not bind to port {DHCPTransport.shared_config().client_port}. {ex}")
+    return jsonify(success=not errors, released=len(leases) - len(errors), failures=errors)
+
+# Round-trip time and NAK rate the clients have observed for every server
+@app.route('/servers')
+def servers():
+    return jsonify(server_stats.to_dict())
+
+# Pacing limits, queue depth and queueing times of the shared transport's transmit scheduler
+@app.route('/transmit')
+def transmit():
+    # a status read must not bind port 68: report on the shared transport only if it is already open
+    transport = DHCPTransport.shared_if_open()
+    if transport is None:
+        return jsonify(success=True, open=False)
+    return jsonify(success=True, open=True, **transport.scheduler.to_dict())
+
+# Counters, latency histograms and gauges of the DHCP hot path, in the Prometheus text format
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    # no reloader: it would import this module in a second process that renews the same leases
+    init_app().run(host="0.0.0.0", port=5001, debug=True, use_reloader=False)
 
@@ -0,0 +1,237 @@
+import logging
+import socket
+import struct
+import threading
+import time
+from .frames import BROADCAST_MAC
+from .packet_transport import PACKET_OUTGOING, open_packet_socket
+
+logger = logging.getLogger(__name__)
+
+ETH_P_ARP = 0x0806
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+_ARP = struct.Struct('!6s6sHHHBBH6s4s6s4s') # Ethernet header + ARP for IPv4 over Ethernet
+_ZERO_MAC = bytes(6)
+_MIN_FRAME = 60 # Ethernet minimum without FCS
+
+
+def arp_frame(op: int, sender_mac: bytes, sender_ip: str, target_mac: bytes, target_ip: str,
+              dst_mac: bytes = BROADCAST_MAC) -> bytes:
+    """An ARP request or reply for IPv4 over Ethernet, padded to the minimum frame size."""
+    frame = _ARP.pack(dst_mac, sender_mac, ETH_P_ARP, 1, 0x0800, 6, 4, op,
+                      sender_mac, socket.inet_aton(sender_ip), target_mac, socket.inet_aton(target_ip))
+    return frame.ljust(_MIN_FRAME, b'\0')
+
+
+def probe_frame(sender_mac: bytes, target_ip: str) -> bytes:
+    """An ARP probe (RFC 5227 2.1.1): a broadcast request for target_ip from 0.0.0.0."""
+    return arp_frame(ARP_REQUEST, sender_mac, '0.0.0.0', _ZERO_MAC, target_ip)
+
+
+def parse_arp(frame) -> tuple:
+    """Returns (op, sender_mac, sender_ip, target_ip) of an IPv4 ARP frame, or None."""
+    if len(frame) < _ARP.size:
+        return None
+    (_, _, ethertype, htype, ptype, hlen, plen, op,
+     sender_mac, sender_ip, _, target_ip) = _ARP.unpack_from(frame)
+    if ethertype != ETH_P_ARP or htype != 1 or ptype != 0x0800 or hlen != 6 or plen != 4:
+        return None
+    return op, sender_mac, socket.inet_ntoa(sender_ip), socket.inet_ntoa(target_ip)
+
+
+class ARPProber:
+    """
+    Checks leased addresses for conflicts with ARP probes (RFC 5227) before they are used.
+    Any number of addresses can be probed at once over one AF_PACKET socket: a single
+    receive thread matches every ARP frame against all addresses being probed, so a
+    batch costs one wait, not one per address.
+
+    An address conflicts when another host sends ARP from it, or probes for it with a
+    different MAC. Each address gets `probes` probes `interval` seconds apart, then
+    `wait` seconds for answers. RFC 5227 uses 3 probes 1-2 s apart and a 2 s wait; the
+    shorter defaults suit a simulator that leases many addresses. Probes go out from the
+    client's own MAC, so the interface is made promiscuous to see unicast replies to it.
+    """
+
+    def __init__(self, interface: str, probes: int = 2, interval: float = 0.2, wait: float = 1.0,
+                 promiscuous: bool = True):
+
+        self.interface = interface
+        self.probes = probes
+        self.interval = interval
+        self.wait = wait
+        self.promiscuous = promiscuous
+        self.socket = None
+        self._probing = {} # ip -> MAC of the client probing it
+        self._conflicts = {} # ip -> MAC of the host already using it
+        self._lock = threading.Lock()
+        self._receiver = None
+
+    def open(self) -> 'ARPProber':
+        """Opens the ARP socket and starts the receive thread. Raises OSError if that fails."""
+        if self.socket: return self
+        sock = open_packet_socket(self.interface, ETH_P_ARP, promiscuous=self.promiscuous)
+        # short timeout so the receive loop notices close()
+        sock.settimeout(0.5)
+        self.socket = sock
+        self._receiver = threading.Thread(target=self._receive_loop, args=(sock,), name="arp-probe", daemon=True)
+        self._receiver.start()
+        return self
+
+    def close(self):
+        sock, self.socket = self.socket, None
+        if self._receiver:
+            self._receiver.join(timeout=1)
+            self._receiver = None
+        if sock:
+            sock.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first probe of an address until it is known to be free."""
+        return (self.probes - 1) * self.interval + self.wait
+
+    def start(self, ip: str, mac_addr_str: str):
+        """Starts watching ip for conflicts and sends its first probe."""
+        mac = bytes.fromhex(mac_addr_str.replace(':', '').replace('-', ''))
+        with self._lock:
+            self._probing[ip] = mac
+            self._conflicts.pop(ip, None)
+        self.probe(ip)
+
+    def probe(self, ip: str):
+        """Sends one more probe for an address being watched."""
+        mac = self._probing.get(ip)
+        if mac is None or not self.socket:
+            return
+        try:
+            self.socket.send(probe_frame(mac, ip))
+        except OSError as ex:
+            logger.warning("[!] Could not send the ARP probe for %s: %s", ip, ex)
+
+    def conflict(self, ip: str) -> str:
+        """MAC of the host already using ip, or None so far."""
+        mac = self._conflicts.get(ip)
+        return mac.hex(':') if mac is not None else None
+
+    def finish(self, ip: str) -> str:
+        """Stops watching ip and returns its conflict, if any."""
+        with self._lock:
+            self._probing.pop(ip, None)
+            mac = self._conflicts.pop(ip, None)
+        return mac.hex(':') if mac is not None else None
+
+    def probe_many(self, leases) -> dict:
+        """
+        Probes every (ip, mac) pair together and returns {ip: conflicting MAC or None},
+        after `duration` seconds at most; sooner if every address turned out to conflict.
+        """
+        leases = list(leases)
+        for ip, mac in leases:
+            self.start(ip, mac)
+        started = time.monotonic()
+        deadline = started + self.duration
+        for sent in range(1, self.probes + 1):
+            until = started + sent * self.interval if sent < self.probes else deadline
+            while time.monotonic() < until:
+                if all(ip in self._conflicts for ip, _ in leases):
+                    return {ip: self.finish(ip) for ip, _ in leases}
+                time.sleep(min(0.01, max(0.0, until - time.monotonic())))
+            if sent < self.probes:
+                for ip, _ in leases:
+                    if ip not in self._conflicts:
+                        self.probe(ip)
+        return {ip: self.finish(ip) for ip, _ in leases}
+
+    def _receive_loop(self, sock):
+        while self.socket is sock:
+            try:
+                frame, addr = sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if addr[2] == PACKET_OUTGOING:
+                continue
+            parsed = parse_arp(frame)
+            if parsed is None:
+                continue
+            _, sender_mac, sender_ip, target_ip = parsed
+            with self._lock:
+                if sender_ip in self._probing:
+                    # someone sends ARP from the address: it is in use
+                    ip = sender_ip
+                elif sender_ip == '0.0.0.0' and target_ip in self._probing and sender_mac != self._probing[target_ip]:
+                    # another host probing for the same address at the same time
+                    ip = target_ip
+                else:
+                    continue
+                if ip not in self._conflicts:
+                    self._conflicts[ip] = sender_mac
+                    logger.warning("[!] Address conflict: %s is in use by %s.", ip, sender_mac.hex(':'))
+
+
+class ARPResponder:
+    """
+    Stands in for hosts that already use some addresses: answers ARP requests, probes
+    included, for every IP in `addresses` (ip -> MAC) on an interface. Lets the conflict
+    check be exercised on lo or a veth pair.
+    """
+
+    def __init__(self, interface: str, addresses: dict):
+        self.interface = interface
+        self.addresses = {ip: bytes.fromhex(mac.replace(':', '')) for ip, mac in addresses.items()}
+        self.answered = 0
+        self.socket = None
+        self._thread = None
+
+    def start(self) -> 'ARPResponder':
+        if self.socket: return self
+        sock = open_packet_socket(self.interface, ETH_P_ARP)
+        sock.settimeout(0.1)
+        self.socket = sock
+        self._thread = threading.Thread(target=self._serve, args=(sock,), name="arp-responder", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        sock, self.socket = self.socket, None
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if sock:
+            sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _serve(self, sock):
+        while self.socket is sock:
+            try:
+                frame, addr = sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if addr[2] == PACKET_OUTGOING:
+                continue
+            parsed = parse_arp(frame)
+            if parsed is None or parsed[0] != ARP_REQUEST:
+                continue
+            _, sender_mac, sender_ip, target_ip = parsed
+            mac = self.addresses.get(target_ip)
+            if mac is None or mac == sender_mac:
+                continue
+            sock.send(arp_frame(ARP_REPLY, mac, target_ip, sender_mac, sender_ip, dst_mac=sender_mac))
+            self.answered += 1
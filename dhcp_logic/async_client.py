@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import random
+from .backoff import retransmit_delays
+from .dhcp_message import DHCPMessage, DHCPDISCOVER, DHCPOFFER, DHCPREQUEST, DHCPACK, DHCPNAK, DHCPRELEASE
+from .dhcp_options import DEFAULT_PARAMETER_REQUEST_LIST
+from .dhcp_transport import TransportConfig, open_socket
+from .lease import Lease
+from .metrics import (OFFER_LATENCY, ACK_LATENCY, RETRANSMISSIONS, TIMEOUTS, IN_FLIGHT, MALFORMED, NON_MATCHING,
+                      count_received, count_sent)
+from .transmit_scheduler import TransmitScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class _DHCPProtocol(asyncio.DatagramProtocol):
+    """Feeds datagrams from the event loop into the owning AsyncDHCPClient."""
+
+    def __init__(self, client: 'AsyncDHCPClient'):
+        self.client = client
+
+    def datagram_received(self, data, addr):
+        self.client._dispatch(data, addr)
+
+    def error_received(self, exc):
+        logger.warning("[!] Network error: %s", exc)
+
+
+class AsyncDHCPClient:
+    """
+    asyncio DHCP client engine. One instance owns one UDP socket and can run
+    thousands of concurrent D-O-R-A exchanges on a single event loop, matching
+    replies to transactions by xid. Packets go out through a TransmitScheduler, so the
+    config's rate limits and start jitter apply and `secs` is filled in, as with
+    DHCPTransport.
+    """
+
+    def __init__(self, client_port: int = 68, server_port: int = 67,
+                 broadcast_address: str = '<broadcast>', timeout: float = 20,
+                 backoff=retransmit_delays, config: TransportConfig = None):
+
+        # a TransportConfig, when given, also sets the interface, source address and SO_REUSEPORT
+        self.config = config if config is not None else TransportConfig(
+            client_port=client_port, server_port=server_port, broadcast_address=broadcast_address)
+        self.client_port = self.config.client_port
+        self.server_port = self.config.server_port
+        self.broadcast_address = self.config.broadcast_address
+        self.timeout = timeout # budget of each exchange, retransmissions included
+        self.backoff = backoff
+
+        self._transport = None
+        self._loop = None
+        self._scheduler = None
+        # xid -> (chaddr, asyncio.Queue) for every transaction waiting on a reply
+        self._transactions = {}
+
+    async def open(self):
+        """Binds the client port. Raises OSError if the bind fails."""
+        if self._transport: return
+
+        sock = open_socket(self.config)
+        sock.setblocking(False)
+
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: _DHCPProtocol(self), sock=sock)
+        self._loop = loop
+        self._scheduler = TransmitScheduler(self._transmit, self.config.transmit_rate, self.config.server_rate,
+                                            self.config.start_jitter).start()
+
+    @property
+    def scheduler(self) -> TransmitScheduler:
+        return self._scheduler
+
+    async def close(self):
+        if self._scheduler:
+            self._scheduler.stop()
+        if self._transport:
+            self._transport.close()
+            self._transport = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def pending(self) -> int:
+        """Number of transactions currently waiting on a reply."""
+        return len(self._transactions)
+
+    def _register(self, chaddr: bytes, xid: int = None):
+        if xid is None:
+            xid = random.randint(0, 0xFFFFFFFF)
+            while xid in self._transactions:
+                xid = random.randint(0, 0xFFFFFFFF)
+        inbox = asyncio.Queue()
+        self._transactions[xid] = (bytes(chaddr[:6]), inbox)
+        IN_FLIGHT.inc()
+        return xid, inbox
+
+    def _unregister(self, xid: int):
+        if self._transactions.pop(xid, None) is not None:
+            IN_FLIGHT.dec()
+        if self._scheduler:
+            self._scheduler.forget(xid)
+
+    def _dispatch(self, packet: bytes, addr: tuple):
+        try:
+            msg = DHCPMessage.unpack(packet)
+            count_received(msg.options.get(53))
+        except Exception as ex:
+            MALFORMED.inc()
+            logger.warning("[!] Dropping malformed packet from %s: %s", addr[0], ex)
+            return
+
+        entry = self._transactions.get(msg.xid)
+        if entry is None:
+            NON_MATCHING.labels('unknown_xid').inc()
+            return
+        if msg.chaddr[:6] != entry[0]:
+            NON_MATCHING.labels('foreign_chaddr').inc()
+            return
+        entry[1].put_nowait((msg, addr))
+
+    def _send(self, msg: DHCPMessage, server_ip: str = None):
+        self._send_packet(msg.pack(), server_ip)
+
+    def _send_packet(self, packet: bytes, server_ip: str = None):
+        if not self._transport:
+            raise OSError("client is not open")
+        target = server_ip if server_ip else self.broadcast_address
+        self._scheduler.submit(packet, (target, self.server_port))
+
+    def _transmit(self, packet: bytes, addr: tuple):
+        # called by the scheduler: on the event loop when unpaced, from its sender thread when paced
+        if not self._transport:
+            raise OSError("client is not open")
+        if self._scheduler.paced:
+            self._loop.call_soon_threadsafe(self._sendto, packet, addr)
+        else:
+            self._sendto(packet, addr)
+
+    def _sendto(self, packet: bytes, addr: tuple):
+        if self._transport:
+            self._transport.sendto(packet, addr)
+            count_sent(packet)
+
+    async def _exchange(self, inbox: asyncio.Queue, msg: DHCPMessage, msg_types: tuple,
+                        deadline: float, server_ip: str = None):
+        """
+        Sends msg and returns the next reply with one of msg_types, retransmitting msg with
+        randomized exponential backoff until then. Returns None once the deadline has passed.
+        """
+        loop = asyncio.get_running_loop()
+        latency = OFFER_LATENCY if DHCPOFFER in msg_types else ACK_LATENCY
+        packet = msg.pack()
+        delays = self.backoff()
+        self._send_packet(packet, server_ip)
+        sent_at = loop.time()
+        retransmit_at = sent_at + next(delays)
+        while True:
+            now = loop.time()
+            if now >= deadline:
+                TIMEOUTS.labels('offer' if DHCPOFFER in msg_types else 'ack').inc()
+                return None
+            if now >= retransmit_at:
+                self._send_packet(packet, server_ip)
+                RETRANSMISSIONS.inc()
+                retransmit_at = now + next(delays)
+            try:
+                reply, addr = await asyncio.wait_for(inbox.get(), min(deadline, retransmit_at) - now)
+            except asyncio.TimeoutError:
+                continue
+            if reply.options.get(53) in msg_types:
+                latency.observe(loop.time() - sent_at)
+                return reply
+            NON_MATCHING.labels('unexpected_type').inc()
+
+    async def acquire(self, mac_addr_str: str) -> Lease:
+        """Runs D-O-R-A for one MAC. Returns the Lease, or None on timeout or NAK."""
+        discover_msg = DHCPMessage(mac_addr_str)
+        xid, inbox = self._register(discover_msg.chaddr)
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        try:
+            discover_msg.xid = xid
+            discover_msg.options[53] = DHCPDISCOVER
+            discover_msg.options[55] = DEFAULT_PARAMETER_REQUEST_LIST
+
+            offer_msg = await self._exchange(inbox, discover_msg, (DHCPOFFER,), deadline)
+            if offer_msg is None:
+                return None
+
+            request_msg = DHCPMessage(mac_addr_str)
+            request_msg.xid = xid
+            request_msg.options[53] = DHCPREQUEST
+            request_msg.options[50] = offer_msg.yiaddr
+            request_msg.options[54] = offer_msg.options.get(54)
+
+            ack_msg = await self._exchange(inbox, request_msg, (DHCPACK, DHCPNAK), deadline)
+            if ack_msg is None or ack_msg.options.get(53) == DHCPNAK:
+                return None
+            return Lease.from_ack(mac_addr_str, ack_msg, offer_msg.options.get(54))
+        finally:
+            self._unregister(xid)
+
+    async def renew(self, lease: Lease) -> Lease:
+        """Sends a RENEWING-state DHCPREQUEST unicast to the leasing server. Returns the renewed Lease or None."""
+        request_msg = DHCPMessage(lease.mac_addr_str)
+        xid, inbox = self._register(request_msg.chaddr)
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        try:
+            request_msg.xid = xid
+            request_msg.ciaddr = lease.ip
+            request_msg.options[53] = DHCPREQUEST
+
+            ack_msg = await self._exchange(inbox, request_msg, (DHCPACK, DHCPNAK), deadline, lease.server_id)
+            if ack_msg is None or ack_msg.options.get(53) == DHCPNAK:
+                return None
+            return Lease.from_ack(lease.mac_addr_str, ack_msg, lease.server_id)
+        finally:
+            self._unregister(xid)
+
+    async def release(self, lease: Lease):
+        """Sends a DHCPRELEASE unicast to the leasing server. No reply is expected."""
+        release_msg = DHCPMessage(lease.mac_addr_str)
+        release_msg.ciaddr = lease.ip
+        release_msg.options[53] = DHCPRELEASE
+        release_msg.options[54] = lease.server_id
+        self._send(release_msg, lease.server_id)
+
+    async def acquire_many(self, macs, concurrency: int = 256) -> list:
+        """Acquires leases for many MACs with at most `concurrency` exchanges in flight. Returns leases in input order (None for failures)."""
+        limit = asyncio.Semaphore(concurrency)
+
+        async def bounded(mac):
+            async with limit:
+                return await self.acquire(mac)
+
+        return await asyncio.gather(*(bounded(mac) for mac in macs))
+
+    async def release_many(self, leases):
+        """Sends a DHCPRELEASE for every lease."""
+        for lease in leases:
+            await self.release(lease)
@@ -0,0 +1,19 @@
+import random
+
+# RFC 2131 section 4.1: retransmit with a randomized, exponentially growing delay, capped at 64 s
+INITIAL_DELAY = 2.0
+MAX_DELAY = 64.0
+JITTER = 1.0
+
+
+def retransmit_delays(initial: float = INITIAL_DELAY, maximum: float = MAX_DELAY,
+                      jitter: float = JITTER, rng=random.uniform):
+    """
+    Yields the wait before each retransmission: initial, 2*initial, 4*initial ... up to
+    maximum, each moved by a random amount in [-jitter, +jitter] so that clients which
+    lost the same packet do not all retransmit at once.
+    """
+    delay = initial
+    while True:
+        yield max(delay / 2, delay + rng(-jitter, jitter))
+        delay = min(delay * 2, maximum)
@@ -0,0 +1,158 @@
+"""
+Reproducible load benchmark for the DHCP client, run against a LoopbackDHCPServer so no
+root, port 68 or real DHCP server is needed.
+
+    python -m dhcp_logic.benchmark --leases 2000 --concurrency 128
+    python -m dhcp_logic.benchmark --json > baseline.json
+    python -m dhcp_logic.benchmark --baseline baseline.json   # exits 1 on a regression
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from .bulk import acquire_many
+from .dhcp_message import DHCPMessage, DHCPDISCOVER
+from .dhcp_options import DEFAULT_PARAMETER_REQUEST_LIST
+from .dhcp_transport import DHCPTransport
+from .loopback_server import LoopbackDHCPServer, ServerProfile
+
+# loopback ports used by the benchmark, away from the real 67/68
+SERVER_PORT = 16780
+CLIENT_PORT = 16781
+
+# metrics where a higher value is better; the rest (latencies, memory) regress upwards
+HIGHER_IS_BETTER = ('leases_per_sec', 'pack_per_sec', 'unpack_per_sec')
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _macs(count: int, prefix: int = 0x02) -> list:
+    return [f"{prefix:02x}:00:{(i >> 24) & 0xff:02x}:{(i >> 16) & 0xff:02x}:{(i >> 8) & 0xff:02x}:{i & 0xff:02x}"
+            for i in range(count)]
+
+
+def bench_codec(iterations: int = 20000) -> dict:
+    """Measures DHCPMessage pack and unpack throughput on a typical DISCOVER."""
+    msg = DHCPMessage("02:00:00:00:00:01")
+    msg.options[53] = DHCPDISCOVER
+    msg.options[55] = DEFAULT_PARAMETER_REQUEST_LIST
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        packet = msg.pack()
+    pack_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        DHCPMessage.unpack(packet).options.get(53)
+    unpack_elapsed = time.perf_counter() - started
+
+    return dict(pack_per_sec=round(iterations / pack_elapsed), unpack_per_sec=round(iterations / unpack_elapsed))
+
+
+def _acquire_from_loopback(count: int, concurrency: int, profiles: list, timeout: float,
+                           server_port: int, client_port: int, seed: int):
+    server = LoopbackDHCPServer(port=server_port, client_port=client_port, profiles=profiles, seed=seed)
+    transport = DHCPTransport(client_port=client_port, server_port=server_port, broadcast_address="127.0.0.1")
+    with server:
+        transport.open()
+        try:
+            return acquire_many(_macs(count), concurrency=concurrency, transport=transport, timeout=timeout)
+        finally:
+            transport.close()
+
+
+def bench_leases(count: int = 1000, concurrency: int = 64, profiles: list = None, timeout: float = 20,
+                 server_port: int = SERVER_PORT, client_port: int = CLIENT_PORT, seed: int = 1) -> dict:
+    """Acquires `count` leases from a loopback server and reports throughput and time-to-lease percentiles."""
+    result = _acquire_from_loopback(count, concurrency, profiles, timeout, server_port, client_port, seed)
+    p50, p99 = _percentile(result.lease_times, 0.50), _percentile(result.lease_times, 0.99)
+    return dict(leases=len(result.leases), failed=len(result.failed), elapsed=round(result.elapsed, 3),
+                leases_per_sec=round(len(result.leases) / result.elapsed, 1) if result.elapsed else None,
+                p50_time_to_lease=round(p50, 4) if p50 is not None else None,
+                p99_time_to_lease=round(p99, 4) if p99 is not None else None)
+
+
+def bench_memory(concurrency: int = 64, server_port: int = SERVER_PORT, client_port: int = CLIENT_PORT) -> dict:
+    """
+    Measures the peak memory of `concurrency` transactions held in flight by a slow server,
+    divided per transaction. Run separately because tracemalloc slows everything down.
+    """
+    profiles = [ServerProfile(latency=0.2)]
+    tracemalloc.start()
+    try:
+        _acquire_from_loopback(concurrency, concurrency, profiles, 20, server_port, client_port, 1)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # includes the leases being collected, so this is an upper bound
+    return dict(bytes_per_transaction=round(peak / concurrency))
+
+
+def run(count: int = 1000, concurrency: int = 64, latency: float = 0.0, loss: float = 0.0,
+        nak_rate: float = 0.0, servers: int = 1, codec_iterations: int = 20000) -> dict:
+    profiles = [ServerProfile(server_id=f"127.0.0.{i + 1}", pool=f"10.{100 + i}.0.0", latency=latency,
+                              jitter=latency / 2, loss=loss, nak_rate=nak_rate)
+                for i in range(servers)]
+    report = bench_codec(codec_iterations)
+    report.update(bench_leases(count, concurrency, profiles))
+    report.update(bench_memory(concurrency))
+    return report
+
+
+def regressions(report: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    """Returns a line for every metric that is more than `tolerance` worse than the baseline."""
+    problems = []
+    for name, expected in baseline.items():
+        value = report.get(name)
+        if not isinstance(expected, (int, float)) or not isinstance(value, (int, float)) or not expected:
+            continue
+        if name in HIGHER_IS_BETTER:
+            worse = value < expected * (1 - tolerance)
+        elif name in ('p50_time_to_lease', 'p99_time_to_lease', 'bytes_per_transaction'):
+            worse = value > expected * (1 + tolerance)
+        else:
+            continue
+        if worse:
+            problems.append(f"{name}: {value} vs baseline {expected}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DHCP client load benchmark against a loopback server.")
+    parser.add_argument('--leases', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.0, help="server reply latency in seconds")
+    parser.add_argument('--loss', type=float, default=0.0, help="share of requests the server drops")
+    parser.add_argument('--nak-rate', type=float, default=0.0, help="share of REQUESTs answered with a NAK")
+    parser.add_argument('--servers', type=int, default=1, help="number of competing servers")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--baseline', help="JSON report to compare against; exit 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    # the client logs to stderr, so stdout only carries the report
+    report = run(args.leases, args.concurrency, args.latency, args.loss, args.nak_rate, args.servers)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, value in report.items():
+            print(f"{name:>24}: {value}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = regressions(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"[!] Regression in {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,412 @@
+import collections
+import heapq
+import logging
+import queue
+import time
+from .backoff import retransmit_delays
+from .dhcp_message import (DHCPMessage, DHCPDISCOVER, DHCPOFFER, DHCPREQUEST, DHCPACK, DHCPNAK, DHCPRELEASE,
+                           DHCPDECLINE)
+from .dhcp_options import DEFAULT_PARAMETER_REQUEST_LIST
+from .dhcp_transport import DHCPTransport
+from .lease import Lease
+from .metrics import (OFFER_LATENCY, ACK_LATENCY, RETRANSMISSIONS, TIMEOUTS, NON_MATCHING, MALFORMED,
+                      POOL_NO_OFFER_RATIO)
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# transaction states inside the bulk driver
+_SELECTING = 1 # DISCOVER sent, waiting for an OFFER
+_REQUESTING = 2 # REQUEST sent, waiting for the ACK
+_PROBING = 3 # ACKed, ARP-probing the address before it is used
+
+# how each MAC's exchange ended
+ACQUIRED = 'acquired'
+NO_OFFER = 'no_offer' # no server answered the DISCOVER
+NAK = 'nak'
+NO_ACK = 'no_ack' # the REQUEST went unanswered
+ERROR = 'error' # invalid MAC or network error
+DECLINED = 'declined' # the address was in use every time, see acquire_many's prober
+
+
+class PoolExhaustion:
+    """
+    Watches a bulk run for a server pool filling up: the first NAK, the first DISCOVER
+    left without an OFFER, and the no-offer rate of the last `window` exchanges, sampled
+    every `window` exchanges so the curve shows where the pool ran dry.
+    """
+
+    def __init__(self, window: int = 100, started_at: float = None):
+
+        self.window = window
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.finished = 0
+        self.acquired = 0
+        self.no_offer = 0
+        self.naks = 0
+        self.first_nak = None # where in the run the first NAK came, see _mark
+        self.first_no_offer = None
+        self.samples = [] # (exchanges finished, leases acquired, no-offer rate of the last window)
+        self._recent = collections.deque()
+        self._recent_no_offer = 0
+
+    def record(self, outcome: str):
+        self.finished += 1
+        no_offer = outcome == NO_OFFER
+        self._recent.append(no_offer)
+        self._recent_no_offer += no_offer
+        if len(self._recent) > self.window:
+            self._recent_no_offer -= self._recent.popleft()
+
+        if outcome == ACQUIRED:
+            self.acquired += 1
+        elif no_offer:
+            self.no_offer += 1
+            if self.first_no_offer is None:
+                self.first_no_offer = self._mark()
+                logger.warning("[!] First DISCOVER without an OFFER after %d leases; the pool may be exhausted.", self.acquired)
+        elif outcome == NAK:
+            self.naks += 1
+            if self.first_nak is None:
+                self.first_nak = self._mark()
+                logger.warning("[!] First NAK after %d leases.", self.acquired)
+
+        if self.finished % self.window == 0:
+            rate = self.recent_no_offer_rate
+            self.samples.append((self.finished, self.acquired, round(rate, 4)))
+            POOL_NO_OFFER_RATIO.set(rate)
+
+    def _mark(self) -> dict:
+        return dict(exchange=self.finished, leases=self.acquired, elapsed=round(time.monotonic() - self.started_at, 3))
+
+    @property
+    def recent_no_offer_rate(self) -> float:
+        return self._recent_no_offer / len(self._recent) if self._recent else 0.0
+
+    def to_dict(self) -> dict:
+        return dict(finished=self.finished, acquired=self.acquired, no_offer=self.no_offer, naks=self.naks,
+                    no_offer_rate=round(self.no_offer / self.finished, 4) if self.finished else 0.0,
+                    recent_no_offer_rate=round(self.recent_no_offer_rate, 4),
+                    first_nak=self.first_nak, first_no_offer=self.first_no_offer, samples=self.samples)
+
+
+class BulkResult:
+    """Outcome of a bulk acquisition: the leases obtained and why the other MACs failed."""
+
+    def __init__(self, window: int = 100):
+        self.leases = []
+        self.failed = {} # mac -> reason
+        self.lease_times = [] # seconds from first DISCOVER to ACK (and a clean probe), per acquired lease
+        self.declines = 0 # DHCPDECLINEs sent for addresses found in use
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+        self.pool = PoolExhaustion(window, self.started_at)
+
+    def add_lease(self, lease: Lease):
+        self.leases.append(lease)
+        self.pool.record(ACQUIRED)
+
+    def add_failure(self, mac_addr_str: str, reason: str, outcome: str = ERROR):
+        self.failed[mac_addr_str] = reason
+        self.pool.record(outcome)
+
+    def to_dict(self) -> dict:
+        return dict(requested=len(self.leases) + len(self.failed), acquired=len(self.leases),
+                    failed=len(self.failed), elapsed=round(self.elapsed, 3),
+                    leases=[dict(mac_address=lease.mac_addr_str, ip_address=lease.ip, server_id=lease.server_id)
+                            for lease in self.leases],
+                    failures=self.failed, declines=self.declines, pool=self.pool.to_dict())
+
+
+class _Transaction:
+    __slots__ = ('mac_addr_str', 'chaddr', 'xid', 'state', 'started_at', 'requested_at', 'deadline', 'offer',
+                 'packet', 'delays', 'retransmit_at', 'wake_at', 'lease', 'probes_left', 'declines')
+
+    def __init__(self, mac_addr_str: str, chaddr: bytes, xid: int, started_at: float, deadline: float):
+        self.mac_addr_str = mac_addr_str
+        self.chaddr = chaddr
+        self.xid = xid
+        self.state = _SELECTING
+        self.started_at = started_at
+        self.requested_at = None # first REQUEST, for the REQUEST -> ACK latency
+        self.deadline = deadline
+        self.offer = None
+        self.packet = None # last packet sent, retransmitted until it is answered
+        self.delays = None
+        self.retransmit_at = None
+        self.wake_at = None
+        self.lease = None # ACKed lease while its address is probed
+        self.probes_left = 0
+        self.declines = 0
+
+
+def acquire_many(macs, concurrency: int = 64, transport: DHCPTransport = None,
+                 timeout: float = 20, on_lease=None, backoff=retransmit_delays,
+                 rate: float = None, client_ids=None, on_failure=None, prober=None,
+                 max_declines: int = 1, decline_delay: float = 10.0) -> BulkResult:
+    """
+    Acquires a lease for every MAC over one shared transport, keeping at most `concurrency`
+    D-O-R-A exchanges in flight. One thread drives all of them: each transaction's replies
+    land on a shared inbox and move that transaction one step forward, so DISCOVERs for
+    the next MACs go out while earlier ones are still waiting for their OFFER or ACK.
+
+    on_lease(lease) is called as soon as each lease is ACKed, on_failure(mac, reason, outcome)
+    as soon as an exchange fails. `timeout` is the budget of each MAC's whole exchange;
+    unanswered DISCOVERs and REQUESTs are retransmitted within it.
+
+    `macs` is consumed lazily, so it can be a generator or VirtualClients of any size.
+    `rate` caps new exchanges per second, and client_ids(mac) returns the option 61 to
+    send for a MAC (or None).
+
+    With an open ARPProber every ACKed address is probed before it is accepted. Probes of
+    all transactions share the prober's socket and are scheduled like retransmissions, so
+    a window of leases is checked in one probe wait. An address in use is DECLINEd and the
+    MAC starts over with a new DISCOVER `decline_delay` seconds later (RFC 2131 3.1.5), at
+    most `max_declines` times.
+
+    Raises ValueError if concurrency is less than 1.
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    transport = transport or DHCPTransport.shared()
+    result = BulkResult()
+    limiter = TokenBucket(rate) if rate else None
+    inbox = queue.Queue()
+    active = {} # xid -> _Transaction
+    wakeups = [] # heap of (wake_at, xid): the next retransmission or deadline of each transaction
+    pending = iter(macs)
+    exhausted = False
+
+    def fail(mac: str, reason: str, outcome: str = ERROR):
+        result.add_failure(mac, reason, outcome)
+        if on_failure:
+            on_failure(mac, reason, outcome)
+
+    def finish(tx: _Transaction, reason: str = None, outcome: str = ERROR):
+        del active[tx.xid]
+        transport.unregister(tx.xid)
+        if reason is not None:
+            fail(tx.mac_addr_str, reason, outcome)
+
+    def new_message(mac: str, xid: int, msg_type: int) -> DHCPMessage:
+        msg = DHCPMessage(mac)
+        msg.xid = xid
+        msg.options[53] = msg_type
+        if client_ids is not None:
+            client_id = client_ids(mac)
+            if client_id:
+                msg.options[61] = client_id
+        return msg
+
+    def transmit(tx: _Transaction, packet: bytes):
+        tx.packet = packet
+        tx.delays = backoff()
+        transport.broadcast(packet)
+        tx.retransmit_at = time.monotonic() + next(tx.delays)
+        schedule(tx)
+
+    def schedule(tx: _Transaction):
+        tx.wake_at = min(tx.deadline, tx.retransmit_at)
+        heapq.heappush(wakeups, (tx.wake_at, tx.xid))
+
+    def accept(tx: _Transaction, lease: Lease):
+        result.add_lease(lease)
+        result.lease_times.append(time.monotonic() - tx.started_at)
+        finish(tx)
+        if on_lease:
+            on_lease(lease)
+
+    def probe_next(tx: _Transaction, now: float):
+        tx.retransmit_at = now + prober.interval if tx.probes_left else float('inf')
+        schedule(tx)
+
+    def decline(tx: _Transaction, conflict: str, now: float):
+        lease = tx.lease
+        result.declines += 1
+        decline_msg = new_message(tx.mac_addr_str, tx.xid, DHCPDECLINE)
+        decline_msg.options[50] = lease.ip
+        decline_msg.options[54] = lease.server_id
+        try:
+            transport.broadcast(decline_msg.pack())
+        except OSError as ex:
+            logger.warning("[!] Network error on DECLINE: %s", ex)
+        if tx.declines >= max_declines:
+            finish(tx, f"{lease.ip} is in use by {conflict}.", DECLINED)
+            return
+
+        # start over under a new xid, so late replies to the old one are not taken for the new exchange
+        tx.declines += 1
+        del active[tx.xid]
+        transport.unregister(tx.xid)
+        tx.xid, _ = transport.register(tx.chaddr, inbox=inbox)
+        active[tx.xid] = tx
+        discover_msg = new_message(tx.mac_addr_str, tx.xid, DHCPDISCOVER)
+        discover_msg.options[55] = DEFAULT_PARAMETER_REQUEST_LIST
+        tx.state = _SELECTING
+        tx.offer = tx.lease = None
+        tx.packet = discover_msg.pack()
+        tx.delays = None # sent for the first time on wake-up
+        tx.started_at = tx.retransmit_at = now + decline_delay
+        tx.deadline = tx.started_at + timeout
+        schedule(tx)
+
+    def on_reply(tx: _Transaction, msg: DHCPMessage):
+        """Moves tx one step forward. Raises ValueError, before tx changes, if the reply is malformed."""
+        msg_type = msg.options.get(53)
+        if tx is None:
+            NON_MATCHING.labels('finished').inc() # e.g. the OFFER of a competing server
+        elif tx.state == _SELECTING and msg_type == DHCPOFFER:
+            server_id = msg.options.get(54)
+            if server_id is None:
+                raise ValueError("OFFER without a server identifier (option 54)")
+            tx.offer = msg
+            tx.state = _REQUESTING
+            tx.requested_at = time.monotonic()
+            OFFER_LATENCY.observe(tx.requested_at - tx.started_at)
+            request_msg = new_message(tx.mac_addr_str, tx.xid, DHCPREQUEST)
+            request_msg.options[50] = msg.yiaddr
+            request_msg.options[54] = server_id
+            try:
+                transmit(tx, request_msg.pack())
+            except OSError as ex:
+                finish(tx, f"Network error on REQUEST. {ex}")
+        elif tx.state == _REQUESTING and msg_type == DHCPACK:
+            lease = Lease.from_ack(tx.mac_addr_str, msg, tx.offer.options.get(54))
+            ACK_LATENCY.observe(time.monotonic() - tx.requested_at)
+            if prober is None:
+                accept(tx, lease)
+            else:
+                now = time.monotonic()
+                tx.lease = lease
+                tx.state = _PROBING
+                tx.probes_left = prober.probes - 1
+                tx.deadline = now + prober.duration
+                prober.start(lease.ip, tx.mac_addr_str)
+                probe_next(tx, now)
+        elif tx.state == _REQUESTING and msg_type == DHCPNAK:
+            ACK_LATENCY.observe(time.monotonic() - tx.requested_at)
+            finish(tx, "Server denied the request (NAK).", NAK)
+        else:
+            NON_MATCHING.labels('unexpected_type').inc()
+
+    try:
+        while active or not exhausted:
+            # top up the window, as fast as the rate limit allows
+            throttled = False
+            while not exhausted and len(active) < concurrency:
+                if limiter and not limiter.try_take():
+                    throttled = True
+                    break
+                mac = next(pending, None)
+                if mac is None:
+                    exhausted = True
+                    break
+                try:
+                    discover_msg = new_message(mac, 0, DHCPDISCOVER)
+                except ValueError:
+                    fail(mac, "Invalid MAC address.")
+                    continue
+                xid, _ = transport.register(discover_msg.chaddr, inbox=inbox)
+                started_at = time.monotonic()
+                tx = _Transaction(mac, discover_msg.chaddr, xid, started_at, started_at + timeout)
+                active[xid] = tx
+                discover_msg.xid = xid
+                discover_msg.options[55] = DEFAULT_PARAMETER_REQUEST_LIST
+                try:
+                    transmit(tx, discover_msg.pack())
+                except OSError as ex:
+                    finish(tx, f"Network error on DISCOVER. {ex}")
+
+            if not active:
+                if throttled:
+                    time.sleep(limiter.wait_time())
+                continue
+
+            # wait for the next reply, but no longer than the earliest retransmission or deadline
+            wait = max(0.0, wakeups[0][0] - time.monotonic()) if wakeups else timeout
+            if throttled:
+                wait = min(wait, limiter.wait_time()) # or the next token, to start another exchange
+            try:
+                msg, addr = inbox.get(timeout=wait)
+            except queue.Empty:
+                msg = None
+
+            if msg is not None:
+                try:
+                    on_reply(active.get(msg.xid), msg)
+                except ValueError as ex:
+                    # a malformed reply is dropped like a lost one: its transaction retransmits
+                    # or times out, and the rest of the batch goes on
+                    MALFORMED.inc()
+                    logger.warning("[!] Dropped a malformed reply from %s: %s", addr[0], ex)
+
+            # retransmit unanswered packets and expire transactions whose deadline has passed
+            now = time.monotonic()
+            while wakeups and wakeups[0][0] <= now:
+                wake_at, xid = heapq.heappop(wakeups)
+                tx = active.get(xid)
+                if tx is None or tx.wake_at != wake_at:
+                    continue # finished, or rescheduled by a later transmit
+                if tx.state == _PROBING:
+                    conflict = prober.conflict(tx.lease.ip)
+                    if conflict is None and now < tx.deadline:
+                        prober.probe(tx.lease.ip)
+                        tx.probes_left -= 1
+                        probe_next(tx, now)
+                        continue
+                    prober.finish(tx.lease.ip)
+                    if conflict is None:
+                        accept(tx, tx.lease)
+                    else:
+                        decline(tx, conflict, now)
+                    continue
+                if now >= tx.deadline:
+                    TIMEOUTS.labels('offer' if tx.state == _SELECTING else 'ack').inc()
+                    if tx.state == _SELECTING:
+                        finish(tx, "Timeout waiting for OFFER.", NO_OFFER)
+                    else:
+                        finish(tx, "Timeout waiting for ACK.", NO_ACK)
+                    continue
+                first = tx.delays is None
+                if first:
+                    tx.delays = backoff()
+                try:
+                    transport.broadcast(tx.packet)
+                    if not first:
+                        RETRANSMISSIONS.inc()
+                except OSError as ex:
+                    logger.warning("[!] Network error on retransmission: %s", ex)
+                tx.retransmit_at = now + next(tx.delays)
+                schedule(tx)
+    finally:
+        for xid, tx in list(active.items()):
+            transport.unregister(xid)
+            if tx.state == _PROBING:
+                prober.finish(tx.lease.ip)
+
+    result.elapsed = time.monotonic() - result.started_at
+    return result
+
+
+def release_many(leases, transport: DHCPTransport = None, client_ids=None) -> dict:
+    """
+    Sends a DHCPRELEASE for every lease. Returns {mac: error} for the ones that could not be
+    built (invalid MAC or address) or sent.
+    Leases acquired with client ids must be released with the same client_ids.
+    """
+    transport = transport or DHCPTransport.shared()
+    errors = {}
+    for lease in leases:
+        # a bad MAC or address fails only its own release, like a send error
+        try:
+            release_msg = DHCPMessage(lease.mac_addr_str)
+            release_msg.ciaddr = lease.ip
+            release_msg.options[53] = DHCPRELEASE
+            release_msg.options[54] = lease.server_id
+            client_id = client_ids(lease.mac_addr_str) if client_ids is not None else None
+            if client_id:
+                release_msg.options[61] = client_id
+            transport.unicast(release_msg.pack(), lease.server_id)
+        except (ValueError, OSError) as ex:
+            errors[lease.mac_addr_str] = str(ex)
+    return errors
@@ -1,57 +1,165 @@
-import socket
-import sys
-import traceback
-from .dhcp_message import DHCPMessage, DHCPDISCOVER,DHCPOFFER,DHCPREQUEST,DHCPACK, DHCPNAK,DHCPRELEASE
+import logging
+import queue
+import time
+from .backoff import retransmit_delays
+from .dhcp_message import DHCPMessage, DHCPDISCOVER,DHCPOFFER,DHCPREQUEST,DHCPACK, DHCPNAK,DHCPRELEASE, DHCPDECLINE, DHCPINFORM
+from .dhcp_options import DEFAULT_PARAMETER_REQUEST_LIST
+from .dhcp_transport import DHCPTransport
+from .events import (DHCPEvent, DISCOVER_SENT, OFFER_RECEIVED, REQUEST_SENT, ACK_RECEIVED,
+                     NAK_RECEIVED, DECLINE_SENT, TIMEOUT, FAILED)
+from .lease import Lease
+from .lease_cache import LeaseCache
+from .metrics import OFFER_LATENCY, ACK_LATENCY, RETRANSMISSIONS, TIMEOUTS, NON_MATCHING
+from .offer_selection import Offer, ServerStats, first_arrival, server_stats
+
+logger = logging.getLogger(__name__)
 
 class DHCPClient:
     """Manages the state and network communication for a DHCP Client"""
-    def __init__(self, mac_addr_str: str):
+    def __init__(self, mac_addr_str: str, transport: DHCPTransport = None,
+                 timeout: float = 20, backoff=retransmit_delays, offer_window: float = 0.0,
+                 offer_policy=first_arrival, stats: ServerStats = None, cache: LeaseCache = None,
+                 reboot_timeout: float = 2.0, prober=None, max_declines: int = 1, decline_delay: float = 10.0):
         
         self.mac_addr_str = mac_addr_str
+        self.transport = transport
+        self.timeout = timeout # overall budget for the D-O-R-A exchange, in seconds
+        self.backoff = backoff # returns an iterator of retransmission delays
+        # how long to keep collecting OFFERs after the first one; 0 takes the first OFFER
+        self.offer_window = offer_window
+        self.offer_policy = offer_policy # ranks the collected offers, see offer_selection
+        self.stats = stats if stats is not None else server_stats
+        self.offers = [] # offers not taken yet, best first; tried in turn when a server NAKs
+        # remembers ACKed leases; when set, a MAC found in it first tries INIT-REBOOT
+        self.cache = cache
+        self.reboot_timeout = reboot_timeout # budget of the INIT-REBOOT attempt before falling back to DISCOVER
+        # an open ARPProber: ACKed addresses are probed and DECLINEd if in use, see _address_in_use
+        self.prober = prober
+        self.max_declines = max_declines # new D-O-R-A attempts after a DECLINE
+        self.decline_delay = decline_delay # wait before the next DISCOVER (RFC 2131 3.1.5 suggests 10 s)
+        self.declines = 0
+        self.retransmissions = 0
         self.socket = None
         self.xid = None
         self.offered_ip = None
         self.server_id = None
         self.assigned_ip = None
+        self.lease = None
         self.state = "INITIALIZING"
+        self._inbox = None
+        self._deadline = None
+        self._last_packet = None
+        self._server_ip = None # where _last_packet goes; None broadcasts it
+        self._delays = None
+        self._retransmit_at = None
+        self._sent_at = None # first transmission of the current packet, for latency metrics
+        self._retransmitted = False
+        # callbacks receiving a DHCPEvent on every state transition
+        self.listeners = []
 
-        print("Initializing DHCP Client...")
-        self._create_and_bind_socket()
-
+        logger.info("Initializing DHCP Client...")
+        self._attach_transport()
 
-    # function responsible to create and open UDP socket connection on port 68
-    def _create_and_bind_socket(self):
-
-        # close any old socket connection before creating new one
-        if self.socket:
-            self.close()
 
+    # function responsible to attach the client to the shared UDP transport on port 68
+    def _attach_transport(self):
+        """Opens (or joins) the transport. A bind failure is reported in self.state, never by exiting."""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            self.socket.settimeout(10)
-            self.socket.bind(('', 68))
+            if self.transport is None:
+                self.transport = DHCPTransport.shared()
+            else:
+                self.transport.open()
+            self.socket = self.transport.socket
             self.state = "READY"
-            print("Socket created and bound successfully to ('', 68).")
         except OSError as e:
-            print(f"--- SOCKET BINDING ERROR ---")
-            print(f"Error: {e}")
-            print("Could not bind to port 68. This usually means another process is using it,")
-            print("or you don't have sufficient privileges.")
-            print("On Linux/macOS, try running the script with 'sudo'.")
-            print("----------------------------")
-            if self.socket: self.socket.close()
+            config = self.transport.config if self.transport else DHCPTransport.shared_config()
+            logger.error("--- SOCKET BINDING ERROR ---\nError: %s\n"
+                         "Could not bind to %s. This usually means another process is using it,\n"
+                         "or you don't have sufficient privileges.\n"
+                         "On Linux/macOS, try running the script with 'sudo'.", e, config.describe())
             self.socket = None
-            self.state = f"ERROR: Could not bind to port 68. {e}"
-
-            # exit if no socket is found
-            sys.exit(1)
+            self.state = f"ERROR: Could not bind to port {config.client_port}. {e}"
 
     def close(self):
+        """Ends this client's transaction. The shared socket stays open for other clients."""
+        if self.xid is not None and self.transport:
+            self.transport.unregister(self.xid)
+        self._inbox = None
         if self.socket:
-            self.socket.close()
             self.socket = None
-            print("Socket closed.")
+            logger.debug("Transaction closed.")
+
+    def add_listener(self, callback):
+        """Registers callback(event) to be called with a DHCPEvent on every state transition."""
+        self.listeners.append(callback)
+
+    def _emit(self, event_type: str):
+        if not self.listeners: return
+        event = DHCPEvent(event_type, self.mac_addr_str, self.xid, self.state,
+                          assigned_ip=self.assigned_ip, server_id=self.server_id)
+        for callback in self.listeners:
+            try:
+                callback(event)
+            except Exception as ex:
+                logger.warning("[!] Event listener failed: %s", ex)
+
+    # function responsible to send a packet that is retransmitted until its reply arrives
+    def _transmit(self, packet: bytes, server_ip: str = None):
+        """Broadcasts packet, or unicasts it to server_ip, and arms its retransmission."""
+        self._last_packet = packet
+        self._server_ip = server_ip
+        self._delays = self.backoff()
+        self._sent_at = time.monotonic()
+        self._retransmitted = False
+        self._send_last()
+        self._retransmit_at = time.monotonic() + next(self._delays)
+
+    def _send_last(self):
+        if self._server_ip:
+            self.transport.unicast(self._last_packet, self._server_ip)
+        else:
+            self.transport.broadcast(self._last_packet)
+
+    def _await_reply(self, msg_types: tuple, until: float = None):
+        """
+        Waits for a reply of one of msg_types until the exchange deadline (or `until`, if
+        sooner), retransmitting the last packet with randomized exponential backoff. Anything
+        else that arrives is discarded. Returns (msg, addr), or None once the time is up.
+        """
+        deadline = self._deadline if until is None else min(self._deadline, until)
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return None
+            if now >= self._retransmit_at:
+                logger.info("[!] No reply yet. Retransmitting (xid: %#x)...", self.xid)
+                try:
+                    self._send_last()
+                    self.retransmissions += 1
+                    self._retransmitted = True
+                    RETRANSMISSIONS.inc()
+                except OSError as ex:
+                    logger.warning("[!] Network error: %s", ex)
+                self._retransmit_at = now + next(self._delays)
+
+            try:
+                msg, addr = self._inbox.get(timeout=min(deadline, self._retransmit_at) - now)
+            except queue.Empty:
+                continue
+            if msg.xid == self.xid and msg.options.get(53) in msg_types:
+                return msg, addr
+            NON_MATCHING.labels('unexpected_type').inc()
+            logger.debug("[!] Received non-matching packet. Ignoring.")
+
+    # function responsible to start a new exchange with its own xid and time budget
+    def _begin(self, msg: DHCPMessage, budget: float):
+        # the budget covers the whole exchange, retransmissions included
+        self._deadline = time.monotonic() + budget
+        # register with the transport so replies for this xid are routed to us
+        if self.xid is not None:
+            self.transport.unregister(self.xid)
+        self.xid, self._inbox = self.transport.register(msg.chaddr)
+        msg.xid = self.xid
 
     # DORA functions for the client
     def send_discover(self):
@@ -62,7 +170,7 @@ class DHCPClient:
         try:
             self.state = "Sending DISCOVER..."
             discover_msg = DHCPMessage(self.mac_addr_str)
-            self.xid = discover_msg.xid
+            self._begin(discover_msg, self.timeout)
             discover_msg.options[53]= DHCPDISCOVER
             """
                 1 -> Subnet Mask
@@ -70,48 +178,74 @@ class DHCPClient:
                 6 -> DNS Server
                 15 -> Domain Name
             """
-            discover_msg.options[55] = [1,3,6,15] 
+            discover_msg.options[55] = DEFAULT_PARAMETER_REQUEST_LIST
             packed_discover = discover_msg.pack()
-            print(f"[D] Sending DHCPDISCOVER (xid: {hex(self.xid)})...")
-            self.socket.sendto(packed_discover, ('<broadcast>', 67))
+            logger.info("[D] Sending DHCPDISCOVER (xid: %#x)...", self.xid)
+            self._transmit(packed_discover)
+            self._emit(DISCOVER_SENT)
         except OSError as ex:
             self.state = f"FAILED: Network error on DISCOVER. {ex}"
-            print(f"[!] Network error: {ex}")
+            logger.warning("[!] Network error: %s", ex)
 
     def receive_offer(self):
 
         # check if socket is present
         if not self.socket: return False
         self.state = "Waiting for OFFER..."
-        print("[O] Waiting for DHCPOFFER...")
+        logger.info("[O] Waiting for DHCPOFFER...")
         try:
-            # get packets and address from the socket
-            packet, addr = self.socket.recvfrom(1024)
-            offer_msg = DHCPMessage().unpack(packet)
-
-            # validate the offer
-            if offer_msg.xid == self.xid and offer_msg.options.get(53) == DHCPOFFER:
-
-                # store offered ip and server id
-                self.offered_ip = offer_msg.yiaddr
-                self.server_id = offer_msg.options.get(54)
-                self.state = f"Offer received for {self.offered_ip}"
-                print(f"[O] Received DHCPOFFER from {addr[0]} ({self.server_id})")
-                print(f"    Offered IP: {self.offered_ip}")
-                return True
-            else:
-                print("[!] Received non-matching packet. Ignoring.")
+            # get the OFFER routed to our xid by the transport, retransmitting the DISCOVER meanwhile
+            reply = self._await_reply((DHCPOFFER,))
+            if reply is None:
+                self.state = "Timeout waiting for OFFER."
+                TIMEOUTS.labels('offer').inc()
+                logger.warning("[!] Timed out waiting for DHCPOFFER.")
+                self._emit(TIMEOUT)
                 return False
+            offer_msg, addr = reply
+            OFFER_LATENCY.observe(time.monotonic() - self._sent_at)
+            offers = [Offer(offer_msg, addr, self._rtt())]
+
+            if self.offer_window > 0:
+                # every server has the DISCOVER by now, so stop retransmitting and listen for the others
+                self._retransmit_at = float('inf')
+                offers.extend(self._collect_offers(time.monotonic() + self.offer_window, {offers[0].server_id}))
+            for offer in offers:
+                self.stats.observe_offer(offer.server_id, offer.rtt)
+
+            self.offers = self.offer_policy(offers, self.stats)
+            self._take_offer(self.offers.pop(0))
+            logger.info("[O] Received DHCPOFFER from %s (%s)\n    Offered IP: %s", addr[0], self.server_id, self.offered_ip)
+            self._emit(OFFER_RECEIVED)
+            return True
 
-        except socket.timeout:
-            self.state = "Timeout waiting for OFFER."
-            print("[!] Socket timedout waiting for DHCPOFFER.")
-            return False
         except Exception as ex:
             self.state = f"FAILED: Error parsing OFFER. {ex}"
-            print(f"[!] Packet parsing error: {ex}\n{traceback.format_exc()}")
+            logger.exception("[!] Packet parsing error: %s", ex)
             return False
 
+    def _rtt(self) -> float:
+        """Time since the current packet was sent, or None if it was retransmitted and the reply is ambiguous."""
+        return None if self._retransmitted else time.monotonic() - self._sent_at
+
+    def _collect_offers(self, until: float, seen: set) -> list:
+        """OFFERs arriving before `until` from servers not in `seen`, one per server."""
+        offers = []
+        while True:
+            reply = self._await_reply((DHCPOFFER,), until)
+            if reply is None:
+                return offers
+            offer = Offer(reply[0], reply[1], self._rtt())
+            if offer.server_id not in seen:
+                seen.add(offer.server_id)
+                offers.append(offer)
+
+    def _take_offer(self, offer: Offer):
+        # store offered ip and server id
+        self.offered_ip = offer.ip
+        self.server_id = offer.server_id
+        self.state = f"Offer received for {self.offered_ip}"
+
     def send_request(self):
         
         # check if the socket is available and an ip is offered
@@ -126,65 +260,215 @@ class DHCPClient:
             request_msg.options[50] = self.offered_ip
             request_msg.options[54] = self.server_id
             packed_request = request_msg.pack()
-            print(f"\n[R] Sending DHCPREQUEST for {self.offered_ip}...")
+            logger.info("[R] Sending DHCPREQUEST for %s...", self.offered_ip)
             # broadcast the dhcp message on port 67
-            self.socket.sendto(packed_request, ('<broadcast>', 67)) 
+            self._transmit(packed_request)
+            self._emit(REQUEST_SENT)
         except OSError as ex:
             self.state = f"FAILED: Network error on REQUEST. {ex}"
-            print(f"[!] Network error: {ex}")
+            logger.warning("[!] Network error: %s", ex)
 
     def receive_acknowledgement(self):
         
         if not self.socket: return False
         self.state = "Waiting for ACK..."
-        print("[A] Waiting for DHCPACK/DHCPNAK...")
+        logger.info("[A] Waiting for DHCPACK/DHCPNAK...")
 
         try:
 
-            packet, addr = self.socket.recvfrom(1024)
-            ack_msg = DHCPMessage.unpack(packet)
-
-            if ack_msg.xid == self.xid:
-                
-                msg_type = ack_msg.options.get(53)
-                if msg_type == DHCPACK:
-                    self.assigned_ip = ack_msg.yiaddr
-                    self.state = "SUCCESS"
-                    print(f"[A] Received DHCPACK from {addr[0]}")
-                    print(f"    IP Address {self.assigned_ip} is now leased.")
-                    return True
-                elif msg_type == DHCPNAK:
-                    self.state = "FAILED: Server denied the request (NAK)."
-                    print(f"[!] Received DHCPNAK from {addr[0]}. Offer declined.")
-                    return False
+            reply = self._await_reply((DHCPACK, DHCPNAK))
+            if reply is None:
+                self.state = "FAILED: Timeout waiting for ACK."
+                TIMEOUTS.labels('ack').inc()
+                logger.warning("[!] Timed out waiting for DHCPACK/NAK.")
+                self._emit(TIMEOUT)
+                return False
+            ack_msg, addr = reply
+            ACK_LATENCY.observe(time.monotonic() - self._sent_at)
+            nak = ack_msg.options.get(53) == DHCPNAK
+            self.stats.observe_reply(self.server_id, nak, self._rtt())
+
+            if nak and self.offers:
+                # only this server refused: REQUEST the next-best offer instead of starting over with a DISCOVER
+                logger.warning("[!] Received DHCPNAK from %s. Trying the offer from %s.", addr[0], self.offers[0].server_id)
+                self._emit(NAK_RECEIVED)
+                self._take_offer(self.offers.pop(0))
+                self.send_request()
+                return self.receive_acknowledgement()
+
+            if ack_msg.options.get(53) == DHCPACK:
+                return self._accept_ack(ack_msg, addr)
             else:
-                print("[!] Received non-matching packet. Ignoring.")
+                self.state = "FAILED: Server denied the request (NAK)."
+                logger.warning("[!] Received DHCPNAK from %s. Offer declined.", addr[0])
+                self._emit(NAK_RECEIVED)
                 return False
 
-        except socket.timeout:
-            self.state = "FAILED: Timeout waiting for ACK."
-            print("[!] Socket timed out waiting for DHCPACK/NAK.")
-            return False
         except Exception as ex:
             self.state = f"FAILED: Error parsing ACK. {ex}"
-            print(f"[!] Packet parsing error: {ex}\n{traceback.format_exc()}")
+            logger.exception("[!] Packet parsing error: %s", ex)
+            return False
+
+    def _accept_ack(self, ack_msg: DHCPMessage, addr: tuple) -> bool:
+        if self.prober is not None and self._address_in_use(ack_msg):
+            return False
+        self.assigned_ip = ack_msg.yiaddr
+        # keep lease time, T1 and T2 so the lease can be renewed later
+        self.lease = Lease.from_ack(self.mac_addr_str, ack_msg, self.server_id)
+        self.server_id = self.lease.server_id
+        if self.cache is not None:
+            self.cache.put(self.lease)
+        self.state = "SUCCESS"
+        logger.info("[A] Received DHCPACK from %s\n    IP Address %s is now leased.", addr[0], self.assigned_ip)
+        self._emit(ACK_RECEIVED)
+        return True
+
+    # function responsible to check an ACKed address with ARP before using it
+    def _address_in_use(self, ack_msg: DHCPMessage) -> bool:
+        """Probes the ACKed address. If another host answers, DECLINEs it and returns True."""
+        ip = ack_msg.yiaddr
+        self.state = f"Probing {ip}..."
+        conflict = self.prober.probe_many([(ip, self.mac_addr_str)])[ip]
+        if conflict is None:
             return False
 
+        self.declines += 1
+        try:
+            decline_msg = DHCPMessage(self.mac_addr_str)
+            decline_msg.xid = self.xid
+            decline_msg.options[53] = DHCPDECLINE
+            decline_msg.options[50] = ip
+            decline_msg.options[54] = ack_msg.options.get(54, self.server_id)
+            self.transport.broadcast(decline_msg.pack())
+        except OSError as ex:
+            logger.warning("[!] Network error on DECLINE: %s", ex)
+        if self.cache is not None:
+            self.cache.discard(self.mac_addr_str)
+        self.assigned_ip = None
+        self.lease = None
+        self.state = f"FAILED: {ip} is in use by {conflict}."
+        logger.warning("[!] %s is already in use by %s. Sent DHCPDECLINE.", ip, conflict)
+        self._emit(DECLINE_SENT)
+        return True
+
+    # function responsible to ask for a remembered address again without a DISCOVER
+    def reboot(self, lease: Lease) -> bool:
+        """
+        INIT-REBOOT (RFC 2131 section 3.2): broadcasts a REQUEST for lease.ip with option 50
+        and no server identifier. Returns True on ACK; False on NAK (the cached lease is
+        then forgotten) or when no server answers within reboot_timeout.
+        """
+        if not self.socket: return False
+
+        try:
+            self.state = f"Sending INIT-REBOOT REQUEST for {lease.ip}..."
+            request_msg = DHCPMessage(self.mac_addr_str)
+            self._begin(request_msg, min(self.reboot_timeout, self.timeout))
+            request_msg.options[53] = DHCPREQUEST
+            request_msg.options[50] = lease.ip
+            request_msg.options[55] = DEFAULT_PARAMETER_REQUEST_LIST
+            logger.info("[R] Sending INIT-REBOOT DHCPREQUEST for %s (xid: %#x)...", lease.ip, self.xid)
+            self._transmit(request_msg.pack())
+            self._emit(REQUEST_SENT)
+        except OSError as ex:
+            logger.warning("[!] Network error on INIT-REBOOT: %s", ex)
+            return False
+
+        self.state = "Waiting for ACK..."
+        reply = self._await_reply((DHCPACK, DHCPNAK))
+        if reply is None:
+            TIMEOUTS.labels('reboot').inc()
+            logger.info("[!] No answer to INIT-REBOOT. Falling back to DISCOVER.")
+            return False
+        ack_msg, addr = reply
+        ACK_LATENCY.observe(time.monotonic() - self._sent_at)
+        try:
+            self.server_id = ack_msg.options.get(54, lease.server_id)
+            nak = ack_msg.options.get(53) == DHCPNAK
+            self.stats.observe_reply(self.server_id, nak, self._rtt())
+            if nak:
+                # the address is no longer ours, e.g. we moved to another subnet
+                if self.cache is not None:
+                    self.cache.discard(self.mac_addr_str)
+                logger.warning("[!] Received DHCPNAK from %s for %s. Falling back to DISCOVER.", addr[0], lease.ip)
+                self._emit(NAK_RECEIVED)
+                return False
+            return self._accept_ack(ack_msg, addr)
+        except ValueError as ex:
+            # options decode lazily: a malformed reply counts as no reply
+            logger.warning("[!] Malformed reply to INIT-REBOOT from %s: %s. Falling back to DISCOVER.", addr[0], ex)
+            return False
+
+    # function responsible to fetch configuration for an address we already have
+    def inform(self, ip: str, server_id: str = None) -> dict:
+        """
+        Sends a DHCPINFORM for an address configured by other means (RFC 2131 section 3.4)
+        and returns the options of the server's ACK, or None if none came. Broadcast unless
+        server_id is given.
+        """
+        if not self.socket: return None
+
+        try:
+            self.state = f"Sending INFORM for {ip}..."
+            inform_msg = DHCPMessage(self.mac_addr_str)
+            self._begin(inform_msg, self.timeout)
+            inform_msg.ciaddr = ip
+            inform_msg.options[53] = DHCPINFORM
+            inform_msg.options[55] = DEFAULT_PARAMETER_REQUEST_LIST
+            logger.info("[I] Sending DHCPINFORM for %s...", ip)
+            self._transmit(inform_msg.pack(), server_id)
+
+            reply = self._await_reply((DHCPACK,))
+            if reply is None:
+                self.state = "FAILED: Timeout waiting for ACK."
+                TIMEOUTS.labels('ack').inc()
+                logger.warning("[!] Timed out waiting for the DHCPACK to DHCPINFORM.")
+                return None
+            ack_msg, addr = reply
+            ACK_LATENCY.observe(time.monotonic() - self._sent_at)
+            self.server_id = ack_msg.options.get(54, addr[0])
+            self.state = "SUCCESS"
+            logger.info("[I] Received configuration from %s", addr[0])
+            return ack_msg.options
+        except OSError as ex:
+            self.state = f"FAILED: Network error on INFORM. {ex}"
+            logger.warning("[!] Network error: %s", ex)
+            return None
+        finally:
+            self.close()
+
     # IP orchestrator
     def request_ip_address(self):
-        """ Execute the full D-O-R-A sequence. """
+        """ Execute INIT-REBOOT for a cached lease, or else the full D-O-R-A sequence. """
         if not self.socket or not self.state == "READY": return None
 
-        self.send_discover()
-        if self.receive_offer():
-            self.send_request()
-            if self.receive_acknowledgement():
-                print(f"--- IP Acquisition Successful ---")
-                print(f"    Assigned IP: {self.assigned_ip}")
-                self.close()
-                return self.assigned_ip
-            
-        print("--- IP Acquisition Failed ---")
+        cached = self.cache.get(self.mac_addr_str) if self.cache is not None else None
+        if cached is not None and self.reboot(cached):
+            logger.info("--- IP Acquisition Successful (INIT-REBOOT) ---\n    Assigned IP: %s", self.assigned_ip)
+            self.close()
+            return self.assigned_ip
+
+        for attempt in range(self.max_declines + 1):
+            if attempt:
+                logger.info("Starting over with a new DISCOVER in %.1f s.", self.decline_delay)
+                time.sleep(self.decline_delay)
+            declines = self.declines
+            self.send_discover()
+            if self.receive_offer():
+                self.send_request()
+                if self.receive_acknowledgement():
+                    logger.info("--- IP Acquisition Successful ---\n    Assigned IP: %s", self.assigned_ip)
+                    self.close()
+                    return self.assigned_ip
+            # only a DECLINE is worth another attempt
+            if self.declines == declines:
+                break
+
+        logger.warning("--- IP Acquisition Failed ---")
+        # make every failure final for status readers, e.g. an OFFER timeout
+        if not self.state.startswith("FAILED"):
+            self.state = f"FAILED: {self.state}"
+        self._emit(FAILED)
         self.close()
         return None
     
@@ -200,11 +484,11 @@ class DHCPClient:
             release_msg.options[54] = server_id # Identify the server
             
             packed_release = release_msg.pack()
-            print(f"\n[RELEASE] Sending DHCPRELEASE for {ip_to_release} to {server_id}...")
+            logger.info("[RELEASE] Sending DHCPRELEASE for %s to %s...", ip_to_release, server_id)
             
             # A DHCPRELEASE is sent unicast to the server that gave the lease.
-            self.socket.sendto(packed_release, (server_id, 67))
+            self.transport.unicast(packed_release, server_id)
         except OSError as ex:
-            print(f"[!] Network error on RELEASE: {ex}")
+            logger.warning("[!] Network error on RELEASE: %s", ex)
         finally:
             self.close()
@@ -1,6 +1,8 @@
+import functools
 import random
 import socket
 import struct
+from .dhcp_options import DHCPOptions
 
 
 # DHCP message OP codes
@@ -20,10 +22,58 @@ DHCPNAK=6
 DHCPRELEASE=7
 DHCPINFORM=8
 
+MAGIC_COOKIE = b'\x63\x82\x53\x63'
+
+# Precompiled layouts: the 236-byte fixed BOOTP header, and the same header followed by the magic cookie.
+# Addresses are read and written as 32-bit integers, so packing needs no string conversion.
+_FIXED_HEADER = struct.Struct('!BBBBIHHIIII16s64s128s')
+_HEADER = struct.Struct('!BBBBIHHIIII16s64s128s4s')
+HEADER_SIZE = _HEADER.size # 240 bytes, options start here
+
+# Empty sname/file fields, shared by every message that does not use them
+_ZERO_SNAME = bytes(64)
+_ZERO_FILE = bytes(128)
+
+
+# Address conversions are cached since a client sees the same few addresses over and over
+@functools.lru_cache(maxsize=4096)
+def ip_to_int(ip: str) -> int:
+    return int.from_bytes(socket.inet_aton(ip), 'big')
+
+@functools.lru_cache(maxsize=4096)
+def int_to_ip(value: int) -> str:
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+
+def _address_property(slot: str, doc: str) -> property:
+    """A dotted-quad view of an address kept as an int; accepts either form on assignment."""
+    def getter(self):
+        return int_to_ip(getattr(self, slot))
+
+    def setter(self, value):
+        setattr(self, slot, value if isinstance(value, int) else ip_to_int(value))
+
+    return property(getter, setter, doc=doc)
+
 
 class DHCPMessage:
     
-    """This class will be used to build and parse a DHCPMessage according to RFC 2131."""
+    """
+    This class will be used to build and parse a DHCPMessage according to RFC 2131.
+
+    Messages use __slots__ and keep addresses as 32-bit ints (ciaddr_int etc.), converting
+    to dotted strings only when ciaddr/yiaddr/siaddr/giaddr are read. Empty sname/file
+    fields share one zero buffer.
+    """
+
+    __slots__ = ('op', 'htype', 'hlen', 'hops', 'xid', 'secs', 'flags',
+                 'ciaddr_int', 'yiaddr_int', 'siaddr_int', 'giaddr_int',
+                 'chaddr', '_chaddr_str', 'sname', 'file', 'magic_cookie', 'options')
+
+    ciaddr = _address_property('ciaddr_int', "client IP address")
+    yiaddr = _address_property('yiaddr_int', "'your' (offered) IP address")
+    siaddr = _address_property('siaddr_int', "IP address of the next server")
+    giaddr = _address_property('giaddr_int', "relay agent IP address")
 
     def __init__(self, mac_addr_str: str = "00:00:00:00:00:00"):
         
@@ -41,112 +91,111 @@ class DHCPMessage:
 
         self.flags = 0
 
-        self.ciaddr = '0.0.0.0' # client IP address 
+        self.ciaddr_int = 0 # client IP address 
 
-        self.yiaddr = '0.0.0.0' # own IP address
+        self.yiaddr_int = 0 # own IP address
 
-        self.siaddr = '0.0.0.0' # IP address of the next server
+        self.siaddr_int = 0 # IP address of the next server
 
-        self.giaddr = '0.0.0.0' # Relay agent IP address
+        self.giaddr_int = 0 # Relay agent IP address
         
         # client hardware address
-        self.chaddr_str = mac_addr_str
+        self._chaddr_str = mac_addr_str
         self.chaddr = self._mac_str_to_bytes(mac_addr_str)
 
-        self.sname = b'\x00' * 64 # server hostname
+        self.sname = _ZERO_SNAME # server hostname
+
+        self.file = _ZERO_FILE # boot file name
 
-        self.file = b'\x00' * 128 # boot file name
+        self.magic_cookie = MAGIC_COOKIE # identify the start of the DHCP options field
 
-        self.magic_cookie = b'\x63\x82\x53\x63' # identify the start of the DHCP options field
+        self.options = DHCPOptions() # optional params, keyed by option code
 
-        self.options = {} # optional params
 
+    @property
+    def chaddr_str(self) -> str:
+        # built on first use; the transport matches replies on the raw chaddr
+        if self._chaddr_str is None:
+            self._chaddr_str = self.chaddr[:6].hex(':')
+        return self._chaddr_str
+
+    @chaddr_str.setter
+    def chaddr_str(self, value: str):
+        self._chaddr_str = value
 
     def _mac_str_to_bytes(self, mac_str: str) -> bytes:
         """ Converts MAC address string to bytes, padding to 16 bytes for chaddr field.  """
         mac_bytes = bytes.fromhex(mac_str.replace(':', ''))
         return mac_bytes.ljust(16, b'\x00')
     
-    def _mac_bytes_to_str(self, mac_bytes: bytes) -> str:
-        """Converts raw MAC address bytes (first 6 bytes of chaddr) to a string."""
-        return ':'.join(f'{b:02x}' for b in mac_bytes[:6])
-    
     def _pack_options(self) -> bytes:
-        """ Packs the options dictionary into a bytes string. """
-
-        packed_options = bytearray()
-        if 53 in self.options: # dhcp message type
-            packed_options.extend([53,1,self.options[53]])
-        if 55 in self.options: # parameter request list
-            params = self.options[55]
-            packed_options.extend([55,len(params)])
-            packed_options.extend(params)
-        if 50 in self.options: # requested IP address
-            packed_options.extend([50,4])
-            packed_options.extend(socket.inet_aton(self.options[50]))
-        if 54 in self.options:
-            packed_options.extend([54,4])
-            packed_options.extend(socket.inet_aton(self.options[54]))
-        packed_options.append(255) # end option
-        return bytes(packed_options)
+        """ Packs the options into a bytes string using the option codec registry. """
+        options = self.options
+        if not isinstance(options, DHCPOptions):
+            options = DHCPOptions(options)
+        return options.pack()
 
     def pack(self) -> bytes:
         """ Packs the DHCPMessage Object into a bytes object for network transmission """
-        packet = struct.pack('!BBBBIHH',
-                             self.op, self.htype, self.hlen, self.hops,
-                             self.xid, self.secs, self.flags)
-        packet += socket.inet_aton(self.ciaddr)
-        packet += socket.inet_aton(self.yiaddr)
-        packet += socket.inet_aton(self.siaddr)
-        packet += socket.inet_aton(self.giaddr)
-        packet += self.chaddr
-        packet += self.sname
-        packet += self.file
-        packet += self.magic_cookie
-        packet += self._pack_options()
-        return packet
+        return self._pack_header() + self._pack_options()
+
+    def _pack_header(self) -> bytes:
+        return _HEADER.pack(self.op, self.htype, self.hlen, self.hops,
+                            self.xid, self.secs, self.flags,
+                            self.ciaddr_int, self.yiaddr_int, self.siaddr_int, self.giaddr_int,
+                            self.chaddr, self.sname, self.file, self.magic_cookie)
+
+    def pack_into(self, buffer, offset: int = 0) -> int:
+        """
+        Packs the message directly into a preallocated bytearray or writable memoryview,
+        starting at offset. Returns the number of bytes written.
+        Lets a send loop reuse one buffer instead of allocating a new packet per message.
+        """
+        options = self._pack_options()
+        end = offset + HEADER_SIZE + len(options)
+        if end > len(buffer):
+            raise ValueError(f"buffer too small: need {end} bytes, have {len(buffer)}")
+
+        _HEADER.pack_into(buffer, offset, self.op, self.htype, self.hlen, self.hops,
+                          self.xid, self.secs, self.flags,
+                          self.ciaddr_int, self.yiaddr_int, self.siaddr_int, self.giaddr_int,
+                          self.chaddr, self.sname, self.file, self.magic_cookie)
+        buffer[offset + HEADER_SIZE:end] = options
+        return end - offset
     
     @staticmethod
-    def _parse_options(options_bytes: str) -> dict:
-        """Parses the raw options bytes into a dictionary"""
-        options = {}
-        i = 0
-        while i < len(options_bytes):
-            option_code = options_bytes[i]
-            if option_code == 255: # end option
-                break
-
-            if option_code == 0:
-                i += 1
-                continue
-
-            option_len = options_bytes[i+1]
-            option_val_start = i + 2
-            option_val_end = option_val_start + option_len
-            option_value = options_bytes[option_val_start:option_val_end]
-            if option_code in [50, 54]: # IP Address
-                 options[option_code] = socket.inet_ntoa(option_value)
-            elif option_code == 53: # DHCP Message Type
-                options[option_code] = struct.unpack('!B', option_value)[0]
-            else: # Other options as raw bytes
-                options[option_code] = option_value
-            
-            i = option_val_end
-        return options
+    def _parse_options(options_bytes, sname: bytes = b'', file: bytes = b'') -> DHCPOptions:
+        """Indexes the raw options bytes. Each option is decoded only when it is read."""
+        return DHCPOptions.from_buffer(options_bytes, sname, file)
     
     @staticmethod
     def unpack(packet: bytes) -> 'DHCPMessage':
         """
         Unpacks a bytes object from a network response into a DHCPMessage object.
         """
-        # Unpack the fixed-size part of the packet
-        fixed_part = packet[:236]
+        return DHCPMessage.unpack_from(packet)
+
+    @staticmethod
+    def unpack_from(buffer, offset: int = 0, length: int = None) -> 'DHCPMessage':
+        """
+        Unpacks a message straight out of bytes, a bytearray or a memoryview without
+        slicing out the fixed header. length limits the packet when the buffer is
+        reused and larger than the datagram in it.
+
+        Raises ValueError for a truncated header; truncated options are dropped, and a
+        malformed option value raises ValueError when it is read.
+        """
+        end = len(buffer) if length is None else offset + length
+        if end - offset < _FIXED_HEADER.size:
+            raise ValueError(f"packet too short: {end - offset} bytes, a DHCP header needs {_FIXED_HEADER.size}")
+
+        # Unpack the fixed-size part of the packet in place
         (op, htype, hlen, hops, xid, secs, flags,
-         ciaddr_raw, yiaddr_raw, siaddr_raw, giaddr_raw,
-         chaddr, sname, file) = struct.unpack('!BBBBIHH4s4s4s4s16s64s128s', fixed_part)
+         ciaddr, yiaddr, siaddr, giaddr,
+         chaddr, sname, file) = _FIXED_HEADER.unpack_from(buffer, offset)
 
-        # Create a message object to hold the data
-        msg = DHCPMessage()
+        # Bypass __init__, which would draw a random xid only to overwrite it
+        msg = DHCPMessage.__new__(DHCPMessage)
         msg.op = op
         msg.htype = htype
         msg.hlen = hlen
@@ -154,21 +203,24 @@ class DHCPMessage:
         msg.xid = xid
         msg.secs = secs
         msg.flags = flags
-        msg.ciaddr = socket.inet_ntoa(ciaddr_raw)
-        msg.yiaddr = socket.inet_ntoa(yiaddr_raw)
-        msg.siaddr = socket.inet_ntoa(siaddr_raw)
-        msg.giaddr = socket.inet_ntoa(giaddr_raw)
+        msg.ciaddr_int = ciaddr
+        msg.yiaddr_int = yiaddr
+        msg.siaddr_int = siaddr
+        msg.giaddr_int = giaddr
         msg.chaddr = chaddr
-        msg.chaddr_str = msg._mac_bytes_to_str(chaddr)
-        msg.sname = sname
-        msg.file = file
+        msg._chaddr_str = None
+        # almost every server leaves these empty; keep the shared zero buffers instead
+        msg.sname = _ZERO_SNAME if sname == _ZERO_SNAME else sname
+        msg.file = _ZERO_FILE if file == _ZERO_FILE else file
 
         # The rest of the packet contains the magic cookie and options
-        magic_cookie_and_options = packet[236:]
-        msg.magic_cookie = magic_cookie_and_options[:4]
-        
-        if msg.magic_cookie == b'\x63\x82\x53\x63':
-            msg.options = DHCPMessage._parse_options(magic_cookie_and_options[4:])
+        cookie_start = offset + 236
+        cookie = bytes(buffer[cookie_start:min(cookie_start + 4, end)])
+        msg.magic_cookie = MAGIC_COOKIE if cookie == MAGIC_COOKIE else cookie
+        if cookie == MAGIC_COOKIE:
+            msg.options = DHCPMessage._parse_options(memoryview(buffer)[cookie_start + 4:end], sname, file)
+        else:
+            msg.options = DHCPOptions()
 
         return msg
 
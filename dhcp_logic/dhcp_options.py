@@ -0,0 +1,344 @@
+import socket
+import struct
+from collections.abc import MutableMapping
+
+
+# DHCP option codes (RFC 2132)
+
+PAD=0
+SUBNET_MASK=1
+TIME_OFFSET=2
+ROUTER=3
+DNS_SERVERS=6
+HOST_NAME=12
+DOMAIN_NAME=15
+INTERFACE_MTU=26
+BROADCAST_ADDRESS=28
+NTP_SERVERS=42
+REQUESTED_IP=50
+LEASE_TIME=51
+OPTION_OVERLOAD=52
+MESSAGE_TYPE=53
+SERVER_ID=54
+PARAMETER_REQUEST_LIST=55
+MESSAGE=56
+MAX_MESSAGE_SIZE=57
+RENEWAL_TIME=58 # T1
+REBINDING_TIME=59 # T2
+VENDOR_CLASS_ID=60
+CLIENT_ID=61
+RELAY_AGENT_INFORMATION=82
+END=255
+
+# Option 82 sub-options (RFC 3046)
+AGENT_CIRCUIT_ID=1
+AGENT_REMOTE_ID=2
+
+# Option 52 values: which header fields carry extra options
+OVERLOAD_FILE=1
+OVERLOAD_SNAME=2
+OVERLOAD_BOTH=3
+
+# Option 55 sent with every DISCOVER: subnet mask, router, DNS servers, domain name.
+# A tuple rather than a list so its encoded form is cached.
+DEFAULT_PARAMETER_REQUEST_LIST = (SUBNET_MASK, ROUTER, DNS_SERVERS, DOMAIN_NAME)
+
+
+class OptionCodec:
+    """Describes how one option code is converted between raw bytes and a Python value."""
+
+    __slots__ = ('name', 'encode', 'decode')
+
+    def __init__(self, name: str, encode, decode):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+_U16 = struct.Struct('!H')
+_U32 = struct.Struct('!I')
+_I32 = struct.Struct('!i')
+
+
+def _decode_ip(raw: bytes) -> str:
+    return socket.inet_ntoa(raw)
+
+def _decode_ip_list(raw: bytes) -> list:
+    return [socket.inet_ntoa(raw[i:i + 4]) for i in range(0, len(raw) - 3, 4)]
+
+def _encode_ip_list(value) -> bytes:
+    return b''.join(socket.inet_aton(ip) for ip in value)
+
+def _decode_str(raw: bytes) -> str:
+    # servers pad strings with NULs now and then
+    return raw.rstrip(b'\x00').decode('utf-8', 'replace')
+
+def _encode_str(value) -> bytes:
+    return value.encode('utf-8') if isinstance(value, str) else bytes(value)
+
+
+def _encode_sub_options(value) -> bytes:
+    # {subcode: value} or ((subcode, value), ...); values are bytes or str
+    items = value.items() if isinstance(value, dict) else value
+    parts = []
+    for subcode, data in items:
+        data = _encode_str(data)
+        parts.append(bytes((subcode, len(data))) + data)
+    return b''.join(parts)
+
+def _decode_sub_options(raw: bytes) -> dict:
+    sub_options = {}
+    i = 0
+    while i + 1 < len(raw):
+        subcode, length = raw[i], raw[i + 1]
+        sub_options[subcode] = bytes(raw[i + 2:i + 2 + length])
+        i += 2 + length
+    return sub_options
+
+
+_IP = (socket.inet_aton, _decode_ip)
+_IP_LIST = (_encode_ip_list, _decode_ip_list)
+_U8 = (lambda value: bytes((value,)), lambda raw: raw[0])
+_U16_CODEC = (_U16.pack, lambda raw: _U16.unpack(raw)[0])
+_U32_CODEC = (_U32.pack, lambda raw: _U32.unpack(raw)[0])
+_I32_CODEC = (_I32.pack, lambda raw: _I32.unpack(raw)[0])
+_U8_LIST = (bytes, list)
+_STR = (_encode_str, _decode_str)
+_RAW = (bytes, bytes)
+
+
+# Table-driven registry: option code -> codec. Codes missing here are kept as raw bytes.
+OPTION_CODECS = {
+    SUBNET_MASK: OptionCodec('subnet_mask', *_IP),
+    TIME_OFFSET: OptionCodec('time_offset', *_I32_CODEC),
+    ROUTER: OptionCodec('routers', *_IP_LIST),
+    DNS_SERVERS: OptionCodec('dns_servers', *_IP_LIST),
+    HOST_NAME: OptionCodec('host_name', *_STR),
+    DOMAIN_NAME: OptionCodec('domain_name', *_STR),
+    INTERFACE_MTU: OptionCodec('interface_mtu', *_U16_CODEC),
+    BROADCAST_ADDRESS: OptionCodec('broadcast_address', *_IP),
+    NTP_SERVERS: OptionCodec('ntp_servers', *_IP_LIST),
+    REQUESTED_IP: OptionCodec('requested_ip', *_IP),
+    LEASE_TIME: OptionCodec('lease_time', *_U32_CODEC),
+    OPTION_OVERLOAD: OptionCodec('option_overload', *_U8),
+    MESSAGE_TYPE: OptionCodec('message_type', *_U8),
+    SERVER_ID: OptionCodec('server_id', *_IP),
+    PARAMETER_REQUEST_LIST: OptionCodec('parameter_request_list', *_U8_LIST),
+    MESSAGE: OptionCodec('message', *_STR),
+    MAX_MESSAGE_SIZE: OptionCodec('max_message_size', *_U16_CODEC),
+    RENEWAL_TIME: OptionCodec('renewal_time', *_U32_CODEC),
+    REBINDING_TIME: OptionCodec('rebinding_time', *_U32_CODEC),
+    VENDOR_CLASS_ID: OptionCodec('vendor_class_id', *_RAW),
+    CLIENT_ID: OptionCodec('client_id', *_RAW),
+    RELAY_AGENT_INFORMATION: OptionCodec('relay_agent_information', _encode_sub_options, _decode_sub_options),
+}
+
+
+def register_option(code: int, codec: OptionCodec):
+    """Adds or replaces the codec used for an option code."""
+    OPTION_CODECS[code] = codec
+    _ENCODE_CACHE.clear()
+
+
+def decode_option(code: int, raw: bytes):
+    """Decodes one option value. Raises ValueError when the value does not fit its codec, e.g. a 3-byte address."""
+    codec = OPTION_CODECS.get(code)
+    if codec is None:
+        return raw
+    try:
+        return codec.decode(raw)
+    except (ValueError, OSError, IndexError, struct.error) as ex:
+        raise ValueError(f"malformed option {code} ({len(raw)} bytes): {ex}") from None
+
+
+# Encoded form of recently used (code, value) pairs with hashable values,
+# since a client sends the same message type, server id and addresses over and over
+_ENCODE_CACHE = {}
+_ENCODE_CACHE_SIZE = 4096
+
+
+def encode_option(code: int, value) -> bytes:
+    """Encodes one option as code/length/value. Values over 255 bytes are split (RFC 3396)."""
+    try:
+        return _ENCODE_CACHE[code, value]
+    except KeyError:
+        cacheable = True
+    except TypeError:
+        cacheable = False # lists and other unhashable values
+
+    encoded = _encode_option(code, value)
+    if cacheable:
+        if len(_ENCODE_CACHE) >= _ENCODE_CACHE_SIZE:
+            _ENCODE_CACHE.clear()
+        _ENCODE_CACHE[code, value] = encoded
+    return encoded
+
+
+def _encode_option(code: int, value) -> bytes:
+    codec = OPTION_CODECS.get(code)
+    if codec is not None:
+        raw = codec.encode(value)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        raw = bytes(value)
+    else:
+        raise ValueError(f"No codec registered for option {code}; pass the value as raw bytes.")
+    return _split_option(code, raw)
+
+
+def _split_option(code: int, raw: bytes) -> bytes:
+    """Code/length/value for an encoded value, in 255-byte pieces if longer (RFC 3396)."""
+    if len(raw) <= 255:
+        return bytes((code, len(raw))) + raw
+    return b''.join(bytes((code, len(raw[i:i + 255]))) + raw[i:i + 255] for i in range(0, len(raw), 255))
+
+
+def _index_options(data: bytes, start: int, end: int, index: dict):
+    """
+    Walks one options region and records (offset, length) per option code.
+    Stops at END or at a truncated option.
+    """
+    i = start
+    while i < end:
+        code = data[i]
+        if code == END:
+            break
+        if code == PAD:
+            i += 1
+            continue
+        if i + 1 >= end:
+            break
+        value_start = i + 2
+        value_end = value_start + data[i + 1]
+        if value_end > end:
+            break
+        segments = index.get(code)
+        if segments is None:
+            index[code] = [(value_start, value_end - value_start)]
+        else:
+            # a repeated code continues the same option (RFC 3396)
+            segments.append((value_start, value_end - value_start))
+        i = value_end
+
+
+class DHCPOptions(MutableMapping):
+    """
+    The options of a DHCP message, keyed by option code.
+
+    Received options are indexed once into (offset, length) entries and each one is
+    only decoded when it is first read, so code that looks at option 53 alone
+    pays for nothing else. Options that are never read are re-emitted verbatim by pack().
+    """
+
+    __slots__ = ('_data', '_index', '_values')
+
+    def __init__(self, values=None):
+        self._data = b''
+        self._index = {}
+        self._values = {}
+        if values:
+            self.update(values)
+
+    @classmethod
+    def from_buffer(cls, options_bytes, sname: bytes = b'', file: bytes = b'') -> 'DHCPOptions':
+        """Indexes a raw options region, following option 52 into the file and sname fields."""
+        options = cls.__new__(cls)
+        data = bytes(options_bytes)
+        index = {}
+        _index_options(data, 0, len(data), index)
+
+        overload = index.get(OPTION_OVERLOAD)
+        if overload:
+            offset, length = overload[0]
+            flag = data[offset] if length else 0
+            # RFC 2131: the file field is read before sname
+            for field, bit in ((file, OVERLOAD_FILE), (sname, OVERLOAD_SNAME)):
+                if flag & bit and field:
+                    base = len(data)
+                    data += bytes(field)
+                    _index_options(data, base, len(data), index)
+
+        options._data = data
+        options._index = index
+        options._values = {}
+        return options
+
+    def raw(self, code: int) -> bytes:
+        """Returns the undecoded bytes of an option."""
+        segments = self._index.get(code)
+        if segments is not None:
+            data = self._data
+            if len(segments) == 1:
+                offset, length = segments[0]
+                return data[offset:offset + length]
+            return b''.join(data[offset:offset + length] for offset, length in segments)
+        return OPTION_CODECS[code].encode(self._values[code]) if code in OPTION_CODECS else bytes(self._values[code])
+
+    def __getitem__(self, code):
+        values = self._values
+        if code in values:
+            return values[code]
+        if code not in self._index:
+            raise KeyError(code)
+        value = decode_option(code, self.raw(code))
+        values[code] = value
+        return value
+
+    def __setitem__(self, code, value):
+        self._values[code] = value
+        self._index.pop(code, None)
+
+    def __delitem__(self, code):
+        found = self._index.pop(code, None) is not None
+        found = self._values.pop(code, None) is not None or found
+        if not found:
+            raise KeyError(code)
+
+    def __contains__(self, code):
+        return code in self._values or code in self._index
+
+    def __iter__(self):
+        yield from self._index
+        for code in self._values:
+            if code not in self._index:
+                yield code
+
+    def __len__(self):
+        return len(self._index) + sum(1 for code in self._values if code not in self._index)
+
+    def get(self, code, default=None):
+        # Mapping.get goes through __getitem__ and a KeyError; this is the hot path for option 53
+        if code in self._values:
+            return self._values[code]
+        if code in self._index:
+            return self[code]
+        return default
+
+    def pack(self) -> bytes:
+        """Encodes every option followed by the END option. The message type is always written first."""
+        index = self._index
+        values = self._values
+        parts = []
+        if MESSAGE_TYPE in values:
+            parts.append(bytes((MESSAGE_TYPE, 1, values[MESSAGE_TYPE])))
+        elif MESSAGE_TYPE in index:
+            offset, length = index[MESSAGE_TYPE][0]
+            if length: # an empty option 53 is dropped rather than read past
+                parts.append(bytes((MESSAGE_TYPE, 1, self._data[offset])))
+
+        # untouched received options are copied through without a decode/encode round trip
+        for code in index:
+            if code == MESSAGE_TYPE or code == OPTION_OVERLOAD:
+                # overloaded fields are flattened into the options region on re-encode
+                continue
+            raw = self.raw(code)
+            parts.append(_split_option(code, raw))
+
+        for code, value in values.items():
+            if code == MESSAGE_TYPE or code in index:
+                continue
+            parts.append(encode_option(code, value))
+        parts.append(b'\xff')
+        return b''.join(parts)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
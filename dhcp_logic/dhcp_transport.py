@@ -0,0 +1,276 @@
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+from .dhcp_message import DHCPMessage
+from .metrics import IN_FLIGHT, MALFORMED, NON_MATCHING, count_received, count_sent
+from .transmit_scheduler import TransmitScheduler
+
+logger = logging.getLogger(__name__)
+
+# requested socket receive buffer; the kernel caps it at net.core.rmem_max
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Linux socket option binding a socket to one interface (not exported by every Python build)
+SO_BINDTODEVICE = getattr(socket, 'SO_BINDTODEVICE', 25)
+
+
+class TransportConfig:
+    """
+    Where and how the client socket is bound.
+
+    interface binds the socket to one network interface (SO_BINDTODEVICE, Linux, needs
+    CAP_NET_RAW), so several processes can each drive their own NIC. source_address binds
+    to one local address instead of all of them; note that a socket bound to a unicast
+    address no longer receives replies broadcast to 255.255.255.255. reuse_port lets
+    several processes bind the same port (SO_REUSEPORT); the kernel then spreads unicast
+    replies across them, so each process must be ready to see replies meant for another.
+    link_layer sends and receives whole Ethernet frames on `interface` instead (see
+    PacketTransport), so every virtual client uses its own source MAC.
+
+    transmit_rate caps the packets sent per second, server_rate the packets per second
+    to any one destination, and start_jitter delays the first packet of each exchange by
+    up to that many seconds; see TransmitScheduler. The limits apply per transport, so
+    per process with DHCP_WORKERS.
+    """
+
+    def __init__(self, client_port: int = 68, server_port: int = 67, broadcast_address: str = '<broadcast>',
+                 interface: str = None, source_address: str = '', reuse_port: bool = False,
+                 receive_buffer: int = RECEIVE_BUFFER_SIZE, link_layer: bool = False,
+                 transmit_rate: float = None, server_rate: float = None, start_jitter: float = 0.0):
+
+        self.client_port = client_port
+        self.server_port = server_port
+        self.broadcast_address = broadcast_address # e.g. 127.0.0.1 to talk to a LoopbackDHCPServer
+        self.interface = interface
+        self.source_address = source_address
+        self.reuse_port = reuse_port
+        self.receive_buffer = receive_buffer
+        self.link_layer = link_layer
+        self.transmit_rate = transmit_rate
+        self.server_rate = server_rate
+        self.start_jitter = start_jitter
+
+    @classmethod
+    def from_env(cls, environ=os.environ) -> 'TransportConfig':
+        """
+        Reads DHCP_CLIENT_PORT, DHCP_SERVER_PORT, DHCP_BROADCAST_ADDRESS, DHCP_INTERFACE, DHCP_SOURCE_ADDRESS,
+        DHCP_REUSE_PORT, DHCP_LINK_LAYER, DHCP_TRANSMIT_RATE, DHCP_SERVER_RATE and DHCP_START_JITTER.
+        """
+        return cls(client_port=int(environ.get('DHCP_CLIENT_PORT', 68)),
+                   server_port=int(environ.get('DHCP_SERVER_PORT', 67)),
+                   broadcast_address=environ.get('DHCP_BROADCAST_ADDRESS', '<broadcast>'),
+                   interface=environ.get('DHCP_INTERFACE') or None,
+                   source_address=environ.get('DHCP_SOURCE_ADDRESS', ''),
+                   reuse_port=environ.get('DHCP_REUSE_PORT', '').lower() in ('1', 'true', 'yes'),
+                   link_layer=environ.get('DHCP_LINK_LAYER', '').lower() in ('1', 'true', 'yes'),
+                   transmit_rate=float(environ.get('DHCP_TRANSMIT_RATE', 0)) or None,
+                   server_rate=float(environ.get('DHCP_SERVER_RATE', 0)) or None,
+                   start_jitter=float(environ.get('DHCP_START_JITTER', 0)))
+
+    def describe(self) -> str:
+        if self.link_layer:
+            return f"{self.interface} (link layer, UDP port {self.client_port})"
+        where = f"('{self.source_address}', {self.client_port})"
+        return f"{where} on {self.interface}" if self.interface else where
+
+
+def open_socket(config: TransportConfig) -> socket.socket:
+    """Creates the client UDP socket described by config. Raises OSError if any step fails."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        # bursts of replies for many transactions must not overflow the default buffer
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, config.receive_buffer)
+        if config.reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise OSError("SO_REUSEPORT is not supported on this platform")
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if config.interface:
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, config.interface.encode() + b'\0')
+        sock.bind((config.source_address, config.client_port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class DHCPTransport:
+    """Owns the client UDP socket (port 68) and routes replies to waiting transactions by xid."""
+
+    _shared = None
+    _shared_config = TransportConfig()
+    _shared_class = None # class of the process-wide transport; DHCPTransport when None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, config: TransportConfig = None, **settings):
+        """Takes a TransportConfig, or its settings as keywords, e.g. DHCPTransport(client_port=16868)."""
+
+        self.config = config if config is not None else TransportConfig(**settings)
+        self.client_port = self.config.client_port
+        self.server_port = self.config.server_port
+        self.broadcast_address = self.config.broadcast_address
+        self.socket = None
+        self.scheduler = None # paces and stamps everything sent, created by open()
+
+        # xid -> (chaddr, inbox) for every transaction waiting on a reply
+        self._transactions = {}
+        self._lock = threading.Lock()
+        self._receiver = None
+
+    @classmethod
+    def configure(cls, config: TransportConfig, transport_class: type = None):
+        """
+        Sets the configuration of the process-wide transport, and optionally its class
+        (e.g. PacketTransport). Takes effect the next time it is opened.
+        """
+        with cls._shared_lock:
+            cls._shared_config = config
+            cls._shared_class = transport_class
+
+    @classmethod
+    def shared_config(cls) -> TransportConfig:
+        return cls._shared_config
+
+    @classmethod
+    def shared(cls) -> 'DHCPTransport':
+        """Returns the process-wide transport, opening it on first use. Raises OSError if the bind fails."""
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared.socket:
+                transport = (cls._shared_class or cls)(cls._shared_config)
+                transport.open()
+                cls._shared = transport
+            return cls._shared
+
+    @classmethod
+    def shared_if_open(cls) -> 'DHCPTransport':
+        """Returns the process-wide transport if it is open, else None. Never binds, unlike shared()."""
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared.socket:
+                return None
+            return cls._shared
+
+    # function responsible to create the UDP socket and start the receive loop
+    def open(self):
+        """Binds the client port and starts the receive thread. Raises OSError if the bind fails."""
+        if self.socket: return
+
+        sock = self._open_socket()
+        # short timeout so the receive loop notices close()
+        sock.settimeout(0.5)
+
+        self.scheduler = TransmitScheduler(self._transmit, self.config.transmit_rate, self.config.server_rate,
+                                           self.config.start_jitter).start()
+        self.socket = sock
+        logger.info("Socket created and bound successfully to %s.", self.config.describe())
+        self._receiver = threading.Thread(target=self._receive_loop, args=(sock,),
+                                          name="dhcp-transport", daemon=True)
+        self._receiver.start()
+
+    def _open_socket(self) -> socket.socket:
+        return open_socket(self.config)
+
+    def close(self):
+        if self.scheduler:
+            self.scheduler.stop()
+        sock, self.socket = self.socket, None
+        if sock:
+            sock.close()
+            logger.info("Socket closed.")
+        if self._receiver and self._receiver is not threading.current_thread():
+            self._receiver.join(timeout=1)
+        self._receiver = None
+
+    def register(self, chaddr: bytes, xid: int = None, inbox: queue.Queue = None):
+        """
+        Registers a transaction and returns (xid, inbox). Replies whose xid and chaddr
+        match are put on the inbox as (DHCPMessage, addr) tuples.
+        A free xid is picked when none is given, and a new inbox is created when none is
+        given; passing a shared inbox lets one thread drive many transactions.
+        """
+        chaddr = bytes(chaddr[:6])
+        if inbox is None:
+            inbox = queue.Queue()
+        with self._lock:
+            if xid is None:
+                xid = random.randint(0, 0xFFFFFFFF)
+                while xid in self._transactions:
+                    xid = random.randint(0, 0xFFFFFFFF)
+            elif xid in self._transactions:
+                raise ValueError(f"xid {hex(xid)} is already in use")
+            self._transactions[xid] = (chaddr, inbox)
+        IN_FLIGHT.inc()
+        return xid, inbox
+
+    def unregister(self, xid: int):
+        with self._lock:
+            entry = self._transactions.pop(xid, None)
+        if entry is not None:
+            IN_FLIGHT.dec()
+        if self.scheduler:
+            self.scheduler.forget(xid)
+
+    def pending(self) -> int:
+        """Number of transactions currently waiting on a reply."""
+        return len(self._transactions)
+
+    def send(self, packet: bytes, addr: tuple):
+        """Sends packet to addr through the transmit scheduler."""
+        if not self.socket:
+            raise OSError("transport is closed")
+        self.scheduler.submit(packet, addr)
+
+    def _transmit(self, packet: bytes, addr: tuple):
+        sock = self.socket
+        if not sock:
+            raise OSError("transport is closed")
+        sock.sendto(packet, addr)
+        count_sent(packet)
+
+    def broadcast(self, packet: bytes):
+        self.send(packet, (self.broadcast_address, self.server_port))
+
+    def unicast(self, packet: bytes, server_ip: str):
+        self.send(packet, (server_ip, self.server_port))
+
+    def _receive_loop(self, sock):
+        # one receive buffer for the life of the loop, decoded in place
+        buffer = bytearray(1500)
+        view = memoryview(buffer)
+        while self.socket is sock:
+            try:
+                length, addr = sock.recvfrom_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            try:
+                msg = DHCPMessage.unpack_from(view, 0, length)
+                # options decode lazily, so a bad message type only shows up here
+                count_received(msg.options.get(53))
+            except Exception as ex:
+                MALFORMED.inc()
+                logger.warning("[!] Dropping malformed packet from %s: %s", addr[0], ex)
+                continue
+            self._dispatch(msg, addr)
+
+    def _dispatch(self, msg: DHCPMessage, addr: tuple) -> bool:
+        """Hands a reply to the transaction that owns its xid. Returns False if nobody claimed it."""
+        with self._lock:
+            entry = self._transactions.get(msg.xid)
+        if entry is None:
+            NON_MATCHING.labels('unknown_xid').inc()
+            return False
+
+        chaddr, inbox = entry
+        # the xid alone is only 32 bits, so also make sure the reply is for our MAC
+        if msg.chaddr[:6] != chaddr:
+            NON_MATCHING.labels('foreign_chaddr').inc()
+            logger.debug("[!] Reply for xid %#x has a foreign chaddr. Ignoring.", msg.xid)
+            return False
+
+        inbox.put((msg, addr))
+        return True
@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# DHCP client event types
+DISCOVER_SENT = "discover_sent"
+OFFER_RECEIVED = "offer_received"
+REQUEST_SENT = "request_sent"
+ACK_RECEIVED = "ack_received"
+NAK_RECEIVED = "nak_received"
+DECLINE_SENT = "decline_sent" # the ACKed address was in use; the client starts over
+TIMEOUT = "timeout"
+FAILED = "failed"
+
+# events after which a transaction is over; a NAK or timeout is followed by FAILED
+TERMINAL_EVENTS = (ACK_RECEIVED, FAILED)
+
+
+class DHCPEvent:
+    """One state transition of a DHCP client."""
+
+    __slots__ = ('type', 'mac_addr_str', 'xid', 'status', 'assigned_ip', 'server_id', 'timestamp', 'task_id')
+
+    def __init__(self, type: str, mac_addr_str: str, xid: int, status: str,
+                 assigned_ip: str = None, server_id: str = None, timestamp: float = None):
+        self.type = type
+        self.mac_addr_str = mac_addr_str
+        self.xid = xid
+        self.status = status
+        self.assigned_ip = assigned_ip
+        self.server_id = server_id
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.task_id = None
+
+    @property
+    def terminal(self) -> bool:
+        return self.type in TERMINAL_EVENTS
+
+    def to_dict(self) -> dict:
+        return dict(type=self.type, task_id=self.task_id, mac_address=self.mac_addr_str,
+                    xid=self.xid, status=self.status, assigned_ip=self.assigned_ip,
+                    server_id=self.server_id, timestamp=self.timestamp)
+
+
+class Subscription:
+    """A bounded queue of events for one listener. A slow listener loses its oldest events, not the publisher's time."""
+
+    def __init__(self, broker: 'EventBroker', task_id: str = None, max_queued: int = 256):
+        self.broker = broker
+        self.task_id = task_id
+        self._queue = queue.Queue(maxsize=max_queued)
+
+    def _offer(self, event: DHCPEvent):
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float = None) -> DHCPEvent:
+        """Returns the next event, or None if none arrived within the timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fans DHCP client events out to subscribers of a single task or of all tasks."""
+
+    def __init__(self, max_remembered: int = 10000):
+
+        self._subscribers = {} # task_id (None = every task) -> set of Subscriptions
+        # last event per task, so a late subscriber starts from the current state
+        self._last = OrderedDict()
+        self.max_remembered = max_remembered
+        self._lock = threading.Lock()
+
+    def subscribe(self, task_id: str = None) -> Subscription:
+        subscription = Subscription(self, task_id)
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(subscription)
+            last = self._last.get(task_id) if task_id is not None else None
+        if last is not None:
+            subscription._offer(last)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.task_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.task_id]
+
+    def publish(self, task_id: str, event: DHCPEvent):
+        event.task_id = task_id
+        with self._lock:
+            self._last[task_id] = event
+            self._last.move_to_end(task_id)
+            while len(self._last) > self.max_remembered:
+                self._last.popitem(last=False)
+            targets = list(self._subscribers.get(task_id, ())) + list(self._subscribers.get(None, ()))
+        for subscription in targets:
+            subscription._offer(event)
+
+    def last_event(self, task_id: str) -> DHCPEvent:
+        with self._lock:
+            return self._last.get(task_id)
+
+    def listener_for(self, task_id: str):
+        """Returns a callback that publishes a client's events under task_id."""
+        return lambda event: self.publish(task_id, event)
@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class BoundedExecutor:
+    """
+    Thread pool with admission control: at most max_workers tasks run and max_queued wait
+    for a thread. Beyond that try_submit() refuses work instead of queueing it, so a burst
+    of requests turns into fast rejections (e.g. HTTP 429) rather than unbounded threads.
+    """
+
+    def __init__(self, max_workers: int = 32, max_queued: int = 256, name: str = 'dhcp-task'):
+
+        self.max_workers = max_workers
+        self.limit = max_workers + max_queued
+        self.rejected = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def try_submit(self, fn, *args, **kwargs) -> Future:
+        """Schedules fn(*args, **kwargs) and returns its Future, or None if the executor is full."""
+        with self._lock:
+            if self._in_flight >= self.limit:
+                self.rejected += 1
+                return None
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._done(None)
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def in_flight(self) -> int:
+        """Tasks running or waiting for a thread."""
+        return self._in_flight
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
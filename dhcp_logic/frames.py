@@ -0,0 +1,75 @@
+"""
+Minimal Ethernet/IPv4/UDP framing: just enough to pull DHCP payloads out of captured
+or raw-socket frames and to wrap payloads into frames for a packet socket.
+"""
+import socket
+import struct
+
+# link-layer header types (tcpdump.org/linktypes.html)
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+ETH_P_IP = 0x0800
+BROADCAST_MAC = b'\xff' * 6
+ETHERNET_HEADER_SIZE = 14
+
+_ETHERTYPE_IPV4 = ETH_P_IP
+_VLAN_ETHERTYPES = (0x8100, 0x88a8, 0x9100)
+_IPPROTO_UDP = 17
+
+
+def udp_payload(frame, linktype: int = LINKTYPE_ETHERNET):
+    """
+    Returns (src_ip, dst_ip, src_port, dst_port, payload) of an IPv4/UDP frame, or None for
+    anything else: other protocols, IP fragments, and headers that do not fit the frame.
+    """
+    view = memoryview(frame)
+    if linktype == LINKTYPE_ETHERNET:
+        offset, ethertype = 14, int.from_bytes(view[12:14], 'big') if len(view) >= 14 else None
+        while ethertype in _VLAN_ETHERTYPES and len(view) >= offset + 4:
+            ethertype = int.from_bytes(view[offset + 2:offset + 4], 'big')
+            offset += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        offset, ethertype = 16, int.from_bytes(view[14:16], 'big') if len(view) >= 16 else None
+    elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4):
+        offset, ethertype = 0, _ETHERTYPE_IPV4
+    else:
+        return None
+    if ethertype != _ETHERTYPE_IPV4 or len(view) < offset + 20:
+        return None
+
+    version_ihl = view[offset]
+    header_length = (version_ihl & 0x0f) * 4
+    if version_ihl >> 4 != 4 or header_length < 20 or view[offset + 9] != _IPPROTO_UDP:
+        return None
+    if int.from_bytes(view[offset + 6:offset + 8], 'big') & 0x3fff:
+        return None # a fragment: more fragments follow or this is not the first
+    ip_end = min(len(view), offset + int.from_bytes(view[offset + 2:offset + 4], 'big'))
+    udp = offset + header_length
+    if ip_end < udp + 8:
+        return None
+
+    src, dst = bytes(view[offset + 12:offset + 16]), bytes(view[offset + 16:offset + 20])
+    src_port, dst_port, length = struct.unpack('!HHH', view[udp:udp + 6])
+    end = min(ip_end, udp + length) if length >= 8 else ip_end
+    return socket.inet_ntoa(src), socket.inet_ntoa(dst), src_port, dst_port, view[udp + 8:end]
+
+
+def _checksum(header: bytes) -> int:
+    total = sum(struct.unpack(f'!{len(header) // 2}H', header))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
+
+def build_frame(payload: bytes, src: str = "0.0.0.0", dst: str = "255.255.255.255",
+                src_port: int = 68, dst_port: int = 67, src_mac: bytes = b'\x02' + bytes(5),
+                dst_mac: bytes = BROADCAST_MAC) -> bytes:
+    """Wraps a DHCP payload in Ethernet, IPv4 and UDP headers (UDP checksum left at 0, i.e. unused)."""
+    udp = struct.pack('!HHHH', src_port, dst_port, 8 + len(payload), 0)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp) + len(payload), 0, 0, 64, _IPPROTO_UDP, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    ip = ip[:10] + struct.pack('!H', _checksum(ip)) + ip[12:]
+    return dst_mac + src_mac + struct.pack('!H', _ETHERTYPE_IPV4) + ip + udp + payload
@@ -0,0 +1,90 @@
+import logging
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# rtnetlink multicast groups: link up/down, IPv4 address and IPv4 route changes
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+_RTMGRP_IPV4_ROUTE = 0x40
+
+
+class InterfaceCache:
+    """
+    Caches the result of an interface lookup, e.g. the MAC of the default-route interface,
+    so that page loads do not query the system every time. The value is reloaded after
+    ttl seconds, or as soon as the kernel reports a link, address or route change over
+    rtnetlink (Linux only; elsewhere the TTL alone applies). Errors are not cached.
+    """
+
+    def __init__(self, loader, ttl: float = 60.0, watch: bool = True, clock=time.monotonic):
+
+        self.loader = loader
+        self.ttl = ttl
+        self.clock = clock
+        self.loads = 0
+        self._value = None
+        self._loaded_at = None
+        # one loader call per expiry, however many requests are waiting on it
+        self._lock = threading.Lock()
+        self._socket = None
+        self._watcher = None
+        if watch:
+            self._watch()
+
+    def get(self):
+        with self._lock:
+            if self._loaded_at is None or self.clock() - self._loaded_at >= self.ttl:
+                self._value = self.loader()
+                self._loaded_at = self.clock()
+                self.loads += 1
+            return self._value
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    @property
+    def watching(self) -> bool:
+        """True when netlink change notifications are being received."""
+        return self._socket is not None
+
+    def _watch(self):
+        if not hasattr(socket, 'AF_NETLINK'):
+            return
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        except OSError as ex:
+            logger.debug("Netlink unavailable, interface cache uses its TTL only: %s", ex)
+            return
+        try:
+            sock.bind((0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR | _RTMGRP_IPV4_ROUTE))
+            # short timeout so the watcher notices close()
+            sock.settimeout(0.5)
+        except OSError as ex:
+            sock.close()
+            logger.debug("Netlink unavailable, interface cache uses its TTL only: %s", ex)
+            return
+        self._socket = sock
+        self._watcher = threading.Thread(target=self._watch_loop, args=(sock,), name="interface-watch", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self, sock):
+        while self._socket is sock:
+            try:
+                sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            # any notification may change the answer; the next get() reloads it
+            self.invalidate()
+
+    def close(self):
+        sock, self._socket = self._socket, None
+        if self._watcher:
+            self._watcher.join(timeout=1)
+            self._watcher = None
+        if sock:
+            sock.close()
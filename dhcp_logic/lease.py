@@ -0,0 +1,66 @@
+import time
+from .dhcp_options import LEASE_TIME, RENEWAL_TIME, REBINDING_TIME, SERVER_ID
+
+# Lease states (RFC 2131, section 4.4)
+INIT = "INIT"
+BOUND = "BOUND"
+RENEWING = "RENEWING"
+REBINDING = "REBINDING"
+
+# option 51 value meaning the lease never expires
+INFINITE_LEASE = 0xFFFFFFFF
+
+
+class Lease:
+    """An address leased to a client MAC by a DHCP server."""
+
+    __slots__ = ('mac_addr_str', 'ip', 'server_id', 'xid', 'options', 'state', 'acquired_at',
+                 'renew_at', 'rebind_at', 'expires_at', 'lease_time')
+
+    def __init__(self, mac_addr_str: str, ip: str, server_id: str, xid: int = None,
+                 options: dict = None, acquired_at: float = None,
+                 lease_time: int = None, t1: int = None, t2: int = None):
+
+        self.mac_addr_str = mac_addr_str
+        self.ip = ip
+        self.server_id = server_id
+        self.xid = xid
+        self.options = options if options is not None else {}
+        self.state = BOUND
+        self.acquired_at = None
+        self.renew_at = None # absolute time of T1
+        self.rebind_at = None # absolute time of T2
+        self.expires_at = None # absolute end of the lease, None for infinite leases
+        self.set_times(acquired_at if acquired_at is not None else time.time(), lease_time, t1, t2)
+
+    @classmethod
+    def from_ack(cls, mac_addr_str: str, ack_msg, fallback_server_id: str = None, acquired_at: float = None) -> 'Lease':
+        """Builds a lease from a DHCPACK, reading lease time (51), T1 (58) and T2 (59)."""
+        options = ack_msg.options
+        return cls(mac_addr_str, ack_msg.yiaddr, options.get(SERVER_ID, fallback_server_id),
+                   xid=ack_msg.xid, options=options, acquired_at=acquired_at,
+                   lease_time=options.get(LEASE_TIME), t1=options.get(RENEWAL_TIME),
+                   t2=options.get(REBINDING_TIME))
+
+    def set_times(self, acquired_at: float, lease_time: int = None, t1: int = None, t2: int = None):
+        """Computes the T1/T2/expiry deadlines. T1 and T2 default to 0.5 and 0.875 of the lease time."""
+        self.acquired_at = acquired_at
+        self.lease_time = lease_time
+        if lease_time is None or lease_time == INFINITE_LEASE:
+            self.renew_at = self.rebind_at = self.expires_at = None
+            return
+
+        t1 = t1 if t1 is not None else lease_time * 0.5
+        t2 = t2 if t2 is not None else lease_time * 0.875
+        self.renew_at = acquired_at + t1
+        self.rebind_at = acquired_at + t2
+        self.expires_at = acquired_at + lease_time
+
+    def expired(self, now: float = None) -> bool:
+        if self.expires_at is None:
+            return False
+        return (now if now is not None else time.time()) >= self.expires_at
+
+    def __repr__(self):
+        return (f"Lease(mac='{self.mac_addr_str}', ip='{self.ip}', "
+                f"server_id='{self.server_id}', state={self.state})")
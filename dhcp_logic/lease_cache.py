@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import OrderedDict
+from .lease import Lease
+
+
+class LeaseCache:
+    """
+    The last lease ACKed for every MAC, so a client coming back can try INIT-REBOOT
+    (RFC 2131 section 3.2) for the same address instead of a full D-O-R-A. Keeps at most
+    max_size MACs, evicting the least recently used; expired leases are never returned.
+    """
+
+    def __init__(self, max_size: int = 100000, clock=time.time):
+
+        self.max_size = max_size
+        self.clock = clock
+        self._leases = OrderedDict() # mac -> Lease, least recently used first
+        self._lock = threading.Lock()
+
+    def put(self, lease: Lease):
+        key = lease.mac_addr_str.lower()
+        with self._lock:
+            self._leases[key] = lease
+            self._leases.move_to_end(key)
+            while len(self._leases) > self.max_size:
+                self._leases.popitem(last=False)
+
+    def get(self, mac_addr_str: str) -> Lease:
+        """Returns the cached lease of the MAC, or None if there is none or it has expired."""
+        key = mac_addr_str.lower()
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is None:
+                return None
+            if lease.expired(self.clock()):
+                del self._leases[key]
+                return None
+            self._leases.move_to_end(key)
+            return lease
+
+    def discard(self, mac_addr_str: str):
+        with self._lock:
+            self._leases.pop(mac_addr_str.lower(), None)
+
+    def __len__(self):
+        return len(self._leases)
+
+
+# leases remembered by every client in the process
+lease_cache = LeaseCache()
@@ -0,0 +1,251 @@
+import logging
+import queue
+import threading
+import time
+from .dhcp_message import DHCPMessage, DHCPREQUEST, DHCPACK, DHCPNAK, DHCPRELEASE
+from .dhcp_transport import DHCPTransport
+from .lease import Lease, INIT, BOUND, RENEWING, REBINDING
+from .lease_store import LeaseStore
+from .timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# RFC 2131 4.4.5: never wait less than this between renewal retransmissions
+MIN_RETRY_INTERVAL = 60
+
+
+class LeaseManager:
+    """
+    Keeps leases alive by running the RFC 2131 client state machine for each one:
+    BOUND -> RENEWING at T1 (REQUEST unicast to the leasing server) -> REBINDING at T2
+    (REQUEST broadcast) -> INIT when the lease expires.
+
+    Every deadline of every lease lives on one TimerWheel and all replies arrive on one
+    inbox, so a single thread drives any number of leases.
+    """
+
+    def __init__(self, transport: DHCPTransport = None, resolution: float = 1.0,
+                 min_retry_interval: float = MIN_RETRY_INTERVAL, on_change=None,
+                 store: LeaseStore = None):
+
+        self.transport = transport
+        # when set, every bound or dropped lease is journaled so a restart can resume renewing it
+        self.store = store
+        self.wheel = TimerWheel(resolution=resolution)
+        self.min_retry_interval = min_retry_interval
+        # on_change(lease) is called after every state transition
+        self.on_change = on_change
+
+        self.leases = {} # mac -> Lease
+        self._timers = {} # mac -> pending Timer
+        self._renewals = {} # xid -> mac, for outstanding REQUESTs
+        self._replies = queue.Queue()
+        self._lock = threading.RLock()
+        self._thread = None
+        self._running = False
+
+    def _get_transport(self) -> DHCPTransport:
+        if self.transport is None:
+            self.transport = DHCPTransport.shared()
+        return self.transport
+
+    # background driver
+    def start(self):
+        """Starts the thread that ticks the wheel and handles replies. Safe to call more than once."""
+        with self._lock:
+            if self._running: return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="dhcp-lease-manager", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        while self._running:
+            self.tick()
+            try:
+                msg, addr = self._replies.get(timeout=self.wheel.resolution)
+                self._handle_reply(msg)
+            except queue.Empty:
+                pass
+
+    def tick(self, now: float = None) -> int:
+        """Handles queued replies, then fires every deadline up to `now`. Returns the number of timers fired."""
+        while True:
+            try:
+                msg, addr = self._replies.get_nowait()
+            except queue.Empty:
+                break
+            self._handle_reply(msg)
+        with self._lock:
+            return self.wheel.advance(now)
+
+    def restore(self) -> int:
+        """Loads every lease from the store and resumes its state machine. Returns how many were loaded."""
+        if self.store is None: return 0
+        leases = self.store.load()
+        with self._lock:
+            for lease in leases.values():
+                self.add(lease, persist=False)
+        return len(leases)
+
+    # lease bookkeeping
+    def add(self, lease: Lease, persist: bool = True):
+        """Starts tracking a freshly ACKed (or restored) lease."""
+        with self._lock:
+            self.leases[lease.mac_addr_str.lower()] = lease
+            if lease.expired(self.wheel.now):
+                self._expire(lease)
+            elif lease.rebind_at is not None and self.wheel.now >= lease.rebind_at:
+                self._enter_rebinding(lease)
+            elif lease.renew_at is not None and self.wheel.now >= lease.renew_at:
+                self._enter_renewing(lease)
+            else:
+                self._set_state(lease, BOUND, persist)
+                self._schedule(lease, lease.renew_at, self._enter_renewing)
+
+    def remove(self, mac_addr_str: str) -> Lease:
+        """Stops tracking a lease without telling the server."""
+        mac_addr_str = mac_addr_str.lower()
+        with self._lock:
+            timer = self._timers.pop(mac_addr_str, None)
+            if timer: timer.cancel()
+            lease = self.leases.pop(mac_addr_str, None)
+            if lease and lease.xid in self._renewals:
+                self._finish_request(lease)
+            if lease and self.store is not None:
+                self.store.delete(mac_addr_str)
+            return lease
+
+    def release(self, mac_addr_str: str) -> Lease:
+        """Sends a DHCPRELEASE for the MAC's lease and stops tracking it."""
+        lease = self.remove(mac_addr_str)
+        if lease is None: return None
+
+        release_msg = DHCPMessage(lease.mac_addr_str)
+        release_msg.ciaddr = lease.ip
+        release_msg.options[53] = DHCPRELEASE
+        release_msg.options[54] = lease.server_id
+        try:
+            self._get_transport().unicast(release_msg.pack(), lease.server_id)
+        except OSError as ex:
+            logger.warning("[!] Network error on RELEASE: %s", ex)
+        self._set_state(lease, INIT)
+        return lease
+
+    def get(self, mac_addr_str: str) -> Lease:
+        return self.leases.get(mac_addr_str.lower())
+
+    def __len__(self):
+        return len(self.leases)
+
+    # state machine
+    def _set_state(self, lease: Lease, state: str, persist: bool = True):
+        lease.state = state
+        # only BOUND changes what a restart needs to know; remove() deletes leases that go back to INIT
+        if self.store is not None and persist and state == BOUND:
+            self.store.put(lease)
+        if self.on_change:
+            self.on_change(lease)
+
+    def _schedule(self, lease: Lease, when: float, handler):
+        key = lease.mac_addr_str.lower()
+        old = self._timers.pop(key, None)
+        if old: old.cancel()
+        if when is not None:
+            self._timers[key] = self.wheel.schedule(when, handler, lease)
+
+    def _retry_at(self, lease: Lease, deadline: float) -> float:
+        """RFC 2131 4.4.5: retransmit after half the time left until the deadline, but not sooner than the minimum."""
+        now = self.wheel.now
+        return min(deadline, now + max((deadline - now) / 2, self.min_retry_interval))
+
+    def _enter_renewing(self, lease: Lease):
+        if lease.state != RENEWING:
+            self._set_state(lease, RENEWING)
+        self._send_request(lease, unicast=True)
+        retry_at = self._retry_at(lease, lease.rebind_at)
+        if retry_at >= lease.rebind_at:
+            self._schedule(lease, lease.rebind_at, self._enter_rebinding)
+        else:
+            self._schedule(lease, retry_at, self._enter_renewing)
+
+    def _enter_rebinding(self, lease: Lease):
+        if lease.state != REBINDING:
+            self._set_state(lease, REBINDING)
+        self._send_request(lease, unicast=False)
+        retry_at = self._retry_at(lease, lease.expires_at)
+        if retry_at >= lease.expires_at:
+            self._schedule(lease, lease.expires_at, self._expire)
+        else:
+            self._schedule(lease, retry_at, self._enter_rebinding)
+
+    def _expire(self, lease: Lease):
+        logger.warning("[!] Lease for %s (%s) expired.", lease.ip, lease.mac_addr_str)
+        self.remove(lease.mac_addr_str)
+        self._set_state(lease, INIT)
+
+    def _send_request(self, lease: Lease, unicast: bool):
+        """Sends a REQUEST with ciaddr set and no options 50/54, as required in RENEWING and REBINDING."""
+        try:
+            transport = self._get_transport()
+        except OSError as ex:
+            # a bind failure must not stop the timer thread; the retry timer tries again
+            logger.error("[!] Could not open the transport for %s REQUEST: %s", lease.state, ex)
+            return
+        request_msg = DHCPMessage(lease.mac_addr_str)
+        if lease.xid not in self._renewals:
+            lease.xid, _ = transport.register(request_msg.chaddr, inbox=self._replies)
+            self._renewals[lease.xid] = lease.mac_addr_str.lower()
+        request_msg.xid = lease.xid
+        request_msg.ciaddr = lease.ip
+        request_msg.options[53] = DHCPREQUEST
+        try:
+            if unicast:
+                transport.unicast(request_msg.pack(), lease.server_id)
+            else:
+                transport.broadcast(request_msg.pack())
+        except OSError as ex:
+            logger.warning("[!] Network error on %s REQUEST: %s", lease.state, ex)
+
+    def _finish_request(self, lease: Lease):
+        self._renewals.pop(lease.xid, None)
+        if self.transport:
+            self.transport.unregister(lease.xid)
+
+    def _handle_reply(self, msg: DHCPMessage):
+        with self._lock:
+            mac = self._renewals.get(msg.xid)
+            lease = self.leases.get(mac)
+            if lease is None or lease.state not in (RENEWING, REBINDING):
+                return
+
+            try:
+                msg_type = msg.options.get(53)
+                if msg_type == DHCPACK:
+                    renewed = Lease.from_ack(lease.mac_addr_str, msg, lease.server_id, acquired_at=self.wheel.now)
+                    t1, t2 = msg.options.get(58), msg.options.get(59)
+            except ValueError as ex:
+                # options decode lazily: a malformed reply counts as no reply, and the retry timer asks again
+                logger.warning("[!] Malformed reply to the %s REQUEST for %s: %s", lease.state, lease.ip, ex)
+                return
+
+            if msg_type == DHCPACK:
+                self._finish_request(lease)
+                lease.ip = renewed.ip
+                lease.server_id = renewed.server_id
+                lease.options = renewed.options
+                lease.set_times(renewed.acquired_at, renewed.lease_time, t1, t2)
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("[A] Lease for %s renewed until %s.", lease.ip,
+                                time.ctime(lease.expires_at) if lease.expires_at else 'forever')
+                self._set_state(lease, BOUND)
+                self._schedule(lease, lease.renew_at, self._enter_renewing)
+            elif msg_type == DHCPNAK:
+                logger.warning("[!] Server refused to extend the lease for %s (NAK).", lease.ip)
+                self.remove(lease.mac_addr_str)
+                self._set_state(lease, INIT)
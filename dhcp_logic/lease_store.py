@@ -0,0 +1,229 @@
+import fcntl
+import logging
+import os
+import socket
+import struct
+import threading
+import zlib
+from .lease import Lease, BOUND
+
+logger = logging.getLogger(__name__)
+
+# Journal operations
+PUT = 1
+DELETE = 2
+
+SNAPSHOT_MAGIC = b'DHCPLS01'
+
+# One lease: mac, ip, server_id, xid, acquired_at, renew_at, rebind_at, expires_at.
+# Missing deadlines (infinite leases) are stored as 0.
+_LEASE = struct.Struct('!6s4s4sIdddd')
+# Journal entry: crc32 of the body, then op + lease. DELETEs carry an all-zero lease except the MAC.
+_ENTRY = struct.Struct('!IB' + _LEASE.format[1:])
+_SNAPSHOT_HEADER = struct.Struct('!8sI')
+
+
+def _pack_lease(lease: Lease) -> tuple:
+    return (bytes.fromhex(lease.mac_addr_str.replace(':', '')),
+            socket.inet_aton(lease.ip), socket.inet_aton(lease.server_id or '0.0.0.0'),
+            lease.xid or 0, lease.acquired_at,
+            lease.renew_at or 0.0, lease.rebind_at or 0.0, lease.expires_at or 0.0)
+
+
+def _unpack_lease(mac, ip, server_id, xid, acquired_at, renew_at, rebind_at, expires_at) -> Lease:
+    # built field by field: Lease.__init__ would recompute deadlines we already have
+    lease = Lease.__new__(Lease)
+    lease.mac_addr_str = mac.hex(':')
+    lease.ip = socket.inet_ntoa(ip)
+    lease.server_id = socket.inet_ntoa(server_id)
+    lease.xid = xid
+    lease.options = {}
+    lease.state = BOUND
+    lease.acquired_at = acquired_at
+    lease.renew_at = renew_at or None
+    lease.rebind_at = rebind_at or None
+    lease.expires_at = expires_at or None
+    lease.lease_time = expires_at - acquired_at if expires_at else None
+    return lease
+
+
+class LeaseStore:
+    """
+    Crash-safe on-disk lease database.
+
+    Every change is appended to a journal as a fixed-size, CRC-protected record.
+    compact() folds the journal into a snapshot of packed lease records, written to a
+    temporary file and renamed into place, so a crash at any point leaves either the old
+    or the new snapshot plus a journal that can be replayed on top of it. A torn record at
+    the end of the journal (crash mid-write) is detected by its CRC and discarded.
+
+    Only one store may write a directory: it holds an exclusive lock on `leases.lock` from
+    creation to close(), and a second store, in this process or another, raises
+    RuntimeError instead of interleaving its records and snapshots with the first.
+    """
+
+    def __init__(self, directory: str, compact_every: int = 10000, fsync: bool = False):
+
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, 'leases.snapshot')
+        self.journal_path = os.path.join(directory, 'leases.journal')
+        self.lock_path = os.path.join(directory, 'leases.lock')
+        # fold the journal into the snapshot after this many appended records
+        self.compact_every = compact_every
+        # fsync every record; without it a record survives a process crash but not a power loss
+        self.fsync = fsync
+
+        self.leases = {} # mac -> Lease, the current contents
+        self._journal = None
+        self._journal_records = 0
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._take_directory()
+
+    def _take_directory(self):
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(f"Lease directory {self.directory} is in use by another process.") from None
+        self._lock_file = lock_file
+
+    def load(self) -> dict:
+        """Reads the snapshot and replays the journal. Returns {mac: Lease}."""
+        with self._lock:
+            if self._lock_file is None: # reopened after close()
+                self._take_directory()
+            self.leases = self._read_snapshot()
+            self._journal_records = self._replay_journal()
+            self._journal = open(self.journal_path, 'ab')
+            return dict(self.leases)
+
+    def _read_snapshot(self) -> dict:
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return {}
+
+        body_end = len(data) - 4
+        if (body_end < _SNAPSHOT_HEADER.size
+                or zlib.crc32(memoryview(data)[:body_end]) != struct.unpack_from('!I', data, body_end)[0]):
+            raise ValueError(f"Lease snapshot {self.snapshot_path} is corrupt.")
+
+        magic, count = _SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{self.snapshot_path} is not a lease snapshot.")
+
+        records = memoryview(data)[_SNAPSHOT_HEADER.size:_SNAPSHOT_HEADER.size + count * _LEASE.size]
+        leases = {}
+        for fields in _LEASE.iter_unpack(records):
+            lease = _unpack_lease(*fields)
+            leases[lease.mac_addr_str] = lease
+        return leases
+
+    def _replay_journal(self) -> int:
+        try:
+            with open(self.journal_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+
+        size = _ENTRY.size
+        valid = len(data) - len(data) % size
+        applied = 0
+        for offset in range(0, valid, size):
+            crc, op, *fields = _ENTRY.unpack_from(data, offset)
+            if zlib.crc32(memoryview(data)[offset + 4:offset + size]) != crc:
+                valid = offset
+                break
+            mac = fields[0].hex(':')
+            if op == PUT:
+                self.leases[mac] = _unpack_lease(*fields)
+            elif op == DELETE:
+                self.leases.pop(mac, None)
+            applied += 1
+
+        if valid != len(data):
+            # drop the torn tail so new records are not appended after garbage
+            logger.warning("[!] Discarding %d bytes of incomplete lease journal.", len(data) - valid)
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(valid)
+        return applied
+
+    def put(self, lease: Lease):
+        with self._lock:
+            self.leases[lease.mac_addr_str.lower()] = lease
+            self._append(PUT, _pack_lease(lease))
+
+    def delete(self, mac_addr_str: str):
+        with self._lock:
+            if self.leases.pop(mac_addr_str.lower(), None) is None:
+                return
+            self._append(DELETE, (bytes.fromhex(mac_addr_str.replace(':', '')), b'\x00' * 4, b'\x00' * 4,
+                                  0, 0.0, 0.0, 0.0, 0.0))
+
+    def _append(self, op: int, fields: tuple):
+        if self._journal is None:
+            raise RuntimeError("LeaseStore.load() must be called before writing.")
+        body = _ENTRY.pack(0, op, *fields)[4:]
+        self._journal.write(struct.pack('!I', zlib.crc32(body)) + body)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+        self._journal_records += 1
+        if self._journal_records >= self.compact_every:
+            self._compact()
+
+    def compact(self):
+        """Writes the current leases as a new snapshot and empties the journal."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        leases = list(self.leases.values())
+        out = bytearray(_SNAPSHOT_HEADER.size + len(leases) * _LEASE.size)
+        _SNAPSHOT_HEADER.pack_into(out, 0, SNAPSHOT_MAGIC, len(leases))
+        offset = _SNAPSHOT_HEADER.size
+        for lease in leases:
+            _LEASE.pack_into(out, offset, *_pack_lease(lease))
+            offset += _LEASE.size
+        out += struct.pack('!I', zlib.crc32(out))
+
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(out)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_directory()
+
+        # the snapshot now holds everything, so the journal can start over
+        if self._journal:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'wb')
+        self._journal_records = 0
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return # not supported on this platform
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+            if self._lock_file:
+                self._lock_file.close() # releases the lock
+                self._lock_file = None
+
+    def __len__(self):
+        return len(self.leases)
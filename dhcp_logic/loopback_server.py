@@ -0,0 +1,244 @@
+import heapq
+import logging
+import random
+import select
+import socket
+import threading
+import time
+from .dhcp_message import (DHCPMessage, BOOTREPLY, DHCPDISCOVER, DHCPOFFER, DHCPREQUEST, DHCPACK,
+                           DHCPNAK, DHCPRELEASE, DHCPDECLINE, DHCPINFORM)
+from .dhcp_transport import RECEIVE_BUFFER_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def client_key(msg: DHCPMessage) -> str:
+    """How a server tells clients apart: the client identifier if sent, else chaddr (RFC 2131 4.2)."""
+    client_id = msg.options.get(61)
+    return client_id.hex() if client_id else msg.chaddr_str
+
+
+class ServerProfile:
+    """
+    One simulated DHCP server: its identifier, address pool and how badly it behaves.
+    latency (+/- jitter) delays every reply, loss drops a share of the requests it
+    receives, and nak_rate answers a share of REQUESTs with a NAK.
+    """
+
+    def __init__(self, server_id: str = "127.0.0.1", pool: str = "10.99.0.0", pool_size: int = 65000,
+                 lease_time: int = 3600, latency: float = 0.0, jitter: float = 0.0,
+                 loss: float = 0.0, nak_rate: float = 0.0):
+
+        self.server_id = server_id
+        self.pool_base = int.from_bytes(socket.inet_aton(pool), 'big')
+        self.pool_size = pool_size
+        self.lease_time = lease_time
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.nak_rate = nak_rate
+
+        # keyed by client_key(): the MAC, or the hex client identifier of clients sending option 61
+        self.offered = {} # client -> ip offered but not yet requested
+        self.leases = {} # client -> ip ACKed by this server
+        self.released = [] # ips returned with DHCPRELEASE
+        self.declined = [] # ips a client found in use (DHCPDECLINE); never offered again
+        self._next_host = 1
+
+    def address_for(self, mac: str) -> str:
+        """Returns the address reserved for mac, reserving the next free one if needed. None when the pool is exhausted."""
+        ip = self.leases.get(mac) or self.offered.get(mac)
+        if ip is None:
+            if self._next_host > self.pool_size:
+                return None
+            ip = socket.inet_ntoa((self.pool_base + self._next_host).to_bytes(4, 'big'))
+            self._next_host += 1
+            self.offered[mac] = ip
+        return ip
+
+
+class LoopbackDHCPServer:
+    """
+    In-process stand-in for the DHCP servers on a LAN, listening on a configurable UDP port.
+    Every profile sees every DISCOVER, as competing servers would, and answers REQUESTs
+    addressed to it (option 54), renewing one of its leases, or INIT-REBOOTing an address
+    it knows for that MAC (a different address is NAKed, an unknown MAC is ignored), as
+    well as every DHCPINFORM. A DECLINEd address is taken out of the pool. Clients sending
+    option 61 are known by it rather than by their MAC. Replies go to reply_address on
+    client_port, so a DHCPTransport opened on loopback ports can talk to it without root.
+    With client_port=None each reply goes back to the port its request came from, which
+    lets clients on several ports (e.g. one per worker process) share one server.
+    Relayed requests (giaddr set) are answered on the giaddr, at the port they came from
+    (67 on a real network), with their option 82 echoed back as RFC 3046 requires.
+
+    Server ids in 127.0.0.0/8 are reachable on loopback, which lets unicast RENEW and
+    RELEASE reach the right profile.
+    """
+
+    def __init__(self, port: int = 16767, client_port: int = 16768, profiles: list = None,
+                 reply_address: str = "127.0.0.1", seed: int = None):
+
+        self.port = port
+        self.client_port = client_port
+        self.profiles = profiles or [ServerProfile()]
+        self.reply_address = reply_address
+        self.random = random.Random(seed)
+
+        # message counters, by name
+        self.stats = dict(discovers=0, requests=0, releases=0, declines=0, informs=0, offers=0, acks=0, naks=0,
+                          dropped=0)
+        self.relayed = {} # giaddr -> requests received through that relay address
+
+        self.socket = None
+        self._thread = None
+        self._outgoing = [] # heap of (send_at, seq, packet, destination) for delayed replies
+        self._seq = 0
+
+    def start(self) -> 'LoopbackDHCPServer':
+        if self.socket: return self
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+            sock.bind(('', self.port))
+        except OSError:
+            sock.close()
+            raise
+        self.socket = sock
+        self._thread = threading.Thread(target=self._serve, args=(sock,), name="dhcp-loopback-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        sock, self.socket = self.socket, None
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if sock:
+            sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _serve(self, sock):
+        buffer = bytearray(1500)
+        view = memoryview(buffer)
+        while self.socket is sock:
+            wait = 0.1
+            if self._outgoing:
+                wait = min(wait, max(0.0, self._outgoing[0][0] - time.monotonic()))
+            readable, _, _ = select.select([sock], [], [], wait)
+            if readable:
+                length, addr = sock.recvfrom_into(buffer)
+                try:
+                    msg = DHCPMessage.unpack_from(view, 0, length)
+                    if msg.giaddr_int:
+                        destination = (msg.giaddr, addr[1])
+                        self.relayed[msg.giaddr] = self.relayed.get(msg.giaddr, 0) + 1
+                    else:
+                        destination = (self.reply_address, self.client_port or addr[1])
+                    self._handle(sock, msg, destination)
+                except Exception as ex:
+                    # a bad packet must not take the server down
+                    logger.warning("[!] Loopback server dropped a packet from %s: %s", addr[0], ex)
+                    self.stats['dropped'] += 1
+
+            now = time.monotonic()
+            while self._outgoing and self._outgoing[0][0] <= now:
+                _, _, packet, destination = heapq.heappop(self._outgoing)
+                sock.sendto(packet, destination)
+
+    def _handle(self, sock, msg: DHCPMessage, destination: tuple):
+        msg_type = msg.options.get(53)
+        if msg_type == DHCPDISCOVER:
+            self.stats['discovers'] += 1
+            for profile in self.profiles:
+                self._answer(sock, destination, profile, msg, DHCPOFFER)
+        elif msg_type == DHCPREQUEST:
+            self.stats['requests'] += 1
+            server_id = msg.options.get(54)
+            mac = client_key(msg)
+            for profile in self.profiles:
+                # SELECTING names the chosen server
+                if server_id is not None:
+                    if server_id != profile.server_id:
+                        continue
+                # RENEWING/REBINDING (ciaddr set) is answered by the lease owner
+                elif msg.ciaddr_int:
+                    if mac not in profile.leases:
+                        continue
+                # INIT-REBOOT: a server with no record of the client stays silent (RFC 2131 4.3.2)
+                else:
+                    known = profile.leases.get(mac) or profile.offered.get(mac)
+                    if known is None:
+                        continue
+                    if msg.options.get(50) != known:
+                        self._answer(sock, destination, profile, msg, DHCPNAK)
+                        continue
+                nak = self.random.random() < profile.nak_rate
+                self._answer(sock, destination, profile, msg, DHCPNAK if nak else DHCPACK)
+        elif msg_type == DHCPINFORM:
+            self.stats['informs'] += 1
+            for profile in self.profiles:
+                self._answer(sock, destination, profile, msg, DHCPACK)
+        elif msg_type == DHCPRELEASE:
+            self.stats['releases'] += 1
+            mac = client_key(msg)
+            for profile in self.profiles:
+                if msg.options.get(54) == profile.server_id and profile.leases.get(mac) == msg.ciaddr:
+                    # keep the address reserved for this MAC, as real servers do
+                    profile.offered[mac] = profile.leases.pop(mac)
+                    profile.released.append(msg.ciaddr)
+        elif msg_type == DHCPDECLINE:
+            self.stats['declines'] += 1
+            mac = client_key(msg)
+            for profile in self.profiles:
+                ip = msg.options.get(50)
+                if msg.options.get(54) == profile.server_id and profile.leases.get(mac) == ip:
+                    # the address stays out of the pool; the client's next DISCOVER gets a new one
+                    del profile.leases[mac]
+                    profile.declined.append(ip)
+
+    def _answer(self, sock, destination: tuple, profile: ServerProfile, msg: DHCPMessage, reply_type: int):
+        if profile.loss and self.random.random() < profile.loss:
+            self.stats['dropped'] += 1
+            return
+        reply = DHCPMessage(msg.chaddr_str)
+        reply.op = BOOTREPLY
+        reply.xid = msg.xid
+        reply.options[53] = reply_type
+        reply.options[54] = profile.server_id
+        if msg.giaddr_int:
+            reply.giaddr_int = msg.giaddr_int
+            if 82 in msg.options:
+                reply.options[82] = msg.options[82]
+        if 61 in msg.options:
+            reply.options[61] = msg.options[61] # echoed, RFC 6842
+        if msg.options.get(53) == DHCPINFORM:
+            # configuration only: no address and no lease time (RFC 2131 4.3.5)
+            reply.options[1] = "255.255.0.0"
+            reply.options[3] = [profile.server_id]
+        elif reply_type != DHCPNAK:
+            client = client_key(msg)
+            ip = profile.address_for(client)
+            if ip is None: # pool exhausted, stay silent like a real server
+                return
+            reply.yiaddr = ip
+            reply.options[1] = "255.255.0.0"
+            reply.options[3] = [profile.server_id]
+            reply.options[51] = profile.lease_time
+            if reply_type == DHCPACK:
+                profile.leases[client] = profile.offered.pop(client, ip)
+        self.stats[{DHCPOFFER: 'offers', DHCPACK: 'acks', DHCPNAK: 'naks'}[reply_type]] += 1
+
+        delay = profile.latency
+        if profile.jitter:
+            delay = max(0.0, delay + self.random.uniform(-profile.jitter, profile.jitter))
+        if delay:
+            self._seq += 1
+            heapq.heappush(self._outgoing, (time.monotonic() + delay, self._seq, reply.pack(), destination))
+        else:
+            sock.sendto(reply.pack(), destination)
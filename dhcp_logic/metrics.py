@@ -0,0 +1,232 @@
+import bisect
+import threading
+from abc import ABC, abstractmethod
+
+# DHCP message type code -> label used in metric names
+MESSAGE_TYPE_LABELS = {1: 'discover', 2: 'offer', 3: 'request', 4: 'decline',
+                       5: 'ack', 6: 'nak', 7: 'release', 8: 'inform'}
+
+# latency buckets in seconds, from a LAN round trip up to the retransmission budget
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+class _Metric(ABC):
+    kind = None
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children = {} # label values -> child
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Returns the child for one combination of label values, creating it on first use."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A new child holding the value(s) of one combination of label values."""
+
+    @abstractmethod
+    def _samples(self):
+        """Yields (suffix, label_names, label_values, value) for render()."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {value:g}"
+                         if isinstance(value, float) else f"{self.name}{suffix}{_format_labels(names, values)} {value}")
+        return '\n'.join(lines)
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, optionally split by labels."""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def value(self, *label_values):
+        child = self._children.get(label_values)
+        return child.value if child else 0
+
+    def _samples(self):
+        for values, child in sorted(self._children.items()):
+            yield '_total' if not self.name.endswith('_total') else '', self.label_names, values, child.value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, or is read from a function at render time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        super().__init__(name, documentation, label_names)
+        self._function = None
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        """Reads the value from function() whenever the metrics are rendered."""
+        self._function = function
+
+    def value(self, *label_values):
+        if self._function is not None and not label_values:
+            return self._function()
+        return super().value(*label_values)
+
+    def _samples(self):
+        if self._function is not None:
+            yield '', (), (), self._function()
+            return
+        for values, child in sorted(self._children.items()):
+            yield '', self.label_names, values, child.value
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def count(self, *label_values) -> int:
+        child = self._children.get(label_values)
+        return child.count if child else 0
+
+    def _samples(self):
+        for values, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield '_bucket', self.label_names + ('le',), values + (le,), cumulative
+            yield '_sum', self.label_names, values, child.sum
+            yield '_count', self.label_names, values, child.count
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> Counter:
+        return self._add(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# process-wide registry, served by /metrics
+REGISTRY = MetricsRegistry()
+
+MESSAGES_SENT = REGISTRY.counter('dhcp_messages_sent', "DHCP messages sent, by message type.", ('type',))
+MESSAGES_RECEIVED = REGISTRY.counter('dhcp_messages_received', "DHCP messages received, by message type.", ('type',))
+NON_MATCHING = REGISTRY.counter('dhcp_non_matching_packets', "Received packets no waiting transaction claimed.", ('reason',))
+MALFORMED = REGISTRY.counter('dhcp_malformed_packets', "Received packets that could not be parsed.")
+RETRANSMISSIONS = REGISTRY.counter('dhcp_retransmissions', "DISCOVERs and REQUESTs sent again for lack of a reply.")
+TIMEOUTS = REGISTRY.counter('dhcp_timeouts', "Exchanges that ran out of time, by the reply awaited.", ('phase',))
+OFFER_LATENCY = REGISTRY.histogram('dhcp_offer_latency_seconds', "Time from the first DISCOVER to the OFFER.")
+ACK_LATENCY = REGISTRY.histogram('dhcp_ack_latency_seconds', "Time from the first REQUEST to the ACK or NAK.")
+IN_FLIGHT = REGISTRY.gauge('dhcp_inflight_transactions', "Transactions waiting on a reply.")
+POOL_NO_OFFER_RATIO = REGISTRY.gauge('dhcp_bulk_no_offer_ratio', "Share of recent bulk DISCOVERs left without an OFFER.")
+TRANSMIT_QUEUE_DEPTH = REGISTRY.gauge('dhcp_transmit_queue_depth', "Packets waiting in the transmit scheduler.")
+TRANSMIT_WAIT = REGISTRY.histogram('dhcp_transmit_wait_seconds', "Time packets spent in the transmit scheduler's queue.")
+
+
+def message_type(packet) -> int:
+    """Message type of a packed DHCPMessage, which always writes option 53 first. None if absent."""
+    if len(packet) > 242 and packet[240] == 53:
+        return packet[242]
+    return None
+
+
+def count_sent(packet):
+    MESSAGES_SENT.labels(MESSAGE_TYPE_LABELS.get(message_type(packet), 'other')).inc()
+
+
+def count_received(msg_type: int):
+    MESSAGES_RECEIVED.labels(MESSAGE_TYPE_LABELS.get(msg_type, 'other')).inc()
@@ -0,0 +1,135 @@
+import threading
+from .dhcp_message import DHCPMessage
+
+
+class Offer:
+    """One DHCPOFFER collected during the selection window."""
+
+    __slots__ = ('msg', 'server_id', 'ip', 'rtt', 'addr')
+
+    def __init__(self, msg: DHCPMessage, addr: tuple, rtt: float = None):
+        self.msg = msg
+        self.server_id = msg.options.get(54) or addr[0]
+        self.ip = msg.yiaddr
+        self.rtt = rtt # None when the DISCOVER was retransmitted (Karn's rule)
+        self.addr = addr
+
+    def __repr__(self):
+        return f"Offer(ip='{self.ip}', server_id='{self.server_id}', rtt={self.rtt})"
+
+
+class _ServerRecord:
+    __slots__ = ('rtt', 'nak_rate', 'offers', 'acks', 'naks')
+
+    def __init__(self):
+        self.rtt = None
+        self.nak_rate = 0.0
+        self.offers = 0
+        self.acks = 0
+        self.naks = 0
+
+
+class ServerStats:
+    """
+    Exponentially weighted moving averages of every server's round-trip time and NAK
+    rate, kept across transactions so later offer selections can prefer the servers that
+    answer fastest and refuse least. alpha is the weight of the newest sample.
+    """
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._servers = {} # server_id -> _ServerRecord
+        self._lock = threading.Lock()
+
+    def _record(self, server_id: str) -> _ServerRecord:
+        record = self._servers.get(server_id)
+        if record is None:
+            record = self._servers.setdefault(server_id, _ServerRecord())
+        return record
+
+    def observe_offer(self, server_id: str, rtt: float = None):
+        with self._lock:
+            record = self._record(server_id)
+            record.offers += 1
+            if rtt is not None:
+                self._update_rtt(record, rtt)
+
+    def observe_reply(self, server_id: str, nak: bool, rtt: float = None):
+        """Records the ACK or NAK a server gave to a REQUEST."""
+        with self._lock:
+            record = self._record(server_id)
+            if nak:
+                record.naks += 1
+            else:
+                record.acks += 1
+            record.nak_rate += self.alpha * ((1.0 if nak else 0.0) - record.nak_rate)
+            if rtt is not None:
+                self._update_rtt(record, rtt)
+
+    def _update_rtt(self, record: _ServerRecord, rtt: float):
+        record.rtt = rtt if record.rtt is None else record.rtt + self.alpha * (rtt - record.rtt)
+
+    def rtt(self, server_id: str) -> float:
+        record = self._servers.get(server_id)
+        return record.rtt if record else None
+
+    def nak_rate(self, server_id: str) -> float:
+        record = self._servers.get(server_id)
+        return record.nak_rate if record else 0.0
+
+    def cost(self, server_id: str, rtt: float = None) -> float:
+        """
+        Expected time to a lease from this server: its average RTT (or the given one when
+        it has none yet) divided by its chance of ACKing. Unknown servers cost infinity.
+        """
+        record = self._servers.get(server_id)
+        average = record.rtt if record and record.rtt is not None else rtt
+        if average is None:
+            return float('inf')
+        nak_rate = record.nak_rate if record else 0.0
+        return average / max(1.0 - nak_rate, 0.01)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {server_id: dict(rtt=record.rtt, nak_rate=round(record.nak_rate, 4), offers=record.offers,
+                                    acks=record.acks, naks=record.naks)
+                    for server_id, record in self._servers.items()}
+
+
+# statistics shared by every client in the process
+server_stats = ServerStats()
+
+
+# selection policies: policy(offers, stats) returns the offers best first, so that the
+# client can fail over down the list when the chosen server NAKs
+
+def first_arrival(offers: list, stats: ServerStats) -> list:
+    """The order the OFFERs arrived in."""
+    return list(offers)
+
+
+def lowest_rtt(offers: list, stats: ServerStats) -> list:
+    """Lowest expected cost first (see ServerStats.cost); ties keep arrival order."""
+    return sorted(offers, key=lambda offer: stats.cost(offer.server_id, offer.rtt))
+
+
+def preferred_servers(server_ids: list, fallback=lowest_rtt):
+    """Policy taking OFFERs from server_ids first, in that order, then the rest ranked by fallback."""
+    rank = {server_id: i for i, server_id in enumerate(server_ids)}
+
+    def policy(offers: list, stats: ServerStats) -> list:
+        preferred = sorted((offer for offer in offers if offer.server_id in rank), key=lambda offer: rank[offer.server_id])
+        return preferred + fallback([offer for offer in offers if offer.server_id not in rank], stats)
+    return policy
+
+
+def requested_ip(ip: str, fallback=first_arrival):
+    """Policy taking OFFERs of the given address first, then the rest ranked by fallback."""
+    def policy(offers: list, stats: ServerStats) -> list:
+        matching = [offer for offer in offers if offer.ip == ip]
+        return fallback(matching, stats) + fallback([offer for offer in offers if offer.ip != ip], stats)
+    return policy
+
+
+# policies that take no argument, by name
+POLICIES = {'first_arrival': first_arrival, 'lowest_rtt': lowest_rtt}
@@ -0,0 +1,158 @@
+import ctypes
+import logging
+import socket
+import struct
+from .dhcp_message import DHCPMessage
+from .dhcp_transport import DHCPTransport, TransportConfig
+from .frames import BROADCAST_MAC, ETH_P_IP, build_frame, udp_payload
+from .metrics import MALFORMED, count_received, count_sent
+
+logger = logging.getLogger(__name__)
+
+# Linux constants not exported by the socket module
+SOL_PACKET = 263
+SO_ATTACH_FILTER = 26
+PACKET_ADD_MEMBERSHIP = 1
+PACKET_MR_PROMISC = 1
+PACKET_OUTGOING = 4 # pkttype of our own frames, which packet sockets see too
+
+# offsets into the BOOTP header
+_CIADDR_OFFSET = 12
+_CHADDR_OFFSET = 28
+
+# classic BPF opcodes
+_LD_H_ABS = 0x28
+_LD_B_ABS = 0x30
+_LD_H_IND = 0x48
+_LDX_B_MSH = 0xb1
+_JEQ_K = 0x15
+_JSET_K = 0x45
+_RET_K = 0x06
+
+
+def udp_port_filter(port: int) -> list:
+    """
+    Classic BPF program, as (code, jt, jf, k) tuples, accepting Ethernet frames that carry
+    an unfragmented IPv4/UDP datagram to `port`; the same as tcpdump's 'udp dst port N'
+    without the fragment corner cases. Everything else is dropped in the kernel.
+    """
+    return [
+        (_LD_H_ABS, 0, 0, 12),        # ethertype
+        (_JEQ_K, 0, 8, ETH_P_IP),
+        (_LD_B_ABS, 0, 0, 23),        # IP protocol
+        (_JEQ_K, 0, 6, 17),
+        (_LD_H_ABS, 0, 0, 20),        # flags and fragment offset
+        (_JSET_K, 4, 0, 0x1fff),      # a non-first fragment has no UDP header
+        (_LDX_B_MSH, 0, 0, 14),       # X = IP header length
+        (_LD_H_IND, 0, 0, 16),        # UDP destination port
+        (_JEQ_K, 0, 1, port),
+        (_RET_K, 0, 0, 0x40000),      # accept the whole frame
+        (_RET_K, 0, 0, 0),            # drop
+    ]
+
+
+def attach_filter(sock: socket.socket, program: list):
+    """Attaches a classic BPF program to a socket (SO_ATTACH_FILTER)."""
+    instructions = b''.join(struct.pack('HBBI', *instruction) for instruction in program)
+    buffer = ctypes.create_string_buffer(instructions)
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack('HL', len(program), ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def open_packet_socket(interface: str, protocol: int, receive_buffer: int = None, program: list = None,
+                       promiscuous: bool = False) -> socket.socket:
+    """
+    Opens an AF_PACKET socket on interface for one ethertype, with an optional BPF program
+    and promiscuous membership. Raises OSError if any step fails.
+    """
+    if not hasattr(socket, 'AF_PACKET'):
+        raise OSError("packet sockets need AF_PACKET (Linux)")
+    if not interface:
+        raise OSError("packet sockets need an interface, see DHCP_INTERFACE")
+    # protocol 0 receives nothing, so no unfiltered frame is queued before the filter is attached
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+    try:
+        if receive_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        if program:
+            attach_filter(sock, program)
+        sock.bind((interface, protocol))
+        if promiscuous:
+            # struct packet_mreq { int ifindex; unsigned short type, alen; unsigned char address[8]; }
+            mreq = struct.pack('iHH8s', socket.if_nametoindex(interface), PACKET_MR_PROMISC, 0, b'')
+            sock.setsockopt(SOL_PACKET, PACKET_ADD_MEMBERSHIP, mreq)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class PacketTransport(DHCPTransport):
+    """
+    Sends and receives DHCP as raw Ethernet frames over an AF_PACKET socket (Linux, needs
+    CAP_NET_RAW). Every frame carries the chaddr of its packet as source MAC, and ciaddr
+    as source IP (0.0.0.0 before a lease), so the network sees one station per virtual
+    client. Replies are received whatever the host's own addresses, including unicast
+    replies to an address not configured yet; a BPF filter on the client port drops all
+    other traffic in the kernel.
+
+    Broadcasts go to ff:ff:ff:ff:ff:ff. Unicasts go to the MAC the server's replies came
+    from, or are broadcast at the Ethernet layer until one has been seen. With promiscuous
+    (the default) the interface also accepts frames sent to the virtual MACs.
+    """
+
+    def __init__(self, config: TransportConfig = None, promiscuous: bool = True, **settings):
+        super().__init__(config, **settings)
+        self.promiscuous = promiscuous
+        self.neighbours = {} # server IP -> MAC its replies came from
+
+    def _open_socket(self) -> socket.socket:
+        return open_packet_socket(self.config.interface, ETH_P_IP, self.config.receive_buffer,
+                                  udp_port_filter(self.client_port), self.promiscuous)
+
+    def frame(self, packet: bytes, addr: tuple) -> bytes:
+        """The Ethernet frame that carries packet to addr (ip, port)."""
+        ip, port = addr
+        if ip in ('<broadcast>', '255.255.255.255'):
+            ip, dst_mac = '255.255.255.255', BROADCAST_MAC
+        else:
+            dst_mac = self.neighbours.get(ip, BROADCAST_MAC)
+        src_ip = socket.inet_ntoa(packet[_CIADDR_OFFSET:_CIADDR_OFFSET + 4])
+        src_mac = bytes(packet[_CHADDR_OFFSET:_CHADDR_OFFSET + 6])
+        return build_frame(packet, src_ip, ip, self.client_port, port, src_mac, dst_mac)
+
+    def _transmit(self, packet: bytes, addr: tuple):
+        sock = self.socket
+        if not sock:
+            raise OSError("transport is closed")
+        sock.send(self.frame(packet, addr))
+        count_sent(packet)
+
+    def _receive_loop(self, sock):
+        buffer = bytearray(4096)
+        view = memoryview(buffer)
+        while self.socket is sock:
+            try:
+                length, addr = sock.recvfrom_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if addr[2] == PACKET_OUTGOING:
+                continue
+
+            parsed = udp_payload(view[:length])
+            if parsed is None:
+                continue
+            src, _, src_port, _, payload = parsed
+            try:
+                msg = DHCPMessage.unpack_from(payload)
+                count_received(msg.options.get(53))
+            except Exception as ex:
+                MALFORMED.inc()
+                logger.warning("[!] Dropping malformed packet from %s: %s", src, ex)
+                continue
+            if src != '0.0.0.0':
+                self.neighbours[src] = bytes(view[6:12])
+            self._dispatch(msg, (src, src_port))
@@ -0,0 +1,346 @@
+"""
+Reads DHCP traffic from pcap and pcapng captures, with a minimal Ethernet/IPv4/UDP parser
+and no external tools, decodes it in batches and summarizes it as lease events. Captured
+requests can also be replayed against a LoopbackDHCPServer at a multiple of their speed.
+
+    python -m dhcp_logic.pcap_replay capture.pcapng
+    python -m dhcp_logic.pcap_replay capture.pcap --json --events
+    python -m dhcp_logic.pcap_replay capture.pcap --replay 16767 --speed 10
+"""
+import argparse
+import json
+import select
+import socket
+import struct
+import sys
+import time
+from .dhcp_message import (DHCPMessage, BOOTREQUEST, DHCPACK, DHCPNAK, DHCPRELEASE, DHCPDECLINE,
+                           DHCPDISCOVER, DHCPOFFER, DHCPREQUEST, DHCPINFORM)
+from .frames import LINKTYPE_ETHERNET, udp_payload
+
+_PCAP_MAGIC_US = 0xa1b2c3d4
+_PCAP_MAGIC_NS = 0xa1b23c4d
+_PCAPNG_SHB = 0x0a0d0d0a
+_PCAPNG_BYTE_ORDER = 0x1a2b3c4d
+_PCAPNG_IDB = 1
+_PCAPNG_SPB = 3
+_PCAPNG_EPB = 6
+# no sane block is bigger; a larger length means the file is corrupt
+_MAX_BLOCK = 16 * 1024 * 1024
+
+DHCP_PORTS = (67, 68)
+
+MESSAGE_TYPE_NAMES = {DHCPDISCOVER: 'discover', DHCPOFFER: 'offer', DHCPREQUEST: 'request', DHCPDECLINE: 'decline',
+                      DHCPACK: 'ack', DHCPNAK: 'nak', DHCPRELEASE: 'release', DHCPINFORM: 'inform'}
+
+
+# capture file readers
+
+def read_frames(f):
+    """Yields (timestamp, linktype, frame) for every packet of a pcap or pcapng file object."""
+    head = f.read(4)
+    if len(head) < 4:
+        return
+    if struct.unpack('<I', head)[0] == _PCAPNG_SHB:
+        yield from _read_pcapng(f, head)
+    else:
+        yield from _read_pcap(f, head)
+
+
+def _read_pcap(f, magic: bytes):
+    for order in ('<', '>'):
+        value = struct.unpack(order + 'I', magic)[0]
+        if value in (_PCAP_MAGIC_US, _PCAP_MAGIC_NS):
+            break
+    else:
+        raise ValueError(f"not a pcap or pcapng file (magic {magic.hex()})")
+    scale = 1e-9 if value == _PCAP_MAGIC_NS else 1e-6
+
+    header = f.read(20)
+    if len(header) < 20:
+        raise ValueError("truncated pcap header")
+    linktype = struct.unpack(order + 'I', header[16:20])[0] & 0xffff
+    record = struct.Struct(order + 'IIII')
+    while True:
+        head = f.read(record.size)
+        if len(head) < record.size:
+            return # end of file, or a capture cut short mid-record
+        seconds, fraction, captured, _ = record.unpack(head)
+        if captured > _MAX_BLOCK:
+            raise ValueError(f"corrupt pcap record of {captured} bytes")
+        frame = f.read(captured)
+        if len(frame) < captured:
+            return
+        yield seconds + fraction * scale, linktype, frame
+
+
+def _read_pcapng(f, head: bytes):
+    order = '<'
+    interfaces = [] # (linktype, seconds per timestamp unit) per interface of the current section
+    while True:
+        if len(head) < 4:
+            return
+        rest = f.read(8 if head == b'\x0a\x0d\x0d\x0a' else 4)
+        if head == b'\x0a\x0d\x0d\x0a':
+            # section header: its byte-order magic decides how everything after it is read
+            if len(rest) < 8:
+                return
+            order = '<' if struct.unpack('<I', rest[4:8])[0] == _PCAPNG_BYTE_ORDER else '>'
+            if struct.unpack(order + 'I', rest[4:8])[0] != _PCAPNG_BYTE_ORDER:
+                raise ValueError("corrupt pcapng section header")
+            block_type, length = _PCAPNG_SHB, struct.unpack(order + 'I', rest[:4])[0]
+            interfaces = []
+            prefix = 4 # the byte-order magic, already read
+        else:
+            if len(rest) < 4:
+                return
+            block_type, length = struct.unpack(order + 'I', head)[0], struct.unpack(order + 'I', rest)[0]
+            prefix = 0
+        if length < 12 or length > _MAX_BLOCK or length % 4:
+            raise ValueError(f"corrupt pcapng block of {length} bytes")
+        body = f.read(length - 12 - prefix)
+        trailer = f.read(4)
+        if len(trailer) < 4:
+            return
+
+        if block_type == _PCAPNG_IDB and len(body) >= 8:
+            linktype = struct.unpack(order + 'H', body[:2])[0]
+            interfaces.append((linktype, _pcapng_resolution(body[8:], order)))
+        elif block_type == _PCAPNG_EPB and len(body) >= 20:
+            interface, high, low, captured, _ = struct.unpack(order + 'IIIII', body[:20])
+            if interface < len(interfaces):
+                linktype, resolution = interfaces[interface]
+                yield ((high << 32) | low) * resolution, linktype, body[20:20 + captured]
+        elif block_type == _PCAPNG_SPB and len(body) >= 4 and interfaces:
+            linktype, _ = interfaces[0]
+            yield None, linktype, body[4:4 + struct.unpack(order + 'I', body[:4])[0]]
+        head = f.read(4)
+
+
+def _pcapng_resolution(options: bytes, order: str) -> float:
+    """Seconds per timestamp unit, from the if_tsresol option (default microseconds)."""
+    i = 0
+    while i + 4 <= len(options):
+        code, length = struct.unpack(order + 'HH', options[i:i + 4])
+        if code == 0:
+            break
+        if code == 9 and length >= 1 and i + 4 < len(options):
+            value = options[i + 4]
+            return 2.0 ** -(value & 0x7f) if value & 0x80 else 10.0 ** -value
+        i += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+# capture writer
+
+def write_pcap(f, frames, linktype: int = LINKTYPE_ETHERNET):
+    """Writes (timestamp, frame) pairs as a classic microsecond pcap file, e.g. to save a fuzz corpus."""
+    f.write(struct.pack('<IHHiIII', _PCAP_MAGIC_US, 2, 4, 0, 0, 65535, linktype))
+    for timestamp, frame in frames:
+        seconds = int(timestamp)
+        f.write(struct.pack('<IIII', seconds, int(round((timestamp - seconds) * 1e6)), len(frame), len(frame)))
+        f.write(frame)
+
+
+# decoding
+
+def dhcp_payloads(f, ports: tuple = DHCP_PORTS):
+    """Yields (timestamp, src_ip, dst_ip, dst_port, payload) for every UDP packet to or from a DHCP port."""
+    for timestamp, linktype, frame in read_frames(f):
+        parsed = udp_payload(frame, linktype)
+        if parsed is None:
+            continue
+        src, dst, src_port, dst_port, payload = parsed
+        if src_port in ports or dst_port in ports:
+            yield timestamp, src, dst, dst_port, payload
+
+
+def decode_batches(payloads, batch_size: int = 256):
+    """
+    Groups payloads into batches and decodes each batch in one tight loop. Yields lists of
+    (timestamp, DHCPMessage or the ValueError it raised).
+    """
+    batch = []
+    for item in payloads:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield _decode(batch)
+            batch = []
+    if batch:
+        yield _decode(batch)
+
+
+def _decode(batch: list) -> list:
+    decoded = []
+    unpack = DHCPMessage.unpack_from
+    for timestamp, _, _, _, payload in batch:
+        try:
+            msg = unpack(payload)
+            msg.options.get(53)
+        except ValueError as ex:
+            msg = ex
+        decoded.append((timestamp, msg))
+    return decoded
+
+
+class LeaseEvent:
+    """One lease-relevant message seen in a capture."""
+
+    __slots__ = ('timestamp', 'type', 'mac_addr_str', 'xid', 'ip', 'server_id', 'lease_time')
+
+    def __init__(self, timestamp: float, type: str, mac_addr_str: str, xid: int, ip: str = None,
+                 server_id: str = None, lease_time: int = None):
+        self.timestamp = timestamp
+        self.type = type
+        self.mac_addr_str = mac_addr_str
+        self.xid = xid
+        self.ip = ip
+        self.server_id = server_id
+        self.lease_time = lease_time
+
+    def to_dict(self) -> dict:
+        return dict(timestamp=self.timestamp, type=self.type, mac_address=self.mac_addr_str, xid=hex(self.xid),
+                    ip_address=self.ip, server_id=self.server_id, lease_time=self.lease_time)
+
+
+class CaptureSummary:
+    """Counts, lease events and the leases still bound at the end of a capture."""
+
+    def __init__(self, keep_events: bool = True):
+        self.keep_events = keep_events
+        self.packets = 0
+        self.malformed = 0
+        self.types = {} # message type name -> count
+        self.events = []
+        self.leases = {} # mac -> (ip, server_id), bound at the end of the capture
+        self.decode_seconds = 0.0
+
+    def add(self, timestamp: float, msg):
+        self.packets += 1
+        if isinstance(msg, Exception):
+            self.malformed += 1
+            return
+        try:
+            event = self._event(timestamp, msg)
+        except ValueError:
+            # an option that only fails when read, e.g. a 3-byte server id
+            self.malformed += 1
+            return
+        if event is not None and self.keep_events:
+            self.events.append(event)
+
+    def _event(self, timestamp: float, msg: DHCPMessage) -> LeaseEvent:
+        options = msg.options
+        msg_type = options.get(53)
+        name = MESSAGE_TYPE_NAMES.get(msg_type, 'other')
+        self.types[name] = self.types.get(name, 0) + 1
+        mac = msg.chaddr_str
+
+        if msg_type == DHCPACK and msg.yiaddr_int: # an ACK to INFORM carries no address
+            self.leases[mac] = (msg.yiaddr, options.get(54))
+            return LeaseEvent(timestamp, 'bound', mac, msg.xid, msg.yiaddr, options.get(54), options.get(51))
+        if msg_type == DHCPNAK:
+            self.leases.pop(mac, None)
+            return LeaseEvent(timestamp, 'nak', mac, msg.xid, server_id=options.get(54))
+        if msg_type == DHCPRELEASE:
+            self.leases.pop(mac, None)
+            return LeaseEvent(timestamp, 'released', mac, msg.xid, msg.ciaddr, options.get(54))
+        if msg_type == DHCPDECLINE:
+            self.leases.pop(mac, None)
+            return LeaseEvent(timestamp, 'declined', mac, msg.xid, options.get(50), options.get(54))
+        return None
+
+    def to_dict(self, events: bool = False) -> dict:
+        report = dict(packets=self.packets, malformed=self.malformed, types=self.types,
+                      bound_at_end=len(self.leases), decode_seconds=round(self.decode_seconds, 4),
+                      decode_per_sec=round(self.packets / self.decode_seconds) if self.decode_seconds else None)
+        if events:
+            report['events'] = [event.to_dict() for event in self.events]
+        return report
+
+
+def summarize(f, batch_size: int = 256, keep_events: bool = True) -> CaptureSummary:
+    """Decodes every DHCP packet of a capture file object and summarizes it."""
+    summary = CaptureSummary(keep_events)
+    batches = decode_batches(dhcp_payloads(f), batch_size)
+    while True:
+        # times reading, header parsing and decoding; summarizing is left out
+        started = time.perf_counter()
+        batch = next(batches, None)
+        summary.decode_seconds += time.perf_counter() - started
+        if batch is None:
+            return summary
+        for timestamp, msg in batch:
+            summary.add(timestamp, msg)
+
+
+# replay
+
+def replay(f, server_address: tuple, speed: float = 1.0, linger: float = 0.5) -> dict:
+    """
+    Sends the client messages (BOOTREQUESTs) of a capture to server_address, keeping
+    their original spacing divided by speed; speed <= 0 sends them back to back. Replies
+    to the replaying socket are counted until `linger` seconds after the last send.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('', 0))
+    sock.setblocking(False)
+    sent = replies = 0
+    first = started = None
+
+    def drain(timeout: float) -> int:
+        received = 0
+        while select.select([sock], [], [], max(0.0, timeout))[0]:
+            try:
+                sock.recv(1500)
+            except OSError:
+                break
+            received += 1
+            timeout = 0
+        return received
+
+    try:
+        for timestamp, _, _, _, payload in dhcp_payloads(f):
+            if len(payload) < 1 or payload[0] != BOOTREQUEST:
+                continue
+            now = time.monotonic()
+            if started is None:
+                first, started = timestamp, now
+            elif speed > 0 and timestamp is not None and first is not None:
+                replies += drain(started + (timestamp - first) / speed - now)
+            sock.sendto(payload, server_address)
+            sent += 1
+        replies += drain(linger)
+    finally:
+        sock.close()
+    elapsed = time.monotonic() - started if started is not None else 0.0
+    return dict(sent=sent, replies=replies, elapsed=round(elapsed, 3))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode or replay the DHCP traffic of a pcap/pcapng capture.")
+    parser.add_argument('capture')
+    parser.add_argument('--batch', type=int, default=256, help="packets decoded per batch")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    parser.add_argument('--events', action='store_true', help="include every lease event in the JSON summary")
+    parser.add_argument('--replay', type=int, metavar='PORT', help="replay the requests to a server on this UDP port")
+    parser.add_argument('--server', default="127.0.0.1", help="address of the server to replay to")
+    parser.add_argument('--speed', type=float, default=1.0, help="speed multiple of the replay; 0 sends as fast as possible")
+    args = parser.parse_args(argv)
+
+    with open(args.capture, 'rb') as f:
+        report = summarize(f, args.batch, keep_events=args.events).to_dict(events=args.events)
+    if args.replay:
+        with open(args.capture, 'rb') as f:
+            report['replay'] = replay(f, (args.server, args.replay), args.speed)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, value in report.items():
+            print(f"{name:>16}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Allows `rate` operations per second on average, with bursts of up to `burst`.
+    Tokens accrue continuously; an operation that finds none waits (take) or is told
+    how long until the next one (wait_time), so a driver loop can fold the wait into
+    the timeout it already sleeps on.
+    """
+
+    def __init__(self, rate: float, burst: float = None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        # default: 50 ms worth of tokens, so high rates do not need a wakeup per operation
+        self.burst = burst if burst is not None else max(1.0, rate / 20)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_take(self, tokens: float = 1.0) -> bool:
+        """Takes tokens if they are available right now."""
+        with self._lock:
+            self._refill(self.clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Seconds until try_take(tokens) can succeed; 0 if it can now."""
+        with self._lock:
+            self._refill(self.clock())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def take(self, tokens: float = 1.0):
+        """Blocks until the tokens are available, then takes them."""
+        while not self.try_take(tokens):
+            time.sleep(self.wait_time(tokens))
@@ -0,0 +1,98 @@
+import zlib
+from .dhcp_message import ip_to_int, int_to_ip
+from .dhcp_options import RELAY_AGENT_INFORMATION, AGENT_CIRCUIT_ID, AGENT_REMOTE_ID, END, PAD, encode_option
+from .dhcp_transport import DHCPTransport, TransportConfig
+
+# offsets into the BOOTP header
+_HOPS_OFFSET = 3
+_GIADDR_OFFSET = 24
+_CHADDR_OFFSET = 28
+
+# RFC 1542: a relay discards requests that already passed this many relays
+MAX_HOPS = 16
+
+
+class VirtualSubnet:
+    """One simulated relay-agent interface: its giaddr and the option 82 sub-options it adds."""
+
+    __slots__ = ('giaddr', 'circuit_id', 'remote_id', '_option82')
+
+    def __init__(self, giaddr: str, circuit_id=None, remote_id=None):
+        self.giaddr = giaddr
+        self.circuit_id = circuit_id
+        self.remote_id = remote_id
+
+        sub_options = []
+        if circuit_id is not None:
+            sub_options.append((AGENT_CIRCUIT_ID, circuit_id))
+        if remote_id is not None:
+            sub_options.append((AGENT_REMOTE_ID, remote_id))
+        # encoded once, since it is appended to every packet relayed for this subnet
+        self._option82 = encode_option(RELAY_AGENT_INFORMATION, tuple(sub_options)) if sub_options else b''
+
+    @classmethod
+    def many(cls, first_giaddr: str, count: int, stride: int = 256, remote_id=None) -> list:
+        """count subnets with giaddrs first_giaddr, first_giaddr + stride, ... and circuit ids 'subnet-<n>'."""
+        first = ip_to_int(first_giaddr)
+        return [cls(int_to_ip(first + n * stride), circuit_id=f"subnet-{n}", remote_id=remote_id)
+                for n in range(count)]
+
+    def __repr__(self):
+        return f"VirtualSubnet(giaddr='{self.giaddr}', circuit_id={self.circuit_id!r}, remote_id={self.remote_id!r})"
+
+
+class RelayTransport(DHCPTransport):
+    """
+    Drives DHCP servers the way a relay agent does (RFC 2131 section 4.1, RFC 3046):
+    instead of broadcasting, each client request is stamped with the giaddr of its
+    virtual subnet, its hop count is raised and option 82 is appended, then it is unicast
+    to every configured server. Servers answer the giaddr on the server port, so the
+    socket binds port 67 by default and replies are routed back to the waiting client
+    by xid as usual.
+
+    MACs are spread over the subnets by CRC32 unless assign() pins one. The host must own
+    (or route back) every giaddr used; unicast RENEW/RELEASE traffic is sent unchanged.
+    """
+
+    def __init__(self, servers: list, subnets: list, config: TransportConfig = None, **settings):
+        settings.setdefault('client_port', 67)
+        super().__init__(config, **settings)
+        self.servers = list(servers)
+        self.subnets = list(subnets)
+        self._assigned = {} # chaddr (6 bytes) -> VirtualSubnet
+
+    def assign(self, chaddr: bytes, subnet: VirtualSubnet):
+        """Places one client MAC on a given subnet."""
+        self._assigned[bytes(chaddr[:6])] = subnet
+
+    def subnet_for(self, chaddr: bytes) -> VirtualSubnet:
+        chaddr = bytes(chaddr[:6])
+        subnet = self._assigned.get(chaddr)
+        if subnet is None:
+            subnet = self.subnets[zlib.crc32(chaddr) % len(self.subnets)]
+        return subnet
+
+    def relay(self, packet: bytes, subnet: VirtualSubnet) -> bytes:
+        """Returns the packet as the relay agent for subnet would forward it."""
+        buffer = bytearray(packet)
+        if buffer[_HOPS_OFFSET] >= MAX_HOPS:
+            raise ValueError(f"packet already crossed {buffer[_HOPS_OFFSET]} relays")
+        buffer[_HOPS_OFFSET] += 1
+        # an upstream relay's giaddr is kept, as RFC 2131 requires
+        if not any(buffer[_GIADDR_OFFSET:_GIADDR_OFFSET + 4]):
+            buffer[_GIADDR_OFFSET:_GIADDR_OFFSET + 4] = ip_to_int(subnet.giaddr).to_bytes(4, 'big')
+
+        if subnet._option82:
+            # option 82 goes last, right before END
+            end = len(buffer)
+            while end > 0 and buffer[end - 1] == PAD:
+                end -= 1
+            if end > 0 and buffer[end - 1] == END:
+                end -= 1
+            buffer[end:] = subnet._option82 + bytes((END,))
+        return bytes(buffer)
+
+    def broadcast(self, packet: bytes):
+        relayed = self.relay(packet, self.subnet_for(packet[_CHADDR_OFFSET:_CHADDR_OFFSET + 6]))
+        for server in self.servers:
+            self.send(relayed, (server, self.server_port))
@@ -0,0 +1,190 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class TaskRecord:
+    """
+    Status of one /start-dhcp task. While the task runs it holds the DHCPClient so the
+    status can be read live; finish() keeps only the outcome and drops the client.
+    """
+
+    __slots__ = ('task_id', 'status', 'assigned_ip', 'server_id', 'created_at', 'updated_at', 'client')
+
+    def __init__(self, task_id: str, status: str = None, assigned_ip: str = None, server_id: str = None,
+                 created_at: float = None, updated_at: float = None, client=None):
+        self.task_id = task_id
+        self.status = status
+        self.assigned_ip = assigned_ip
+        self.server_id = server_id
+        self.created_at = created_at if created_at is not None else time.time()
+        self.updated_at = updated_at if updated_at is not None else self.created_at
+        self.client = client
+
+    def snapshot(self):
+        """Copies the outcome out of the client (if any) and releases it."""
+        client, self.client = self.client, None
+        if client is not None:
+            self.status = client.state
+            self.assigned_ip = client.assigned_ip
+            self.server_id = client.server_id
+        self.updated_at = time.time()
+
+    def to_dict(self) -> dict:
+        client = self.client
+        if client is not None:
+            return dict(status=client.state, assigned_ip=client.assigned_ip, server_id=client.server_id)
+        return dict(status=self.status, assigned_ip=self.assigned_ip, server_id=self.server_id)
+
+
+class TaskStore(ABC):
+    """Interface for task registries. Implementations must be safe to call from several threads."""
+
+    @abstractmethod
+    def put(self, record: TaskRecord):
+        pass
+
+    @abstractmethod
+    def get(self, task_id: str) -> TaskRecord:
+        pass
+
+    @abstractmethod
+    def finish(self, task_id: str):
+        """Marks a task done: keeps its status, IP, server_id and timestamps, drops everything else."""
+
+    @abstractmethod
+    def delete(self, task_id: str):
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+
+class MemoryTaskStore(TaskStore):
+    """In-process task registry with LRU eviction beyond max_size and a sliding time-to-live per record."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, clock=time.time):
+
+        self.max_size = max_size
+        self.ttl = ttl # seconds since the record was last put, read or finished; None keeps records until evicted by size
+        self.clock = clock
+        self._records = OrderedDict() # least recently used first
+        self._used = {} # task_id -> when it was last put, read or finished; the TTL runs from here
+        self._lock = threading.Lock()
+
+    def put(self, record: TaskRecord):
+        with self._lock:
+            record.updated_at = self._used[record.task_id] = self.clock()
+            self._records[record.task_id] = record
+            self._records.move_to_end(record.task_id)
+            self._evict()
+
+    def get(self, task_id: str) -> TaskRecord:
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is None:
+                return None
+            if self._expired(task_id):
+                self._drop(task_id)
+                return None
+            self._records.move_to_end(task_id)
+            self._used[task_id] = self.clock()
+            return record
+
+    def finish(self, task_id: str):
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is not None:
+                record.snapshot()
+                record.updated_at = self._used[task_id] = self.clock()
+                self._records.move_to_end(task_id)
+
+    def delete(self, task_id: str):
+        with self._lock:
+            self._drop(task_id)
+
+    def __len__(self):
+        return len(self._records)
+
+    def _drop(self, task_id: str):
+        self._records.pop(task_id, None)
+        self._used.pop(task_id, None)
+
+    def _expired(self, task_id: str) -> bool:
+        return self.ttl is not None and self.clock() - self._used[task_id] > self.ttl
+
+    def _evict(self):
+        # every use moves a record to the end and restarts its TTL, so the LRU order is also
+        # the order in which TTLs run out: expired and excess records are all at the front
+        while self._records:
+            task_id = next(iter(self._records))
+            if len(self._records) > self.max_size or self._expired(task_id):
+                self._drop(task_id)
+            else:
+                break
+
+
+class RedisTaskStore(TaskStore):
+    """
+    Task registry backed by any client with the redis-py hash API (hset, hgetall, expire,
+    delete), so several app workers can answer /status for each other's tasks.
+
+    Running tasks also stay in a small local table because the live DHCPClient cannot be
+    shared; other workers see the status last written to Redis.
+    """
+
+    def __init__(self, redis_client, prefix: str = 'dhcp:task:', ttl: int = 3600, local_max_size: int = 10000):
+
+        self.redis = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+        self._local = MemoryTaskStore(max_size=local_max_size, ttl=ttl)
+
+    def _key(self, task_id: str) -> str:
+        return self.prefix + task_id
+
+    def _write(self, record: TaskRecord):
+        fields = record.to_dict()
+        fields = {name: value for name, value in fields.items() if value is not None}
+        fields['created_at'] = repr(record.created_at)
+        fields['updated_at'] = repr(record.updated_at)
+        key = self._key(record.task_id)
+        self.redis.hset(key, mapping=fields)
+        if self.ttl:
+            self.redis.expire(key, int(self.ttl))
+
+    def put(self, record: TaskRecord):
+        self._local.put(record)
+        self._write(record)
+
+    def get(self, task_id: str) -> TaskRecord:
+        record = self._local.get(task_id)
+        if record is not None:
+            return record
+
+        fields = self.redis.hgetall(self._key(task_id))
+        if not fields:
+            return None
+        fields = {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                  for k, v in fields.items()}
+        return TaskRecord(task_id, status=fields.get('status'), assigned_ip=fields.get('assigned_ip'),
+                          server_id=fields.get('server_id'), created_at=float(fields['created_at']),
+                          updated_at=float(fields['updated_at']))
+
+    def finish(self, task_id: str):
+        record = self._local.get(task_id)
+        if record is None:
+            return
+        record.snapshot()
+        self._write(record)
+        # the outcome now lives in Redis; no need to hold it here as well
+        self._local.delete(task_id)
+
+    def delete(self, task_id: str):
+        self._local.delete(task_id)
+        self.redis.delete(self._key(task_id))
+
+    def __len__(self):
+        return len(self._local)
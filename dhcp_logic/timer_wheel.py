@@ -0,0 +1,127 @@
+import math
+import time
+
+
+class Timer:
+    """A scheduled callback. Cancelling only marks it; the wheel drops it when its slot comes up."""
+
+    __slots__ = ('when', 'tick', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when: float, tick: int, callback, args: tuple):
+        self.when = when
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel. Scheduling and cancelling are O(1) and each tick only
+    touches the timers that are due (plus the occasional cascade of a coarser slot),
+    so tens of thousands of lease timers cost the same per tick as a handful.
+
+    With the defaults (1 s ticks, 4 levels of 64 slots) timers up to ~194 days out
+    are placed directly; anything further is parked in the top level and re-placed
+    when that slot comes around.
+    """
+
+    def __init__(self, resolution: float = 1.0, slot_bits: int = 6, levels: int = 4, now: float = None):
+
+        self.resolution = resolution
+        self._bits = slot_bits
+        self._mask = (1 << slot_bits) - 1
+        self._levels = levels
+        self._wheels = [[[] for _ in range(1 << slot_bits)] for _ in range(levels)]
+        # timers that were already due when scheduled, fired on the next advance()
+        self._due = []
+        self._tick = self._to_tick(now if now is not None else time.time())
+        self._count = 0
+
+    def __len__(self):
+        """Number of scheduled timers, including cancelled ones not yet swept."""
+        return self._count
+
+    @property
+    def now(self) -> float:
+        """The time the wheel has been advanced to."""
+        return self._tick * self.resolution
+
+    def _to_tick(self, when: float) -> int:
+        return math.floor(when / self.resolution)
+
+    def schedule(self, when: float, callback, *args) -> Timer:
+        """Runs callback(*args) once the wheel is advanced past the absolute time `when`."""
+        timer = Timer(when, max(math.ceil(when / self.resolution), self._tick), callback, args)
+        self._place(timer)
+        self._count += 1
+        return timer
+
+    def _place(self, timer: Timer):
+        delta = timer.tick - self._tick
+        if delta <= 0:
+            self._due.append(timer)
+            return
+
+        bits = self._bits
+        for level in range(self._levels):
+            if delta < 1 << (bits * (level + 1)):
+                self._wheels[level][(timer.tick >> (bits * level)) & self._mask].append(timer)
+                return
+
+        # beyond the wheel's span: park in the last reachable top-level slot and re-place later
+        level = self._levels - 1
+        span_tick = self._tick + (1 << (bits * self._levels)) - 1
+        self._wheels[level][(span_tick >> (bits * level)) & self._mask].append(timer)
+
+    def advance(self, now: float = None) -> int:
+        """Moves the wheel forward to `now`, firing every due timer. Returns how many fired."""
+        target = self._to_tick(now if now is not None else time.time())
+        fired = self._fire(self._due)
+        while self._tick < target:
+            self._tick += 1
+            self._cascade()
+            slot = self._wheels[0][self._tick & self._mask]
+            self._wheels[0][self._tick & self._mask] = []
+            fired += self._fire(slot)
+            fired += self._fire(self._due)
+        return fired
+
+    def _cascade(self):
+        """On a level boundary, moves the next slot of each coarser level down to finer levels."""
+        tick = self._tick
+        bits = self._bits
+        levels = []
+        for level in range(1, self._levels):
+            if tick & ((1 << (bits * level)) - 1):
+                break
+            levels.append(level)
+
+        # coarsest first, so its timers are in place before the finer slot below it is split
+        for level in reversed(levels):
+            index = (tick >> (bits * level)) & self._mask
+            slot = self._wheels[level][index]
+            self._wheels[level][index] = []
+            for timer in slot:
+                if timer.cancelled:
+                    self._count -= 1
+                else:
+                    self._place(timer)
+
+    def _fire(self, timers: list) -> int:
+        if not timers:
+            return 0
+        if timers is self._due:
+            self._due = []
+        fired = 0
+        for timer in timers:
+            self._count -= 1
+            if timer.cancelled:
+                continue
+            timer.cancelled = True
+            timer.callback(*timer.args)
+            fired += 1
+        return fired
@@ -0,0 +1,235 @@
+import heapq
+import logging
+import random
+import struct
+import threading
+import time
+from collections import OrderedDict
+from .dhcp_message import DHCPDISCOVER, DHCPREQUEST, DHCPDECLINE, DHCPRELEASE
+from .metrics import TRANSMIT_QUEUE_DEPTH, TRANSMIT_WAIT, message_type
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+_XID = struct.Struct('!I') # at offset 4 of the BOOTP header
+_SECS = struct.Struct('!H') # at offset 8
+MAX_EXCHANGES = 65536 # exchanges whose start time is remembered for `secs`
+
+
+class TransmitScheduler:
+    """
+    Every packet a DHCPTransport sends goes through here, so that one place writes the
+    `secs` field and, when limits are set, paces the whole process.
+
+    Paced (any of rate, server_rate, jitter): packets are queued with a send time and
+    one sender thread puts them on the wire in batches of up to `batch_size`, as fast as
+    a global token bucket (`rate` packets/s) and one bucket per destination
+    (`server_rate`) allow. A destination is a server's address for unicasts, or the
+    broadcast address, whose bucket limits what reaches every server at once. The first
+    packet of each exchange (xid) waits a random 0..`jitter` seconds, so clients started
+    together do not all broadcast in the same millisecond (RFC 2131 4.4.1). A
+    retransmission of a packet that is still queued replaces it rather than queueing a
+    copy. Send errors are logged; the retransmission timers of the clients cover them.
+    Unpaced, packets are sent right away by the calling thread.
+
+    `secs` is written when the packet leaves: seconds since the exchange's first packet
+    went out, the DISCOVER's value for the REQUEST that follows it (RFC 2131 4.4.1), and
+    0 for DECLINE and RELEASE.
+    """
+
+    def __init__(self, send, rate: float = None, server_rate: float = None, jitter: float = 0.0,
+                 batch_size: int = 64, seed: int = None):
+
+        self._send = send # send(packet, addr), raising OSError
+        self.rate = rate
+        self.server_rate = server_rate
+        self.jitter = jitter
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.limiter = TokenBucket(rate) if rate else None
+        self._servers = {} # destination ip -> TokenBucket
+
+        self._heap = [] # entries [send_at, seq, packet, addr, queued_at, xid, msg_type]
+        self._queued = {} # xid -> its entry in the heap
+        self._exchanges = OrderedDict() # xid -> [first sent at, secs of its last DISCOVER]
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        # statistics, see to_dict
+        self.sent = 0
+        self.batches = 0
+        self.replaced = 0
+        self.errors = 0
+        self.peak_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def paced(self) -> bool:
+        return bool(self.rate or self.server_rate or self.jitter)
+
+    def start(self) -> 'TransmitScheduler':
+        with self._cond:
+            if self._running: return self
+            self._running = True
+        if self.paced:
+            self._thread = threading.Thread(target=self._run, name="dhcp-transmit", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the sender thread. Packets still queued are dropped."""
+        with self._cond:
+            self._running = False
+            dropped = len(self._heap)
+            self._heap.clear()
+            self._queued.clear()
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+        TRANSMIT_QUEUE_DEPTH.set(0)
+        if dropped:
+            logger.info("Dropped %d queued packets.", dropped)
+
+    @property
+    def depth(self) -> int:
+        """Packets waiting to be sent."""
+        return len(self._heap)
+
+    def submit(self, packet: bytes, addr: tuple):
+        """Sends packet to addr now, or queues it when paced. Raises OSError once stopped."""
+        xid = _XID.unpack_from(packet, 4)[0]
+        msg_type = message_type(packet)
+        now = time.monotonic()
+        if not self.paced:
+            with self._cond:
+                packet = self._stamp(bytearray(packet), xid, msg_type, now)
+            self._send(packet, addr)
+            self.sent += 1
+            return
+
+        with self._cond:
+            if not self._running:
+                raise OSError("transmit scheduler is stopped")
+            entry = self._queued.get(xid)
+            if entry is not None and entry[3] == addr and entry[6] == msg_type:
+                entry[2] = packet # a retransmission: send the latest copy once, in the earlier slot
+                self.replaced += 1
+                return
+            send_at = now
+            if xid not in self._exchanges and msg_type not in (DHCPDECLINE, DHCPRELEASE):
+                self._track(xid)
+                if self.jitter:
+                    send_at += self.random.uniform(0, self.jitter)
+            self._seq += 1
+            entry = [send_at, self._seq, packet, addr, now, xid, msg_type]
+            heapq.heappush(self._heap, entry)
+            self._queued[xid] = entry
+            self.peak_depth = max(self.peak_depth, len(self._heap))
+            TRANSMIT_QUEUE_DEPTH.set(len(self._heap))
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def forget(self, xid: int):
+        """Drops the timing of a finished exchange."""
+        with self._cond:
+            self._exchanges.pop(xid, None)
+
+    def _track(self, xid: int):
+        self._exchanges[xid] = [None, None]
+        if len(self._exchanges) > MAX_EXCHANGES:
+            self._exchanges.popitem(last=False)
+
+    def _stamp(self, packet: bytearray, xid: int, msg_type: int, now: float) -> bytearray:
+        """Writes the `secs` field of a packet about to be sent."""
+        if msg_type in (DHCPDECLINE, DHCPRELEASE):
+            secs = 0
+        else:
+            exchange = self._exchanges.get(xid)
+            if exchange is None:
+                self._track(xid)
+                exchange = self._exchanges[xid]
+            if exchange[0] is None:
+                exchange[0] = now
+            if msg_type == DHCPREQUEST and exchange[1] is not None:
+                secs = exchange[1]
+            else:
+                secs = min(0xFFFF, int(now - exchange[0]))
+            if msg_type == DHCPDISCOVER:
+                exchange[1] = secs
+        _SECS.pack_into(packet, 8, secs)
+        return packet
+
+    def _server_bucket(self, ip: str) -> TokenBucket:
+        if not self.server_rate:
+            return None
+        bucket = self._servers.get(ip)
+        if bucket is None:
+            bucket = self._servers[ip] = TokenBucket(self.server_rate)
+        return bucket
+
+    def _next_batch(self) -> list:
+        """Waits for packets that are due and within the rate limits. None once stopped."""
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                wait = None
+                batch = []
+                while self._heap and len(batch) < self.batch_size:
+                    entry = self._heap[0]
+                    if entry[0] > now:
+                        wait = entry[0] - now
+                        break
+                    if self.limiter:
+                        wait = self.limiter.wait_time()
+                        if wait > 0:
+                            break
+                        wait = None
+                    heapq.heappop(self._heap)
+                    bucket = self._server_bucket(entry[3][0])
+                    if bucket is not None and not bucket.try_take():
+                        # this server is saturated; packets for the others go first
+                        self._seq += 1
+                        entry[0], entry[1] = now + bucket.wait_time(), self._seq
+                        heapq.heappush(self._heap, entry)
+                        continue
+                    if self.limiter:
+                        self.limiter.try_take()
+                    if self._queued.get(entry[5]) is entry:
+                        del self._queued[entry[5]]
+                    entry[2] = self._stamp(bytearray(entry[2]), entry[5], entry[6], now)
+                    batch.append(entry)
+                TRANSMIT_QUEUE_DEPTH.set(len(self._heap))
+                if batch:
+                    return batch
+                self._cond.wait(wait)
+            return None
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.batches += 1
+            for _, _, packet, addr, queued_at, _, _ in batch:
+                try:
+                    self._send(packet, addr)
+                    self.sent += 1
+                except OSError as ex:
+                    self.errors += 1
+                    logger.warning("[!] Network error sending to %s: %s", addr[0], ex)
+                wait = time.monotonic() - queued_at
+                TRANSMIT_WAIT.observe(wait)
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+    def to_dict(self) -> dict:
+        queued = self.sent + self.errors
+        return dict(paced=self.paced, rate=self.rate, server_rate=self.server_rate, jitter=self.jitter,
+                    depth=self.depth, peak_depth=self.peak_depth, sent=self.sent, errors=self.errors,
+                    batches=self.batches, replaced=self.replaced,
+                    mean_wait=round(self.wait_total / queued, 6) if queued else 0.0,
+                    max_wait=round(self.wait_max, 6))
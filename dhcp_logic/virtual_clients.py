@@ -0,0 +1,101 @@
+import random
+import zlib
+
+# client identifier types (option 61)
+CLIENT_ID_MAC = 'mac' # hardware type 1 + MAC (RFC 2132 9.14)
+CLIENT_ID_DUID = 'duid' # 0xff + IAID + DUID-LL (RFC 4361)
+
+
+def client_id_for(mac_addr_str: str, kind: str = CLIENT_ID_MAC) -> bytes:
+    """Option 61 value for a MAC: its hardware-type form, or an RFC 4361 IAID + DUID-LL."""
+    mac = bytes.fromhex(mac_addr_str.replace(':', '').replace('-', ''))
+    if kind == CLIENT_ID_MAC:
+        return b'\x01' + mac
+    if kind == CLIENT_ID_DUID:
+        # one interface per virtual client, so the IAID only has to be stable
+        iaid = zlib.crc32(mac).to_bytes(4, 'big')
+        return b'\xff' + iaid + b'\x00\x03\x00\x01' + mac # DUID type 3 (LL), hardware type 1
+    raise ValueError(f"unknown client id kind {kind!r}")
+
+
+class VirtualClients:
+    """
+    A reproducible population of virtual clients for pool stress tests. Client i of a
+    given seed always has the same MAC, and MACs are only computed when read, so millions
+    of them cost no memory: iterate it, index it, or hand it to acquire_many as its MACs.
+
+    MACs start with `prefix` (locally administered 02 by default) and the remaining bits
+    come from a seeded bijection of the index, so they never repeat within the prefix's
+    address space while still looking scattered to a server that hashes on them.
+    With client_id set ('mac' or 'duid'), client_id(mac) gives each one an option 61.
+    """
+
+    def __init__(self, count: int, seed: int = 0, start: int = 0, prefix: str = "02", client_id: str = None):
+
+        prefix_bytes = bytes.fromhex(prefix.replace(':', ''))
+        if not 1 <= len(prefix_bytes) <= 3:
+            raise ValueError(f"prefix must be 1 to 3 octets, got {prefix!r}")
+        if prefix_bytes[0] & 0x01:
+            raise ValueError(f"prefix {prefix!r} is a multicast address")
+        if client_id not in (None, CLIENT_ID_MAC, CLIENT_ID_DUID):
+            raise ValueError(f"unknown client id kind {client_id!r}")
+        self.bits = 8 * (6 - len(prefix_bytes))
+        if start < 0 or count < 0 or start + count > 1 << self.bits:
+            raise ValueError(f"{start + count} clients do not fit in the {self.bits}-bit space of prefix {prefix!r}")
+
+        self.count = count
+        self.seed = seed
+        self.start = start
+        self.prefix = prefix_bytes
+        self.client_id_kind = client_id
+        rng = random.Random(seed)
+        self._mask = (1 << self.bits) - 1
+        self._multiplier = rng.getrandbits(self.bits) | 1 # odd, so invertible modulo 2**bits
+        self._offset = rng.getrandbits(self.bits)
+        self._shift = self.bits // 2
+        self._base = int.from_bytes(prefix_bytes, 'big') << self.bits
+
+    def _scramble(self, index: int) -> int:
+        # multiply-add and xorshift are each bijective on `bits` bits, so distinct indexes stay distinct
+        value = (index * self._multiplier + self._offset) & self._mask
+        return value ^ (value >> self._shift)
+
+    def mac(self, index: int) -> str:
+        """MAC of client `index` (0 <= index < count)."""
+        if not 0 <= index < self.count:
+            raise IndexError(f"client {index} out of range 0..{self.count - 1}")
+        return (self._base | self._scramble(self.start + index)).to_bytes(6, 'big').hex(':')
+
+    def client_id(self, mac_addr_str: str) -> bytes:
+        """Option 61 for one of the clients, or None when client ids are off."""
+        if self.client_id_kind is None:
+            return None
+        return client_id_for(mac_addr_str, self.client_id_kind)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += self.count
+        return self.mac(index)
+
+    def __iter__(self):
+        return self.stride(0, 1)
+
+    def stride(self, first: int, step: int):
+        """Yields the MACs of clients first, first + step, first + 2 * step, ... e.g. one worker's share."""
+        base, mask, shift = self._base, self._mask, self._shift
+        value = ((self.start + first) * self._multiplier + self._offset) & mask
+        increment = (step * self._multiplier) & mask
+        for _ in range(first, self.count, step):
+            yield (base | value ^ (value >> shift)).to_bytes(6, 'big').hex(':')
+            value = (value + increment) & mask
+
+    def __reduce__(self):
+        # pickled as its spec, e.g. when sent to worker processes
+        return VirtualClients, (self.count, self.seed, self.start, self.prefix.hex(':'), self.client_id_kind)
+
+    def __repr__(self):
+        return (f"VirtualClients(count={self.count}, seed={self.seed}, start={self.start}, "
+                f"prefix='{self.prefix.hex(':')}', client_id={self.client_id_kind!r})")
@@ -0,0 +1,261 @@
+import copy
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+from .bulk import BulkResult, ERROR, acquire_many, release_many
+from .dhcp_transport import DHCPTransport, TransportConfig
+from .lease import Lease
+from .packet_transport import PacketTransport
+from .virtual_clients import VirtualClients
+
+logger = logging.getLogger(__name__)
+
+# messages from the workers to the parent
+_LEASE = 'lease' # (kind, batch_id, lease_fields)
+_FAILED = 'failed' # (kind, batch_id, mac, reason, outcome)
+_DONE = 'done' # (kind, batch_id, worker, lease_times)
+_RELEASED = 'released' # (kind, batch_id, worker, errors)
+
+
+def shard_for(mac_addr_str: str, workers: int) -> int:
+    """Worker index owning a MAC. Stable across processes and runs, unlike hash()."""
+    return zlib.crc32(mac_addr_str.replace(':', '').replace('-', '').lower().encode()) % workers
+
+
+class _Shard:
+    """
+    The clients of a VirtualClients population that one worker owns: indexes worker,
+    worker + workers, ... Pickled as the population's spec and generated in that worker.
+    """
+
+    def __init__(self, clients: VirtualClients, worker: int, workers: int):
+        self.clients = clients
+        self.worker = worker
+        self.workers = workers
+
+    def __len__(self):
+        return len(range(self.worker, len(self.clients), self.workers))
+
+    def __iter__(self):
+        return self.clients.stride(self.worker, self.workers)
+
+
+def _lease_to_fields(lease: Lease) -> tuple:
+    t1 = lease.renew_at - lease.acquired_at if lease.renew_at is not None else None
+    t2 = lease.rebind_at - lease.acquired_at if lease.rebind_at is not None else None
+    return (lease.mac_addr_str, lease.ip, lease.server_id, lease.xid, lease.acquired_at, lease.lease_time, t1, t2)
+
+
+def _lease_from_fields(fields: tuple) -> Lease:
+    mac, ip, server_id, xid, acquired_at, lease_time, t1, t2 = fields
+    return Lease(mac, ip, server_id, xid=xid, acquired_at=acquired_at, lease_time=lease_time, t1=t1, t2=t2)
+
+
+def _fail_batch(results, worker: int, kind: str, batch_id: int, payload, error: str, reported=()):
+    """Reports every MAC of a batch not reported yet as failed with `error`, then the end of the batch."""
+    if kind == 'acquire':
+        for mac in payload:
+            if mac not in reported:
+                results.put((_FAILED, batch_id, mac, error, ERROR))
+        results.put((_DONE, batch_id, worker, []))
+    else:
+        results.put((_RELEASED, batch_id, worker, {fields[0]: error for fields in payload}))
+
+
+def _worker_main(worker: int, config: TransportConfig, tasks, results):
+    """Body of a worker process: owns one transport and runs the bulk driver on each batch it is given."""
+    transport = (PacketTransport if config.link_layer else DHCPTransport)(config)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            kind, batch_id, payload, options = task
+            try:
+                transport.open()
+            except OSError as ex:
+                _fail_batch(results, worker, kind, batch_id, payload, f"ERROR: Could not bind to {config.describe()}. {ex}")
+                continue
+
+            reported = set()
+            try:
+                if kind == 'acquire':
+                    def on_lease(lease):
+                        reported.add(lease.mac_addr_str)
+                        results.put((_LEASE, batch_id, _lease_to_fields(lease)))
+
+                    # streamed like leases, so the parent sees where in the run the pool ran dry
+                    def on_failure(mac, reason, outcome):
+                        reported.add(mac)
+                        results.put((_FAILED, batch_id, mac, reason, outcome))
+
+                    result = acquire_many(payload, transport=transport, on_lease=on_lease, on_failure=on_failure,
+                                          **options)
+                    results.put((_DONE, batch_id, worker, result.lease_times))
+                else:
+                    errors = release_many([_lease_from_fields(fields) for fields in payload], transport=transport,
+                                          **options)
+                    results.put((_RELEASED, batch_id, worker, errors))
+            except Exception as ex:
+                # a failed batch must not take the worker down: the parent gets it as failures and
+                # this process stays up for the next batch
+                logger.exception("[!] DHCP worker %d failed a batch: %s", worker, ex)
+                _fail_batch(results, worker, kind, batch_id, payload, f"ERROR: DHCP worker failed. {ex}", reported)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        transport.close()
+
+
+class WorkerPool:
+    """
+    Spreads bulk lease acquisition over several processes so encoding and decoding are not
+    bound to one core. MACs are partitioned by CRC32, so a MAC always lands on the same
+    worker (VirtualClients are split by index instead, so no worker generates the whole
+    population); each worker runs its own transport and bulk driver, and streams every
+    lease back over a queue as soon as it is ACKed.
+
+    Workers need sockets that can coexist: by default each one binds the base config with
+    SO_REUSEPORT, which works with servers that broadcast their replies. Servers that
+    unicast replies reach only one of the sockets, so pass `configs` instead, e.g. one
+    per interface, or one port per worker behind a relay or a LoopbackDHCPServer.
+    """
+
+    def __init__(self, workers: int = None, config: TransportConfig = None, configs: list = None,
+                 start_method: str = 'spawn'):
+
+        if configs is None:
+            workers = workers or os.cpu_count() or 1
+            base = copy.copy(config or DHCPTransport.shared_config())
+            base.reuse_port = True
+            configs = [base] * workers
+        self.configs = configs
+        self.workers = len(configs)
+        self._context = multiprocessing.get_context(start_method)
+        self._processes = []
+        self._tasks = []
+        self._results = None
+        self._batch_id = 0
+        # one batch at a time, so results of concurrent callers never mix
+        self._lock = threading.Lock()
+
+    def start(self) -> 'WorkerPool':
+        """Starts the worker processes, and starts again any that have died since. Safe to call more than once."""
+        if self._results is None:
+            self._results = self._context.Queue()
+        for worker, config in enumerate(self.configs):
+            if worker < len(self._processes):
+                process = self._processes[worker]
+                if process.is_alive():
+                    continue
+                process.join()
+                logger.warning("[!] DHCP worker %d exited with code %s; starting a new one.", worker, process.exitcode)
+            tasks = self._context.Queue()
+            process = self._context.Process(target=_worker_main, args=(worker, config, tasks, self._results),
+                                            name=f"dhcp-worker-{worker}", daemon=True)
+            process.start()
+            if worker < len(self._processes):
+                self._tasks[worker], self._processes[worker] = tasks, process
+            else:
+                self._tasks.append(tasks)
+                self._processes.append(process)
+        return self
+
+    def stop(self):
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._processes, self._tasks, self._results = [], [], None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _partition(self, items, mac_of) -> list:
+        shards = [[] for _ in range(self.workers)]
+        for item in items:
+            shards[shard_for(mac_of(item), self.workers)].append(item)
+        return shards
+
+    def _receive(self, busy_workers: int):
+        """Yields result messages until every busy worker has finished the current batch."""
+        remaining = busy_workers
+        while remaining:
+            try:
+                message = self._results.get(timeout=1)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self._processes):
+                    raise RuntimeError("a DHCP worker process died; it is started again with the next batch")
+                continue
+            if message[1] != self._batch_id:
+                continue # left over from an abandoned batch
+            if message[0] in (_DONE, _RELEASED):
+                remaining -= 1
+            yield message
+
+    def acquire(self, macs, concurrency: int = 64, timeout: float = 20, on_lease=None,
+                rate: float = None, client_ids=None) -> BulkResult:
+        """
+        Acquires a lease for every MAC, `concurrency` exchanges in flight per worker.
+        on_lease(lease) is called in this process as each worker reports a lease.
+        `rate` is the total for all workers; client_ids must be picklable, e.g.
+        VirtualClients.client_id. VirtualClients are not listed here: each worker gets
+        their spec and generates every `workers`-th client (by index, not by CRC32).
+        Raises ValueError if concurrency is less than 1.
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        result = BulkResult()
+        with self._lock:
+            self.start()
+            self._batch_id += 1
+            if isinstance(macs, VirtualClients):
+                shards = [_Shard(macs, worker, self.workers) for worker in range(self.workers)]
+            else:
+                shards = self._partition(macs, lambda mac: mac)
+            busy = sum(1 for shard in shards if shard)
+            options = dict(concurrency=concurrency, timeout=timeout, client_ids=client_ids,
+                           rate=rate / busy if rate and busy else None)
+            for tasks, shard in zip(self._tasks, shards):
+                if shard:
+                    tasks.put(('acquire', self._batch_id, shard, options))
+
+            for message in self._receive(busy):
+                if message[0] == _LEASE:
+                    lease = _lease_from_fields(message[2])
+                    result.add_lease(lease)
+                    if on_lease:
+                        on_lease(lease)
+                elif message[0] == _FAILED:
+                    _, _, mac, reason, outcome = message
+                    result.add_failure(mac, reason, outcome)
+                else:
+                    result.lease_times.extend(message[3])
+        result.elapsed = time.monotonic() - result.started_at
+        return result
+
+    def release(self, leases, client_ids=None) -> dict:
+        """Sends a DHCPRELEASE for every lease from the worker owning its MAC. Returns {mac: error}."""
+        errors = {}
+        with self._lock:
+            self.start()
+            self._batch_id += 1
+            shards = self._partition(leases, lambda lease: lease.mac_addr_str)
+            busy = 0
+            for tasks, shard in zip(self._tasks, shards):
+                if shard:
+                    tasks.put(('release', self._batch_id, [_lease_to_fields(lease) for lease in shard],
+                               dict(client_ids=client_ids)))
+                    busy += 1
+            for message in self._receive(busy):
+                errors.update(message[3])
+        return errors
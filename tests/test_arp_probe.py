@@ -0,0 +1,153 @@
+# test_arp_probe.py
+
+import socket
+import time
+from dhcp_logic.arp_probe import (ARPProber, ARPResponder, ARP_REPLY, ARP_REQUEST, arp_frame, parse_arp,
+                                  probe_frame)
+from dhcp_logic.bulk import acquire_many, DECLINED
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_transport import DHCPTransport
+from dhcp_logic.events import DECLINE_SENT
+from dhcp_logic.loopback_server import LoopbackDHCPServer
+
+SERVER_PORT = 16810
+CLIENT_PORT = 16811
+
+# a host already using the second address of the loopback server's pool
+IN_USE = {"10.99.0.2": "02:aa:bb:cc:dd:ee"}
+
+
+def _packet_sockets_available() -> bool:
+    # AF_PACKET is Linux-only and needs CAP_NET_RAW
+    try:
+        socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0).close()
+        return True
+    except (AttributeError, OSError):
+        return False
+
+
+def _transport():
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+    transport.open()
+    return transport
+
+
+def _prober() -> ARPProber:
+    return ARPProber("lo", probes=2, interval=0.1, wait=0.3).open()
+
+
+def test_arp_frames():
+    print("--- Testing ARP probe frames ---")
+    mac = bytes.fromhex("0a0b0c0d0e50")
+    frame = probe_frame(mac, "10.99.0.7")
+    assert len(frame) == 60 and frame[:6] == b'\xff' * 6
+    # a probe asks for the address from 0.0.0.0, so no host updates its ARP cache
+    assert parse_arp(frame) == (ARP_REQUEST, mac, "0.0.0.0", "10.99.0.7")
+
+    reply = arp_frame(ARP_REPLY, bytes.fromhex("02aabbccddee"), "10.99.0.7", mac, "0.0.0.0", dst_mac=mac)
+    assert parse_arp(reply)[:3] == (ARP_REPLY, bytes.fromhex("02aabbccddee"), "10.99.0.7")
+    assert parse_arp(frame[:20]) is None
+    assert parse_arp(frame[:12] + b'\x08\x00' + frame[14:]) is None # not ARP
+    print("Test successful!")
+
+
+def test_probe_many_concurrently():
+    print("--- Testing that many addresses are probed in one wait ---")
+    if not _packet_sockets_available():
+        print("AF_PACKET sockets are not available here; skipped.")
+        return
+    leases = [(f"10.99.0.{host}", f"0a:0b:0c:0d:0f:{host:02x}") for host in range(1, 21)]
+    with ARPResponder("lo", IN_USE) as responder, _prober() as prober:
+        started = time.monotonic()
+        conflicts = prober.probe_many(leases)
+        elapsed = time.monotonic() - started
+    print(f"Probed {len(leases)} addresses in {elapsed:.2f}s")
+    assert conflicts["10.99.0.2"] == IN_USE["10.99.0.2"]
+    assert [ip for ip, mac in conflicts.items() if mac] == ["10.99.0.2"]
+    assert responder.answered >= 1
+    # 20 addresses cost one probe duration (0.4 s), not 20
+    assert elapsed < prober.duration + 0.5
+    print("Test successful!")
+
+
+def test_bulk_declines_address_in_use():
+    print("--- Testing DECLINE and retry in a bulk run ---")
+    if not _packet_sockets_available():
+        print("AF_PACKET sockets are not available here; skipped.")
+        return
+    macs = [f"0A:0B:0C:0D:10:{i:02X}" for i in range(5)]
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server, \
+            ARPResponder("lo", IN_USE), _prober() as prober:
+        transport = _transport()
+        try:
+            result = acquire_many(macs, concurrency=5, transport=transport, timeout=5, prober=prober,
+                                  decline_delay=0.1)
+        finally:
+            transport.close()
+        print(result.to_dict())
+        assert len(result.leases) == 5 and not result.failed
+        assert "10.99.0.2" not in [lease.ip for lease in result.leases]
+        assert result.declines == 1 and server.stats["declines"] == 1
+        assert server.profiles[0].declined == ["10.99.0.2"]
+        # the five probes overlap: one serial 0.4 s wait per lease would take 2 s
+        assert result.elapsed < 1.5
+
+    # with no retries left the MAC fails as DECLINED
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server, \
+            ARPResponder("lo", IN_USE), _prober() as prober:
+        transport = _transport()
+        outcomes = []
+        try:
+            result = acquire_many(macs[:2], concurrency=1, transport=transport, timeout=5, prober=prober,
+                                  max_declines=0, on_failure=lambda mac, reason, outcome: outcomes.append(outcome))
+        finally:
+            transport.close()
+        assert [lease.ip for lease in result.leases] == ["10.99.0.1"]
+        assert list(result.failed) == [macs[1]] and outcomes == [DECLINED]
+    print("Test successful!")
+
+
+def test_client_declines_and_retries():
+    print("--- Testing DECLINE and retry in a single client ---")
+    if not _packet_sockets_available():
+        print("AF_PACKET sockets are not available here; skipped.")
+        return
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server, \
+            ARPResponder("lo", IN_USE), _prober() as prober:
+        transport = _transport()
+        try:
+            first = DHCPClient("0A:0B:0C:0D:11:01", transport=transport, timeout=5, prober=prober)
+            assert first.request_ip_address() == "10.99.0.1"
+
+            events = []
+            client = DHCPClient("0A:0B:0C:0D:11:02", transport=transport, timeout=5, prober=prober,
+                                decline_delay=0.1)
+            client.add_listener(lambda event: events.append(event.type))
+            assert client.request_ip_address() == "10.99.0.3"
+            assert client.declines == 1 and DECLINE_SENT in events
+            assert server.stats["declines"] == 1 and server.stats["discovers"] == 3
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def run_tests():
+    test_arp_frames()
+    test_probe_many_concurrently()
+    test_bulk_declines_address_in_use()
+    test_client_declines_and_retries()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal (as root, for AF_PACKET).
+2.  Run the script with the following command:
+
+    python -m tests.test_arp_probe
+
+"""
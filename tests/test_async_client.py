@@ -0,0 +1,177 @@
+# test_async_client.py
+
+import asyncio
+import itertools
+import socket
+import time
+from dhcp_logic.async_client import AsyncDHCPClient
+from dhcp_logic.backoff import retransmit_delays
+from dhcp_logic.dhcp_transport import RECEIVE_BUFFER_SIZE, TransportConfig
+from dhcp_logic.dhcp_message import (DHCPMessage, BOOTREPLY, DHCPDISCOVER, DHCPOFFER,
+                                     DHCPREQUEST, DHCPACK, DHCPRELEASE)
+
+CLIENT_PORT = 16869
+SERVER_PORT = 16768
+
+
+class _Responder(asyncio.DatagramProtocol):
+    """Answers every DISCOVER with an OFFER and every REQUEST with an ACK, one address per MAC."""
+
+    def __init__(self, ignore_discovers: int = 0):
+        self.leases = {}
+        self.released = []
+        self.received = [] # (arrival time, message) of every packet
+        self.ignore_discovers = ignore_discovers # DISCOVERs left unanswered, to force retransmissions
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+
+    def datagram_received(self, data, addr):
+        msg = DHCPMessage.unpack(data)
+        msg_type = msg.options.get(53)
+        self.received.append((time.monotonic(), msg))
+        if msg_type == DHCPDISCOVER and self.ignore_discovers:
+            self.ignore_discovers -= 1
+            return
+        if msg_type == DHCPRELEASE:
+            self.released.append(msg.ciaddr)
+            return
+
+        ip = self.leases.setdefault(msg.chaddr_str, f"10.1.{len(self.leases) // 250}.{len(self.leases) % 250 + 1}")
+        reply = DHCPMessage(msg.chaddr_str)
+        reply.op = BOOTREPLY
+        reply.xid = msg.xid
+        reply.yiaddr = ip
+        reply.options[54] = "127.0.0.1"
+        if msg_type == DHCPDISCOVER:
+            reply.options[53] = DHCPOFFER
+        elif msg_type == DHCPREQUEST:
+            reply.options[53] = DHCPACK
+        else:
+            return
+        self.transport.sendto(reply.pack(), ("127.0.0.1", CLIENT_PORT))
+
+
+async def _run_with_responder(coro_factory, ignore_discovers: int = 0, backoff=retransmit_delays, **settings):
+    loop = asyncio.get_running_loop()
+    server_transport, responder = await loop.create_datagram_endpoint(
+        lambda: _Responder(ignore_discovers), local_addr=("127.0.0.1", SERVER_PORT))
+    config = TransportConfig(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1",
+                             **settings)
+    try:
+        async with AsyncDHCPClient(timeout=5, config=config, backoff=backoff) as client:
+            return await coro_factory(client), responder
+    finally:
+        server_transport.close()
+
+
+def test_concurrent_acquire():
+    print("--- Testing 500 concurrent D-O-R-A exchanges on one event loop ---")
+    macs = [f"02:00:00:00:{i // 256:02x}:{i % 256:02x}" for i in range(500)]
+
+    async def scenario(client):
+        leases = await asyncio.gather(*(client.acquire(mac) for mac in macs))
+        assert client.pending() == 0
+        return leases
+
+    leases, responder = asyncio.run(_run_with_responder(scenario))
+    assert all(lease is not None for lease in leases)
+    assert len({lease.ip for lease in leases}) == len(macs)
+    for mac, lease in zip(macs, leases):
+        assert lease.mac_addr_str == mac
+        assert lease.ip == responder.leases[mac.lower()]
+    print("Test successful: every MAC received its own lease.")
+
+
+def test_renew_and_release():
+    print("--- Testing renew and release ---")
+
+    async def scenario(client):
+        lease = await client.acquire("02:00:00:00:10:01")
+        renewed = await client.renew(lease)
+        await client.release(renewed)
+        await asyncio.sleep(0.1)
+        return lease, renewed
+
+    (lease, renewed), responder = asyncio.run(_run_with_responder(scenario))
+    assert renewed is not None and renewed.ip == lease.ip
+    assert responder.released == [lease.ip]
+    print("Test successful: lease renewed and released.")
+
+
+def test_acquire_many_limits_concurrency():
+    print("--- Testing acquire_many with a concurrency limit ---")
+    macs = [f"02:00:00:01:{i // 256:02x}:{i % 256:02x}" for i in range(200)]
+    peak = []
+
+    async def scenario(client):
+        async def sample():
+            while True:
+                peak.append(client.pending())
+                await asyncio.sleep(0)
+
+        sampler = asyncio.ensure_future(sample())
+        leases = await client.acquire_many(macs, concurrency=16)
+        sampler.cancel()
+        await client.release_many(leases)
+        await asyncio.sleep(0.1)
+        return leases
+
+    leases, responder = asyncio.run(_run_with_responder(scenario))
+    assert [lease.mac_addr_str for lease in leases] == macs
+    assert max(peak) <= 16
+    assert sorted(responder.released) == sorted(lease.ip for lease in leases)
+    print("Test successful: at most 16 exchanges were in flight.")
+
+
+def test_paced_sends_and_secs():
+    print("--- Testing that the async engine is paced and fills in secs ---")
+    macs = [f"02:00:00:02:00:{i:02x}" for i in range(30)]
+
+    async def scenario(client):
+        leases = await client.acquire_many(macs)
+        return leases, client.scheduler.to_dict()
+
+    (leases, stats), responder = asyncio.run(_run_with_responder(scenario, transmit_rate=100))
+    assert all(leases) and stats['paced'] and stats['sent'] == 60
+    # a burst of 5, then 55 packets at 100/s
+    arrivals = [at for at, _ in responder.received]
+    assert arrivals[-1] - arrivals[0] > 0.45
+
+    # the retransmitted DISCOVER, 1.2 s in, says so, and the REQUEST repeats its value
+    async def retransmitted(client):
+        return await client.acquire("02:00:00:02:01:01")
+
+    lease, responder = asyncio.run(_run_with_responder(retransmitted, ignore_discovers=1, transmit_rate=100,
+                                                       backoff=lambda: itertools.repeat(1.2)))
+    assert lease is not None
+    assert [(msg.options.get(53), msg.secs) for _, msg in responder.received] == \
+        [(DHCPDISCOVER, 0), (DHCPDISCOVER, 1), (DHCPREQUEST, 1)]
+    print("Test successful!")
+
+
+def run_tests():
+    test_concurrent_acquire()
+    test_renew_and_release()
+    test_acquire_many_limits_concurrency()
+    test_paced_sends_and_secs()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_async_client
+
+The test runs an in-process responder on loopback ports, so no sudo or DHCP server is needed.
+
+"""
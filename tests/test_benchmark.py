@@ -0,0 +1,51 @@
+# test_benchmark.py
+
+from dhcp_logic import benchmark
+
+
+def test_benchmark_report():
+    print("--- Testing a small benchmark run ---")
+    report = benchmark.run(count=200, concurrency=32, codec_iterations=2000)
+    print(report)
+    assert report["leases"] == 200 and report["failed"] == 0
+    # loose floors that still catch an order-of-magnitude regression
+    assert report["pack_per_sec"] > 10000 and report["unpack_per_sec"] > 10000
+    assert report["leases_per_sec"] > 100
+    assert report["p50_time_to_lease"] <= report["p99_time_to_lease"] < 2
+    assert report["bytes_per_transaction"] > 0
+    print("Test successful!")
+
+
+def test_regression_check():
+    print("--- Testing the baseline comparison ---")
+    baseline = dict(leases_per_sec=1000, p99_time_to_lease=0.1, bytes_per_transaction=4000, leases=1000)
+    assert benchmark.regressions(dict(leases_per_sec=900, p99_time_to_lease=0.11, bytes_per_transaction=4100), baseline) == []
+    problems = benchmark.regressions(dict(leases_per_sec=500, p99_time_to_lease=0.5, bytes_per_transaction=4000), baseline)
+    assert [problem.split(":")[0] for problem in problems] == ["leases_per_sec", "p99_time_to_lease"]
+    print("Test successful!")
+
+
+def run_tests():
+    test_benchmark_report()
+    test_regression_check()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_benchmark
+
+For the full report, or to compare against a saved baseline:
+
+    python -m dhcp_logic.benchmark --leases 2000 --concurrency 128
+    python -m dhcp_logic.benchmark --json > baseline.json
+    python -m dhcp_logic.benchmark --baseline baseline.json
+
+"""
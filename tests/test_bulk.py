@@ -0,0 +1,148 @@
+# test_bulk.py
+
+from dhcp_logic.bulk import acquire_many, release_many
+from dhcp_logic.dhcp_message import DHCPMessage, BOOTREPLY, DHCPDISCOVER, DHCPOFFER, DHCPACK, DHCPNAK, DHCPRELEASE
+from dhcp_logic.lease import Lease
+
+
+class _QueuedTransport:
+    """Stands in for DHCPTransport: answers every broadcast straight into the registered inbox."""
+
+    def __init__(self, nak_macs=(), silent_macs=(), malformed=None):
+        self.nak_macs = set(nak_macs)
+        self.silent_macs = set(silent_macs)
+        self.malformed = malformed or {} # mac -> DHCPOFFER (sent without option 54) or DHCPACK (bad option 51)
+        self.inboxes = {}
+        self.peak_registered = 0
+        self.unicasts = []
+        self._next_xid = 1
+
+    def register(self, chaddr, xid=None, inbox=None):
+        xid, self._next_xid = self._next_xid, self._next_xid + 1
+        self.inboxes[xid] = inbox
+        self.peak_registered = max(self.peak_registered, len(self.inboxes))
+        return xid, inbox
+
+    def unregister(self, xid):
+        self.inboxes.pop(xid, None)
+
+    def broadcast(self, packet):
+        request = DHCPMessage.unpack(packet)
+        if request.chaddr_str in self.silent_macs:
+            return
+        reply = DHCPMessage(request.chaddr_str)
+        reply.op = BOOTREPLY
+        reply.xid = request.xid
+        reply.yiaddr = f"10.2.{request.xid // 250}.{request.xid % 250 + 1}"
+        reply.options[54] = "10.2.0.254"
+        reply.options[51] = 3600
+        if request.options[53] == DHCPDISCOVER:
+            reply.options[53] = DHCPOFFER
+        elif request.chaddr_str in self.nak_macs:
+            reply.options[53] = DHCPNAK
+        else:
+            reply.options[53] = DHCPACK
+        broken = self.malformed.get(request.chaddr_str) == reply.options[53]
+        if broken and reply.options[53] == DHCPOFFER:
+            del reply.options[54]
+        packet = reply.pack()
+        if broken and reply.options[53] == DHCPACK:
+            # the lease time cut to 3 bytes
+            packet = packet.replace(b'\x33\x04\x00\x00\x0e\x10', b'\x33\x03\x00\x0e\x10')
+        self.inboxes[request.xid].put((DHCPMessage.unpack(packet), ("10.2.0.254", 67)))
+
+    def unicast(self, packet, server_ip):
+        self.unicasts.append((DHCPMessage.unpack(packet), server_ip))
+
+
+def test_acquire_many_within_window():
+    print("--- Testing pipelined acquisition with a concurrency window ---")
+    macs = [f"02:00:00:02:{i // 256:02x}:{i % 256:02x}" for i in range(1000)]
+    transport = _QueuedTransport()
+    acquired = []
+    result = acquire_many(macs, concurrency=32, transport=transport, timeout=5, on_lease=acquired.append)
+
+    assert len(result.leases) == 1000 and not result.failed
+    assert acquired == result.leases
+    assert transport.peak_registered <= 32
+    assert not transport.inboxes
+    assert {lease.mac_addr_str for lease in result.leases} == set(macs)
+    assert all(lease.lease_time == 3600 for lease in result.leases)
+    print(f"Test successful: 1000 leases in {result.elapsed:.3f}s.")
+
+
+def test_failures_are_reported_per_mac():
+    print("--- Testing NAK, timeout and bad MAC reporting ---")
+    transport = _QueuedTransport(nak_macs={"02:00:00:03:00:01"}, silent_macs={"02:00:00:03:00:02"})
+    macs = ["02:00:00:03:00:00", "02:00:00:03:00:01", "02:00:00:03:00:02", "not-a-mac"]
+    result = acquire_many(macs, concurrency=4, transport=transport, timeout=0.2)
+
+    assert [lease.mac_addr_str for lease in result.leases] == ["02:00:00:03:00:00"]
+    assert "NAK" in result.failed["02:00:00:03:00:01"]
+    assert "OFFER" in result.failed["02:00:00:03:00:02"]
+    assert result.failed["not-a-mac"] == "Invalid MAC address."
+    # a window of 0 is refused rather than spinning forever
+    for concurrency in (0, -1):
+        try:
+            acquire_many(macs, concurrency=concurrency, transport=transport)
+            assert False, "concurrency < 1 was accepted"
+        except ValueError:
+            pass
+    summary = result.to_dict()
+    assert summary["requested"] == 4 and summary["acquired"] == 1 and summary["failed"] == 3
+    assert not transport.inboxes
+    print("Test successful!")
+
+
+def test_malformed_replies_fail_their_mac_only():
+    print("--- Testing malformed OFFERs and ACKs in a bulk run ---")
+    transport = _QueuedTransport(malformed={"02:00:00:05:00:01": DHCPOFFER, "02:00:00:05:00:02": DHCPACK})
+    macs = [f"02:00:00:05:00:{i:02x}" for i in range(4)]
+    result = acquire_many(macs, concurrency=4, transport=transport, timeout=0.2)
+
+    # each broken reply is dropped like a lost one, so only its own exchange times out
+    assert [lease.mac_addr_str for lease in result.leases] == ["02:00:00:05:00:00", "02:00:00:05:00:03"]
+    assert "OFFER" in result.failed["02:00:00:05:00:01"]
+    assert "ACK" in result.failed["02:00:00:05:00:02"]
+    assert not transport.inboxes
+    print("Test successful!")
+
+
+def test_release_many():
+    print("--- Testing bulk release ---")
+    transport = _QueuedTransport()
+    leases = [Lease(f"02:00:00:04:00:{i:02x}", f"10.2.1.{i}", "10.2.0.254") for i in range(1, 11)]
+    assert release_many(leases, transport=transport) == {}
+    assert [(msg.options[53], msg.ciaddr, server) for msg, server in transport.unicasts] == \
+        [(DHCPRELEASE, lease.ip, "10.2.0.254") for lease in leases]
+
+    # a bad MAC or address fails only its own release
+    transport = _QueuedTransport()
+    leases = [Lease("02:00:00:04:01:01", "10.2.1.1", "10.2.0.254"), Lease("not-a-mac", "10.2.1.2", "10.2.0.254"),
+              Lease("02:00:00:04:01:03", "10.2.1.300", "10.2.0.254"), Lease("02:00:00:04:01:04", "10.2.1.4", "10.2.0.254")]
+    errors = release_many(leases, transport=transport)
+    assert sorted(errors) == ["02:00:00:04:01:03", "not-a-mac"]
+    assert [msg.ciaddr for msg, _ in transport.unicasts] == ["10.2.1.1", "10.2.1.4"]
+    print("Test successful!")
+
+
+def run_tests():
+    test_acquire_many_within_window()
+    test_failures_are_reported_per_mac()
+    test_malformed_replies_fail_their_mac_only()
+    test_release_many()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_bulk
+
+"""
@@ -1,3 +1,4 @@
+import logging
 from dhcp_logic.dhcp_client import DHCPClient
 
 def test_socket_creation():
@@ -52,6 +53,8 @@ def run_tests():
     
 
 if __name__ == "__main__":
+    # show the client's step-by-step log
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     run_tests()
 
 # Make sure you are running this test with sudo privilleges as the it will be required to bind port
@@ -1,7 +1,7 @@
 # test_dhcp_message.py
 
 # Import necessary components from our dhcp_logic package
-from dhcp_logic.dhcp_message import DHCPMessage, DHCPDISCOVER, BOOTREQUEST
+from dhcp_logic.dhcp_message import DHCPMessage, DHCPDISCOVER, DHCPOFFER, BOOTREQUEST, HEADER_SIZE
 
 def run_test():
     """
@@ -50,8 +50,75 @@ def run_test():
     print("--- Test Finished ---")
 
 
+def test_pack_into_reusable_buffer():
+    """pack_into must write exactly what pack() returns, at any offset of a reused buffer."""
+    print("--- Testing pack_into on a preallocated buffer ---")
+    message = DHCPMessage(mac_addr_str="0A:0B:0C:0D:0E:0F")
+    message.options[53] = DHCPOFFER
+    message.options[54] = "192.168.1.1"
+    expected = message.pack()
+
+    buffer = bytearray(1500)
+    written = message.pack_into(buffer)
+    assert written == len(expected)
+    assert bytes(buffer[:written]) == expected
+
+    written = message.pack_into(memoryview(buffer), 100)
+    assert bytes(buffer[100:100 + written]) == expected
+    assert len(buffer) == 1500, "pack_into must never resize the buffer"
+
+    try:
+        message.pack_into(bytearray(HEADER_SIZE))
+        assert False, "a buffer without room for the options must be rejected"
+    except ValueError:
+        pass
+    print("Test successful!")
+
+
+def test_unpack_from_memoryview():
+    """unpack_from reads a datagram out of a larger receive buffer without slicing it first."""
+    print("--- Testing unpack_from on a memoryview ---")
+    message = DHCPMessage(mac_addr_str="0A:0B:0C:0D:0E:0F")
+    message.yiaddr = "192.168.1.50"
+    message.options[53] = DHCPOFFER
+    message.options[54] = "192.168.1.1"
+    packed = message.pack()
+
+    # stale bytes after the datagram must not be parsed as options
+    buffer = bytearray(b"\x01" * 1500)
+    buffer[20:20 + len(packed)] = packed
+    unpacked = DHCPMessage.unpack_from(memoryview(buffer), 20, len(packed))
+
+    assert unpacked.xid == message.xid
+    assert unpacked.chaddr_str == "0a:0b:0c:0d:0e:0f"
+    assert unpacked.yiaddr == "192.168.1.50"
+    assert unpacked.options == {53: DHCPOFFER, 54: "192.168.1.1"}
+    print("Test successful!")
+
+
+def test_compact_representation():
+    """Messages have no __dict__, keep addresses as ints and share empty sname/file buffers."""
+    print("--- Testing the compact message layout ---")
+    message = DHCPMessage(mac_addr_str="0A:0B:0C:0D:0E:0F")
+    assert not hasattr(message, "__dict__")
+
+    message.yiaddr = "192.168.1.50"
+    assert message.yiaddr_int == 0xC0A80132
+    message.giaddr = 0x0A000001
+    assert message.giaddr == "10.0.0.1"
+
+    unpacked = DHCPMessage.unpack(message.pack())
+    assert (unpacked.yiaddr_int, unpacked.giaddr) == (0xC0A80132, "10.0.0.1")
+    assert unpacked.sname is message.sname and unpacked.file is message.file
+    assert unpacked.sname is DHCPMessage("00:00:00:00:00:01").sname
+    print("Test successful!")
+
+
 if __name__ == "__main__":
     run_test()
+    test_pack_into_reusable_buffer()
+    test_unpack_from_memoryview()
+    test_compact_representation()
 """
 
 Run Test:
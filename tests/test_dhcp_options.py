@@ -0,0 +1,120 @@
+# test_dhcp_options.py
+
+from dhcp_logic.dhcp_message import DHCPMessage, DHCPACK, BOOTREPLY
+from dhcp_logic.dhcp_options import (DHCPOptions, SUBNET_MASK, ROUTER, DNS_SERVERS, HOST_NAME,
+                                     DOMAIN_NAME, LEASE_TIME, OPTION_OVERLOAD, MESSAGE_TYPE,
+                                     SERVER_ID, RENEWAL_TIME, REBINDING_TIME, CLIENT_ID,
+                                     OVERLOAD_BOTH)
+
+
+def _ack_with_common_options() -> DHCPMessage:
+    ack = DHCPMessage("0A:0B:0C:0D:0E:0F")
+    ack.op = BOOTREPLY
+    ack.options[MESSAGE_TYPE] = DHCPACK
+    ack.options[SERVER_ID] = "192.168.1.1"
+    ack.options[SUBNET_MASK] = "255.255.255.0"
+    ack.options[ROUTER] = ["192.168.1.1", "192.168.1.2"]
+    ack.options[DNS_SERVERS] = ["8.8.8.8", "1.1.1.1"]
+    ack.options[LEASE_TIME] = 86400
+    ack.options[RENEWAL_TIME] = 43200
+    ack.options[REBINDING_TIME] = 75600
+    ack.options[DOMAIN_NAME] = "example.lan"
+    ack.options[HOST_NAME] = "client-1"
+    ack.options[CLIENT_ID] = b"\x01\x0a\x0b\x0c\x0d\x0e\x0f"
+    return ack
+
+
+def test_rfc2132_options_round_trip():
+    print("--- Testing the option codec registry ---")
+    ack = _ack_with_common_options()
+    unpacked = DHCPMessage.unpack(ack.pack())
+
+    assert unpacked.options[MESSAGE_TYPE] == DHCPACK
+    assert unpacked.options[SUBNET_MASK] == "255.255.255.0"
+    assert unpacked.options[ROUTER] == ["192.168.1.1", "192.168.1.2"]
+    assert unpacked.options[DNS_SERVERS] == ["8.8.8.8", "1.1.1.1"]
+    assert unpacked.options[LEASE_TIME] == 86400
+    assert unpacked.options[RENEWAL_TIME] == 43200
+    assert unpacked.options[REBINDING_TIME] == 75600
+    assert unpacked.options[DOMAIN_NAME] == "example.lan"
+    assert unpacked.options[HOST_NAME] == "client-1"
+    assert unpacked.options[CLIENT_ID] == b"\x01\x0a\x0b\x0c\x0d\x0e\x0f"
+    # unknown codes are carried as raw bytes
+    assert DHCPMessage.unpack(_with_raw_option(ack, 224, b"\xde\xad")).options[224] == b"\xde\xad"
+    print("Test successful!")
+
+
+def _with_raw_option(message: DHCPMessage, code: int, value: bytes) -> bytes:
+    message.options[code] = value
+    return message.pack()
+
+
+def test_options_are_decoded_lazily():
+    print("--- Testing lazy option decoding ---")
+    unpacked = DHCPMessage.unpack(_ack_with_common_options().pack())
+
+    assert len(unpacked.options) == 11
+    assert unpacked.options._values == {}, "nothing should be decoded by unpack()"
+    assert unpacked.options.get(MESSAGE_TYPE) == DHCPACK
+    assert list(unpacked.options._values) == [MESSAGE_TYPE]
+
+    # options that were never read are re-emitted byte for byte
+    assert DHCPMessage.unpack(unpacked.pack()).options == unpacked.options
+    print("Test successful!")
+
+
+def test_option_overload_and_long_options():
+    print("--- Testing option 52 overload and options longer than 255 bytes ---")
+    message = DHCPMessage("0A:0B:0C:0D:0E:0F")
+    message.options[MESSAGE_TYPE] = DHCPACK
+    message.options[OPTION_OVERLOAD] = OVERLOAD_BOTH
+    # options hidden in the file and sname fields
+    message.file = bytes((SERVER_ID, 4, 10, 0, 0, 1, 255)).ljust(128, b"\x00")
+    message.sname = bytes((DOMAIN_NAME, 3)).ljust(5, b"l") + b"\xff"
+    message.sname = message.sname.ljust(64, b"\x00")
+    message.options[CLIENT_ID] = bytes(range(256)) * 2
+
+    unpacked = DHCPMessage.unpack(message.pack())
+    assert unpacked.options[SERVER_ID] == "10.0.0.1"
+    assert unpacked.options[DOMAIN_NAME] == "lll"
+    assert unpacked.options[CLIENT_ID] == bytes(range(256)) * 2
+
+    # a received DNS list split over two option 6 entries is re-emitted untouched, without its codec
+    servers = bytes(range(1, 256)) + bytes(range(8))
+    buffer = bytes([DNS_SERVERS, 255]) + servers[:255] + bytes([DNS_SERVERS, 8]) + servers[255:] + b"\xff"
+    received = DHCPOptions.from_buffer(buffer)
+    packed = received.pack()
+    assert packed[:2] == bytes([DNS_SERVERS, 255]) and packed[257:259] == bytes([DNS_SERVERS, 8])
+    assert DHCPOptions.from_buffer(packed).raw(DNS_SERVERS) == servers
+    print("Test successful!")
+
+
+def test_truncated_options_are_ignored():
+    print("--- Testing truncated option data ---")
+    # message type, then a server id that claims 4 bytes but only has 2
+    options = DHCPOptions.from_buffer(bytes((MESSAGE_TYPE, 1, DHCPACK, SERVER_ID, 4, 10, 0)))
+    assert options.get(MESSAGE_TYPE) == DHCPACK
+    assert SERVER_ID not in options
+    print("Test successful!")
+
+
+def run_tests():
+    test_rfc2132_options_round_trip()
+    test_options_are_decoded_lazily()
+    test_option_overload_and_long_options()
+    test_truncated_options_are_ignored()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_dhcp_options
+
+"""
@@ -0,0 +1,184 @@
+# test_dhcp_transport.py
+
+import socket
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_message import DHCPMessage, DHCPOFFER, BOOTREPLY
+from dhcp_logic.dhcp_transport import DHCPTransport, TransportConfig
+
+CLIENT_PORT = 16868
+SERVER_PORT = 16767
+
+
+def _reply_for(mac: str, xid: int, offered_ip: str) -> bytes:
+    """Builds a DHCPOFFER the way a server would answer a DISCOVER."""
+    reply = DHCPMessage(mac)
+    reply.op = BOOTREPLY
+    reply.xid = xid
+    reply.yiaddr = offered_ip
+    reply.options[53] = DHCPOFFER
+    reply.options[54] = "127.0.0.1"
+    return reply.pack()
+
+
+def test_replies_are_routed_by_xid():
+    print("--- Testing xid multiplexing on a shared transport ---")
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT)
+    transport.open()
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        mac_a = "AA:BB:CC:00:00:01"
+        mac_b = "AA:BB:CC:00:00:02"
+        xid_a, inbox_a = transport.register(DHCPMessage(mac_a).chaddr)
+        xid_b, inbox_b = transport.register(DHCPMessage(mac_b).chaddr)
+        assert xid_a != xid_b
+        assert transport.pending() == 2
+
+        # replies arrive out of order and each must land in its own inbox
+        server.sendto(_reply_for(mac_b, xid_b, "10.0.0.2"), ("127.0.0.1", CLIENT_PORT))
+        server.sendto(_reply_for(mac_a, xid_a, "10.0.0.1"), ("127.0.0.1", CLIENT_PORT))
+
+        msg_a, _ = inbox_a.get(timeout=2)
+        msg_b, _ = inbox_b.get(timeout=2)
+        assert msg_a.yiaddr == "10.0.0.1"
+        assert msg_b.yiaddr == "10.0.0.2"
+        assert inbox_a.empty() and inbox_b.empty()
+        print("Test successful: both transactions received their own OFFER.")
+    finally:
+        server.close()
+        transport.close()
+
+
+def test_foreign_replies_are_dropped():
+    print("--- Testing that foreign xids and chaddrs are ignored ---")
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT)
+    transport.open()
+    try:
+        mac = "AA:BB:CC:00:00:03"
+        xid, inbox = transport.register(DHCPMessage(mac).chaddr)
+
+        unknown = DHCPMessage.unpack(_reply_for(mac, (xid + 1) & 0xFFFFFFFF, "10.0.0.3"))
+        assert not transport._dispatch(unknown, ("127.0.0.1", SERVER_PORT))
+
+        wrong_mac = DHCPMessage.unpack(_reply_for("AA:BB:CC:00:00:99", xid, "10.0.0.3"))
+        assert not transport._dispatch(wrong_mac, ("127.0.0.1", SERVER_PORT))
+        assert inbox.empty()
+
+        transport.unregister(xid)
+        assert transport.pending() == 0
+        print("Test successful: only matching replies were delivered.")
+    finally:
+        transport.close()
+
+
+def test_bind_errors_are_returned():
+    print("--- Testing that a taken port is reported, not fatal ---")
+    owner = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT)
+    owner.open()
+    try:
+        try:
+            DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT).open()
+            assert False, "second bind should fail"
+        except OSError:
+            pass
+
+        client = DHCPClient("AA:BB:CC:00:00:04", transport=DHCPTransport(client_port=CLIENT_PORT))
+        assert client.state.startswith(f"ERROR: Could not bind to port {CLIENT_PORT}.")
+        assert client.socket is None and client.request_ip_address() is None
+    finally:
+        owner.close()
+    print("Test successful: the bind error came back in the client state.")
+
+
+def test_reuse_port_and_source_address():
+    print("--- Testing SO_REUSEPORT and a bound source address ---")
+    config = TransportConfig(client_port=CLIENT_PORT, server_port=SERVER_PORT,
+                             source_address="127.0.0.1", reuse_port=True)
+    first, second = DHCPTransport(config), DHCPTransport(config)
+    first.open()
+    second.open()
+    try:
+        assert first.socket.getsockname() == ("127.0.0.1", CLIENT_PORT)
+        assert second.socket.getsockname() == ("127.0.0.1", CLIENT_PORT)
+    finally:
+        first.close()
+        second.close()
+    print("Test successful: two transports share the port.")
+
+
+def test_interface_binding():
+    print("--- Testing SO_BINDTODEVICE ---")
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, interface="lo")
+    try:
+        transport.open()
+    except PermissionError:
+        print("Skipped: binding to an interface needs CAP_NET_RAW.")
+        return
+    try:
+        assert transport.socket.getsockopt(socket.SOL_SOCKET, 25, 16).rstrip(b"\0") == b"lo"
+    finally:
+        transport.close()
+
+    try:
+        DHCPTransport(client_port=CLIENT_PORT, interface="no-such-nic0").open()
+        assert False, "binding to a missing interface should fail"
+    except OSError:
+        pass
+    print("Test successful!")
+
+
+def test_config_from_env():
+    print("--- Testing TransportConfig.from_env ---")
+    config = TransportConfig.from_env(dict(DHCP_CLIENT_PORT="1068", DHCP_SERVER_PORT="1067",
+                                           DHCP_INTERFACE="eth1", DHCP_REUSE_PORT="true"))
+    assert (config.client_port, config.server_port, config.interface, config.reuse_port) == (1068, 1067, "eth1", True)
+    assert config.broadcast_address == "<broadcast>" and config.source_address == ""
+    print("Test successful!")
+
+
+def test_shared_if_open_never_binds():
+    print("--- Testing a look at the shared transport ---")
+    previous = DHCPTransport.shared_config()
+    DHCPTransport.configure(TransportConfig(client_port=CLIENT_PORT, server_port=SERVER_PORT))
+    try:
+        if DHCPTransport._shared is not None:
+            DHCPTransport._shared.close()
+        # nothing is opened just to be looked at: the port is still free
+        assert DHCPTransport.shared_if_open() is None
+        other = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT)
+        other.open()
+        other.close()
+
+        shared = DHCPTransport.shared()
+        assert DHCPTransport.shared_if_open() is shared
+        shared.close()
+        assert DHCPTransport.shared_if_open() is None
+    finally:
+        DHCPTransport.configure(previous)
+    print("Test successful!")
+
+
+def run_tests():
+    test_replies_are_routed_by_xid()
+    test_foreign_replies_are_dropped()
+    test_bind_errors_are_returned()
+    test_reuse_port_and_source_address()
+    test_interface_binding()
+    test_config_from_env()
+    test_shared_if_open_never_binds()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_dhcp_transport
+
+This test uses unprivileged loopback ports, so it does not need sudo or a DHCP server on the LAN.
+
+"""
@@ -0,0 +1,116 @@
+# test_events.py
+
+import queue
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_message import DHCPMessage, BOOTREPLY, DHCPDISCOVER, DHCPOFFER, DHCPACK, DHCPNAK
+from dhcp_logic.events import (EventBroker, DHCPEvent, DISCOVER_SENT, OFFER_RECEIVED, REQUEST_SENT,
+                               ACK_RECEIVED, NAK_RECEIVED, FAILED)
+
+
+class _AnsweringTransport:
+    """Stands in for DHCPTransport and answers every broadcast straight into the client's inbox."""
+
+    def __init__(self, answer_request_with=DHCPACK):
+        self.socket = object()
+        self.answer_request_with = answer_request_with
+        self.inboxes = {}
+
+    def open(self):
+        pass
+
+    def register(self, chaddr, xid=None, inbox=None):
+        self.inboxes[0x1234] = queue.Queue()
+        return 0x1234, self.inboxes[0x1234]
+
+    def unregister(self, xid):
+        pass
+
+    def broadcast(self, packet):
+        request = DHCPMessage.unpack(packet)
+        reply = DHCPMessage(request.chaddr_str)
+        reply.op = BOOTREPLY
+        reply.xid = request.xid
+        reply.yiaddr = "10.0.0.7"
+        reply.options[54] = "10.0.0.1"
+        reply.options[53] = DHCPOFFER if request.options[53] == DHCPDISCOVER else self.answer_request_with
+        self.inboxes[request.xid].put((DHCPMessage.unpack(reply.pack()), ("10.0.0.1", 67)))
+
+
+def test_client_emits_state_transitions():
+    print("--- Testing DHCPClient events for a successful D-O-R-A ---")
+    events = []
+    client = DHCPClient("0A:0B:0C:0D:0E:0F", transport=_AnsweringTransport())
+    client.add_listener(events.append)
+    assert client.request_ip_address() == "10.0.0.7"
+
+    assert [event.type for event in events] == [DISCOVER_SENT, OFFER_RECEIVED, REQUEST_SENT, ACK_RECEIVED]
+    assert events[-1].terminal and events[-1].assigned_ip == "10.0.0.7"
+    assert events[-1].status == "SUCCESS" and events[-1].xid == 0x1234
+    print("Test successful!")
+
+
+def test_nak_ends_with_failed_event():
+    print("--- Testing DHCPClient events for a NAK ---")
+    events = []
+    client = DHCPClient("0A:0B:0C:0D:0E:0F", transport=_AnsweringTransport(answer_request_with=DHCPNAK))
+    client.add_listener(events.append)
+    assert client.request_ip_address() is None
+
+    assert [event.type for event in events][-2:] == [NAK_RECEIVED, FAILED]
+    assert client.state.startswith("FAILED")
+    print("Test successful!")
+
+
+def test_broker_fan_out():
+    print("--- Testing per-task and global subscriptions ---")
+    broker = EventBroker()
+    task_a = broker.subscribe("task-a")
+    everything = broker.subscribe()
+
+    broker.publish("task-a", DHCPEvent(DISCOVER_SENT, "0a:0b:0c:0d:0e:0f", 1, "Sending DISCOVER..."))
+    broker.publish("task-b", DHCPEvent(DISCOVER_SENT, "0a:0b:0c:0d:0e:10", 2, "Sending DISCOVER..."))
+
+    assert task_a.get(timeout=1).task_id == "task-a"
+    assert task_a.get(timeout=0) is None
+    assert [everything.get(timeout=1).task_id for _ in range(2)] == ["task-a", "task-b"]
+
+    # a late subscriber starts from the task's latest state
+    late = broker.subscribe("task-b")
+    assert late.get(timeout=1).xid == 2
+
+    for subscription in (task_a, everything, late):
+        subscription.close()
+    assert not broker._subscribers
+    print("Test successful!")
+
+
+def test_slow_subscriber_drops_oldest():
+    print("--- Testing bounded subscriber queues ---")
+    broker = EventBroker()
+    subscription = broker.subscribe("task-a")
+    for xid in range(1000):
+        broker.publish("task-a", DHCPEvent(DISCOVER_SENT, "0a:0b:0c:0d:0e:0f", xid, "Sending DISCOVER..."))
+    assert subscription.get(timeout=1).xid == 1000 - 256
+    print("Test successful!")
+
+
+def run_tests():
+    test_client_emits_state_transitions()
+    test_nak_ends_with_failed_event()
+    test_broker_fan_out()
+    test_slow_subscriber_drops_oldest()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_events
+
+"""
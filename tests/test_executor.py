@@ -0,0 +1,132 @@
+# test_executor.py
+
+import threading
+import time
+from dhcp_logic.executor import BoundedExecutor
+from dhcp_logic.interfaces import InterfaceCache
+
+
+def _settle(executor):
+    # done callbacks run just after result() returns
+    for _ in range(100):
+        if executor.in_flight() == 0:
+            return
+        time.sleep(0.01)
+
+
+def test_admission_control():
+    print("--- Testing admission control of the bounded executor ---")
+    executor = BoundedExecutor(max_workers=2, max_queued=3)
+    gate = threading.Event()
+    try:
+        futures = [executor.try_submit(gate.wait, 5) for _ in range(5)]
+        assert all(future is not None for future in futures)
+        assert executor.in_flight() == 5
+
+        # full: refused at once instead of queueing
+        assert executor.try_submit(gate.wait, 5) is None
+        assert executor.rejected == 1
+
+        gate.set()
+        for future in futures:
+            assert future.result(timeout=5) is True
+        _settle(executor)
+        # slots are handed back as tasks finish
+        assert executor.try_submit(lambda: 42).result(timeout=5) == 42
+        _settle(executor)
+        assert executor.in_flight() == 0
+    finally:
+        gate.set()
+        executor.shutdown()
+    print("Test successful!")
+
+
+def test_failed_tasks_free_their_slot():
+    print("--- Testing that failing tasks free their slot ---")
+    executor = BoundedExecutor(max_workers=1, max_queued=0)
+    try:
+        def boom():
+            raise OSError("bind failed")
+        future = executor.try_submit(boom)
+        assert isinstance(future.exception(timeout=5), OSError)
+        _settle(executor)
+        assert executor.try_submit(lambda: "ok").result(timeout=5) == "ok"
+    finally:
+        executor.shutdown()
+    print("Test successful!")
+
+
+def test_interface_cache():
+    print("--- Testing the interface cache ---")
+    now = [0.0]
+    answers = iter(["aa:bb:cc:dd:ee:01", "aa:bb:cc:dd:ee:02", "aa:bb:cc:dd:ee:03"])
+    cache = InterfaceCache(lambda: next(answers), ttl=60, watch=False, clock=lambda: now[0])
+
+    assert cache.get() == "aa:bb:cc:dd:ee:01"
+    # a burst of requests inside the TTL costs one lookup
+    for _ in range(1000):
+        assert cache.get() == "aa:bb:cc:dd:ee:01"
+    assert cache.loads == 1
+
+    now[0] = 61
+    assert cache.get() == "aa:bb:cc:dd:ee:02"
+    # a change notification forces a reload before the TTL is up
+    cache.invalidate()
+    assert cache.get() == "aa:bb:cc:dd:ee:03" and cache.loads == 3
+    print("Test successful!")
+
+
+def test_lookup_errors_are_not_cached():
+    print("--- Testing that lookup errors are retried ---")
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("default")
+        return "aa:bb:cc:dd:ee:ff"
+
+    cache = InterfaceCache(loader, watch=False)
+    try:
+        cache.get()
+        assert False, "the first lookup should fail"
+    except KeyError:
+        pass
+    assert cache.get() == "aa:bb:cc:dd:ee:ff"
+    print("Test successful!")
+
+
+def test_netlink_watch():
+    print("--- Testing the netlink watcher ---")
+    cache = InterfaceCache(lambda: "aa:bb:cc:dd:ee:ff")
+    try:
+        # netlink is Linux-only and may be blocked in containers; the TTL still applies then
+        print(f"Watching netlink: {cache.watching}")
+        assert cache.get() == "aa:bb:cc:dd:ee:ff"
+    finally:
+        cache.close()
+    assert not cache.watching
+    print("Test successful!")
+
+
+def run_tests():
+    test_admission_control()
+    test_failed_tasks_free_their_slot()
+    test_interface_cache()
+    test_lookup_errors_are_not_cached()
+    test_netlink_watch()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_executor
+
+"""
@@ -0,0 +1,171 @@
+# test_init_reboot.py
+
+import time
+from dhcp_logic.bulk import release_many
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_message import DHCPMessage, BOOTREPLY, DHCPREQUEST, DHCPACK
+from dhcp_logic.dhcp_transport import DHCPTransport
+from dhcp_logic.lease import Lease
+from dhcp_logic.lease_cache import LeaseCache
+from dhcp_logic.loopback_server import LoopbackDHCPServer, ServerProfile
+
+SERVER_PORT = 16802
+CLIENT_PORT = 16803
+
+
+class _MalformedRebootServer(LoopbackDHCPServer):
+    """Answers every INIT-REBOOT with an ACK whose server identifier (option 54) is 3 bytes long."""
+
+    def _handle(self, sock, msg: DHCPMessage, destination: tuple):
+        if msg.options.get(53) == DHCPREQUEST and 54 not in msg.options and not msg.ciaddr_int:
+            self.stats['requests'] += 1
+            reply = DHCPMessage(msg.chaddr_str)
+            reply.op = BOOTREPLY
+            reply.xid = msg.xid
+            reply.yiaddr = msg.options.get(50)
+            reply.options[53] = DHCPACK
+            reply.options[54] = "127.0.0.1"
+            sock.sendto(reply.pack().replace(b'\x36\x04\x7f\x00\x00\x01', b'\x36\x03\x7f\x00\x00'), destination)
+            return
+        super()._handle(sock, msg, destination)
+
+
+def _transport():
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+    transport.open()
+    return transport
+
+
+def test_lease_cache():
+    print("--- Testing the lease cache ---")
+    now = [1000.0]
+    cache = LeaseCache(max_size=2, clock=lambda: now[0])
+    cache.put(Lease("02:00:00:00:00:01", "10.0.0.1", "10.0.0.254", acquired_at=1000.0, lease_time=60))
+    cache.put(Lease("02:00:00:00:00:02", "10.0.0.2", "10.0.0.254", acquired_at=1000.0, lease_time=600))
+    assert cache.get("02:00:00:00:00:01").ip == "10.0.0.1"
+    # the least recently used MAC makes room
+    cache.put(Lease("02:00:00:00:00:03", "10.0.0.3", "10.0.0.254", acquired_at=1000.0))
+    assert cache.get("02:00:00:00:00:02") is None and len(cache) == 2
+    # expired leases are never handed out
+    now[0] = 1100.0
+    assert cache.get("02:00:00:00:00:01") is None
+    assert cache.get("02:00:00:00:00:03").ip == "10.0.0.3"
+    print("Test successful!")
+
+
+def test_init_reboot_skips_discover():
+    print("--- Testing INIT-REBOOT from a cached lease ---")
+    cache = LeaseCache()
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server:
+        transport = _transport()
+        try:
+            client = DHCPClient("0A:0B:0C:0D:0E:30", transport=transport, cache=cache)
+            first_ip = client.request_ip_address()
+            assert first_ip == "10.99.0.1" and server.stats["discovers"] == 1
+
+            # the same MAC asks again: two messages instead of four
+            events = []
+            client = DHCPClient("0A:0B:0C:0D:0E:30", transport=transport, cache=cache)
+            client.add_listener(lambda event: events.append(event.type))
+            assert client.request_ip_address() == first_ip
+            assert server.stats["discovers"] == 1 and server.stats["requests"] == 2 and server.stats["acks"] == 2
+            assert events == ["request_sent", "ack_received"]
+            assert client.lease.server_id == "127.0.0.1"
+
+            # a lease released meanwhile is still reserved for us by this server
+            assert release_many([client.lease], transport=transport) == {}
+            while server.stats["releases"] < 1:
+                time.sleep(0.01)
+            client = DHCPClient("0A:0B:0C:0D:0E:30", transport=transport, cache=cache)
+            assert client.request_ip_address() == first_ip
+            assert server.stats["discovers"] == 1
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def test_fallback_to_discover():
+    print("--- Testing the fallback to DISCOVER on NAK and on silence ---")
+    cache = LeaseCache()
+    profile = ServerProfile()
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=[profile]) as server:
+        transport = _transport()
+        try:
+            client = DHCPClient("0A:0B:0C:0D:0E:31", transport=transport, cache=cache)
+            assert client.request_ip_address() == "10.99.0.1"
+
+            # the server now has another address for us: NAK, then D-O-R-A
+            profile.leases["0a:0b:0c:0d:0e:31"] = "10.99.0.77"
+            client = DHCPClient("0A:0B:0C:0D:0E:31", transport=transport, cache=cache)
+            assert client.request_ip_address() == "10.99.0.77"
+            assert server.stats["naks"] == 1 and server.stats["discovers"] == 2
+            assert cache.get("0A:0B:0C:0D:0E:31").ip == "10.99.0.77"
+
+            # a server that never heard of us stays silent; DISCOVER after reboot_timeout
+            cache.put(Lease("0A:0B:0C:0D:0E:32", "10.50.0.9", "127.0.0.9"))
+            client = DHCPClient("0A:0B:0C:0D:0E:32", transport=transport, cache=cache, reboot_timeout=0.3)
+            assert client.request_ip_address() == "10.99.0.2"
+            assert server.stats["discovers"] == 3
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def test_malformed_reboot_reply():
+    print("--- Testing the fallback to DISCOVER on a malformed INIT-REBOOT reply ---")
+    cache = LeaseCache()
+    cache.put(Lease("0A:0B:0C:0D:0E:34", "10.50.0.9", "127.0.0.1"))
+    with _MalformedRebootServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server:
+        transport = _transport()
+        try:
+            client = DHCPClient("0A:0B:0C:0D:0E:34", transport=transport, cache=cache, reboot_timeout=2)
+            started = time.monotonic()
+            # the broken ACK counts as no reply: D-O-R-A right away, not after reboot_timeout
+            assert client.request_ip_address() == "10.99.0.1"
+            assert time.monotonic() - started < 1
+            assert server.stats["discovers"] == 1 and server.stats["requests"] == 2
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def test_inform():
+    print("--- Testing DHCPINFORM ---")
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server:
+        transport = _transport()
+        try:
+            client = DHCPClient("0A:0B:0C:0D:0E:33", transport=transport)
+            options = client.inform("192.168.7.20")
+            assert options[1] == "255.255.0.0" and options[3] == ["127.0.0.1"]
+            # configuration only: no lease is handed out
+            assert 51 not in options and client.assigned_ip is None
+            assert server.stats["informs"] == 1 and not server.profiles[0].leases
+
+            client = DHCPClient("0A:0B:0C:0D:0E:33", transport=transport)
+            assert client.inform("192.168.7.20", server_id="127.0.0.1")[54] == "127.0.0.1"
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def run_tests():
+    test_lease_cache()
+    test_init_reboot_skips_discover()
+    test_fallback_to_discover()
+    test_malformed_reboot_reply()
+    test_inform()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_init_reboot
+
+"""
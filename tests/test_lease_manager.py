@@ -0,0 +1,178 @@
+# test_lease_manager.py
+
+import queue
+import random
+from dhcp_logic.dhcp_message import DHCPMessage, BOOTREPLY, DHCPACK, DHCPNAK, DHCPRELEASE
+from dhcp_logic.lease import Lease, INIT, BOUND, RENEWING, REBINDING
+from dhcp_logic.lease_manager import LeaseManager
+from dhcp_logic.timer_wheel import TimerWheel
+
+
+class _RecordingTransport:
+    """Stands in for DHCPTransport: records what is sent and lets the test deliver replies."""
+
+    def __init__(self):
+        self.sent = [] # (kind, DHCPMessage, server_ip)
+        self.inboxes = {}
+
+    def register(self, chaddr, xid=None, inbox=None):
+        xid = xid if xid is not None else random.randint(0, 0xFFFFFFFF)
+        self.inboxes[xid] = inbox if inbox is not None else queue.Queue()
+        return xid, self.inboxes[xid]
+
+    def unregister(self, xid):
+        self.inboxes.pop(xid, None)
+
+    def unicast(self, packet, server_ip):
+        self.sent.append(("unicast", DHCPMessage.unpack(packet), server_ip))
+
+    def broadcast(self, packet):
+        self.sent.append(("broadcast", DHCPMessage.unpack(packet), None))
+
+    def reply(self, request: DHCPMessage, msg_type: int, lease_time: int = 1000, t1: int = None):
+        ack = DHCPMessage(request.chaddr_str)
+        ack.op = BOOTREPLY
+        ack.xid = request.xid
+        ack.yiaddr = request.ciaddr
+        ack.options[53] = msg_type
+        ack.options[54] = "10.0.0.1"
+        ack.options[51] = lease_time
+        packet = ack.pack()
+        if t1 is not None:
+            # option 58 cut to 3 bytes, which no codec accepts
+            ack.options[58] = t1
+            packet = ack.pack().replace(b'\x3a\x04' + t1.to_bytes(4, 'big'), b'\x3a\x03' + t1.to_bytes(3, 'big'))
+        self.inboxes[request.xid].put((DHCPMessage.unpack(packet), ("10.0.0.1", 67)))
+
+
+def _manager_at(now: float):
+    transport = _RecordingTransport()
+    manager = LeaseManager(transport=transport)
+    manager.wheel = TimerWheel(now=now)
+    return manager, transport
+
+
+def test_timer_wheel_fires_in_order():
+    print("--- Testing the hierarchical timer wheel ---")
+    wheel = TimerWheel(resolution=1.0, slot_bits=3, levels=3, now=0)
+    fired = []
+    expected = {}
+    rng = random.Random(7)
+    for i in range(2000):
+        when = rng.uniform(0, 1500) # beyond the 512-tick span of this small wheel
+        timer = wheel.schedule(when, lambda i=i: fired.append((i, wheel.now)))
+        expected[i] = when
+        if i % 10 == 0:
+            timer.cancel()
+            del expected[i]
+
+    now = 0
+    while now < 1600:
+        now += rng.uniform(0.5, 9)
+        wheel.advance(now)
+
+    assert sorted(i for i, _ in fired) == sorted(expected)
+    for i, fired_at in fired:
+        assert expected[i] <= fired_at < expected[i] + 10
+    assert len(wheel) == 0
+    print("Test successful!")
+
+
+def test_renew_at_t1():
+    print("--- Testing BOUND -> RENEWING -> BOUND ---")
+    manager, transport = _manager_at(1000)
+    manager.add(Lease("0a:0b:0c:0d:0e:0f", "10.0.0.50", "10.0.0.1", lease_time=1000, acquired_at=1000))
+    lease = manager.get("0a:0b:0c:0d:0e:0f")
+    assert lease.state == BOUND
+
+    manager.tick(1499)
+    assert lease.state == BOUND and not transport.sent
+    manager.tick(1500)
+    assert lease.state == RENEWING
+    kind, request, server_ip = transport.sent[-1]
+    assert (kind, server_ip) == ("unicast", "10.0.0.1")
+    assert request.ciaddr == "10.0.0.50" and 50 not in request.options and 54 not in request.options
+
+    transport.reply(request, DHCPACK, lease_time=1000)
+    manager.tick(1501)
+    assert lease.state == BOUND
+    # replies are handled before the wheel moves, so the new lease counts from 1500
+    assert lease.renew_at == 1500 + 500 and lease.expires_at == 1500 + 1000
+    print("Test successful!")
+
+
+def test_rebind_then_expire():
+    print("--- Testing RENEWING -> REBINDING -> INIT when the server is gone ---")
+    changes = []
+    manager, transport = _manager_at(0)
+    manager.on_change = lambda lease: changes.append(lease.state)
+    manager.add(Lease("0a:0b:0c:0d:0e:01", "10.0.0.51", "10.0.0.1", lease_time=1000, acquired_at=0))
+
+    for now in range(0, 1001, 5):
+        manager.tick(now)
+
+    assert changes == [BOUND, RENEWING, REBINDING, INIT]
+    kinds = [kind for kind, _, _ in transport.sent]
+    assert kinds[0] == "unicast" and kinds[-1] == "broadcast"
+    # retransmit after half the time left to T2, never sooner than 60 s: at 500, 687.5, 781.25 and 841.25
+    assert kinds.count("unicast") == 4
+    assert len(manager) == 0 and not transport.inboxes
+    print("Test successful!")
+
+
+def test_nak_and_release():
+    print("--- Testing NAK during renewal and explicit release ---")
+    manager, transport = _manager_at(0)
+    manager.add(Lease("0a:0b:0c:0d:0e:02", "10.0.0.52", "10.0.0.1", lease_time=100, acquired_at=0))
+    manager.add(Lease("0a:0b:0c:0d:0e:03", "10.0.0.53", "10.0.0.1", lease_time=100, acquired_at=0))
+    manager.tick(50)
+    transport.reply(transport.sent[0][1], DHCPNAK)
+    manager.tick(51)
+    assert manager.get("0a:0b:0c:0d:0e:02") is None
+
+    released = manager.release("0a:0b:0c:0d:0e:03")
+    assert released.state == INIT and len(manager) == 0
+    assert transport.sent[-1][1].options[53] == DHCPRELEASE
+    print("Test successful!")
+
+
+def test_malformed_renewal_ack():
+    print("--- Testing a malformed ACK during renewal ---")
+    manager, transport = _manager_at(0)
+    manager.add(Lease("0a:0b:0c:0d:0e:04", "10.0.0.54", "10.0.0.1", lease_time=100, acquired_at=0))
+    manager.tick(50)
+    request = transport.sent[-1][1]
+    transport.reply(request, DHCPACK, t1=400)
+    # dropped like a lost reply: the lease keeps renewing and the next ACK is taken
+    manager.tick(51)
+    lease = manager.get("0a:0b:0c:0d:0e:04")
+    assert lease.state == RENEWING and lease.xid == request.xid
+    transport.reply(request, DHCPACK)
+    manager.tick(52)
+    assert lease.state == BOUND and lease.expires_at == 51 + 1000
+    print("Test successful!")
+
+
+def run_tests():
+    test_timer_wheel_fires_in_order()
+    test_renew_at_t1()
+    test_rebind_then_expire()
+    test_nak_and_release()
+    test_malformed_renewal_ack()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_lease_manager
+
+The state machine is driven with a fake clock, so the test finishes instantly and needs no network.
+
+"""
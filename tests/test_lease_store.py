@@ -0,0 +1,166 @@
+# test_lease_store.py
+
+import os
+import tempfile
+import time
+from dhcp_logic.dhcp_message import DHCPMessage, DHCPRELEASE
+from dhcp_logic.lease import Lease, INIT, RENEWING
+from dhcp_logic.lease_manager import LeaseManager
+from dhcp_logic.lease_store import LeaseStore
+from dhcp_logic.timer_wheel import TimerWheel
+
+
+def _lease(i: int, acquired_at: float = 1000.0) -> Lease:
+    return Lease(f"02:00:00:{i >> 16 & 0xff:02x}:{i >> 8 & 0xff:02x}:{i & 0xff:02x}",
+                 f"10.{i >> 16 & 0xff}.{i >> 8 & 0xff}.{i & 0xff}", "10.255.255.1",
+                 xid=i, lease_time=3600, acquired_at=acquired_at)
+
+
+def test_journal_survives_restart_and_torn_tail():
+    print("--- Testing journal replay and torn-record recovery ---")
+    with tempfile.TemporaryDirectory() as directory:
+        store = LeaseStore(directory)
+        store.load()
+        for i in range(10):
+            store.put(_lease(i))
+        store.delete(_lease(3).mac_addr_str)
+        store.close()
+
+        # simulate a crash halfway through writing the next record
+        with open(store.journal_path, 'ab') as f:
+            f.write(b'\x12\x34\x56')
+
+        reopened = LeaseStore(directory)
+        leases = reopened.load()
+        assert len(leases) == 9 and _lease(3).mac_addr_str not in leases
+        restored = leases[_lease(7).mac_addr_str]
+        assert (restored.ip, restored.server_id, restored.xid) == ("10.0.0.7", "10.255.255.1", 7)
+        assert (restored.renew_at, restored.rebind_at, restored.expires_at) == (2800.0, 4150.0, 4600.0)
+
+        # appending after recovery must still produce a readable journal
+        reopened.put(_lease(42))
+        reopened.close()
+        assert len(LeaseStore(directory).load()) == 10
+    print("Test successful!")
+
+
+def test_compaction_and_fast_startup():
+    print("--- Testing snapshot compaction and loading 100k leases ---")
+    with tempfile.TemporaryDirectory() as directory:
+        store = LeaseStore(directory, compact_every=1000000)
+        store.load()
+        store.leases = {lease.mac_addr_str: lease for lease in map(_lease, range(100000))}
+        store.compact()
+        store.put(_lease(100000))
+        store.close()
+        assert os.path.getsize(store.journal_path) > 0
+
+        started = time.perf_counter()
+        leases = LeaseStore(directory).load()
+        elapsed = time.perf_counter() - started
+        print(f"Loaded {len(leases)} leases in {elapsed:.3f}s")
+        assert len(leases) == 100001
+        assert elapsed < 1.0
+    print("Test successful!")
+
+
+def test_manager_resumes_renewing_after_restart():
+    print("--- Testing LeaseManager.restore() ---")
+    with tempfile.TemporaryDirectory() as directory:
+        store = LeaseStore(directory)
+        store.load()
+        manager = LeaseManager(transport=object(), store=store)
+        manager.wheel = TimerWheel(now=1000)
+        manager.add(_lease(1, acquired_at=1000))
+        manager.add(_lease(2, acquired_at=1000))
+        manager.remove(_lease(2).mac_addr_str)
+        store.close()
+        # only the lease that is still held should have been journaled as live
+        assert list(LeaseStore(directory).load()) == [_lease(1).mac_addr_str]
+
+        # restart well past T1 (2800), but before the lease expires
+        sent = []
+        class _Transport:
+            def register(self, chaddr, xid=None, inbox=None): return 99, inbox
+            def unregister(self, xid): pass
+            def unicast(self, packet, server_ip): sent.append(server_ip)
+
+        restarted = LeaseManager(transport=_Transport(), store=LeaseStore(directory))
+        restarted.wheel = TimerWheel(now=3000)
+        assert restarted.restore() == 1
+        assert restarted.get(_lease(1).mac_addr_str).state == RENEWING
+        assert sent == ["10.255.255.1"]
+    print("Test successful!")
+
+
+def test_one_delete_per_lease():
+    print("--- Testing that release and expiry journal one delete ---")
+    with tempfile.TemporaryDirectory() as directory:
+        store = LeaseStore(directory)
+        store.load()
+        deletes = []
+        delete = store.delete
+        store.delete = lambda mac: (deletes.append(mac), delete(mac))
+
+        sent = []
+        class _Transport:
+            def unicast(self, packet, server_ip): sent.append(DHCPMessage.unpack(packet).options[53])
+
+        manager = LeaseManager(transport=_Transport(), store=store)
+        manager.wheel = TimerWheel(now=1000)
+        manager.add(_lease(1, acquired_at=1000))
+        manager.add(_lease(2, acquired_at=1000))
+        records = store._journal_records
+        assert manager.release(_lease(1).mac_addr_str).state == INIT and sent == [DHCPRELEASE]
+        # as the expiry timer of lease 2 would
+        manager._expire(manager.get(_lease(2).mac_addr_str))
+        assert deletes == [_lease(1).mac_addr_str, _lease(2).mac_addr_str]
+        assert store._journal_records == records + 2 and len(store) == 0
+        store.close()
+    print("Test successful!")
+
+
+def test_one_writer_per_directory():
+    print("--- Testing the lock on the lease directory ---")
+    with tempfile.TemporaryDirectory() as directory:
+        store = LeaseStore(directory)
+        store.load()
+        # a second writer fails right away instead of interleaving its records
+        try:
+            LeaseStore(directory)
+            assert False, "a second store opened a locked directory"
+        except RuntimeError as ex:
+            assert "in use" in str(ex)
+        store.put(_lease(1))
+        store.close()
+
+        reopened = LeaseStore(directory)
+        assert list(reopened.load()) == [_lease(1).mac_addr_str]
+        reopened.close()
+        # and a closed store takes the lock again when it is loaded
+        assert list(store.load()) == [_lease(1).mac_addr_str]
+        store.close()
+    print("Test successful!")
+
+
+def run_tests():
+    test_journal_survives_restart_and_torn_tail()
+    test_compaction_and_fast_startup()
+    test_manager_resumes_renewing_after_restart()
+    test_one_delete_per_lease()
+    test_one_writer_per_directory()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_lease_store
+
+"""
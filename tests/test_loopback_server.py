@@ -0,0 +1,101 @@
+# test_loopback_server.py
+
+import time
+from dhcp_logic.backoff import retransmit_delays
+from dhcp_logic.bulk import acquire_many, release_many
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_transport import DHCPTransport
+from dhcp_logic.loopback_server import LoopbackDHCPServer, ServerProfile
+
+SERVER_PORT = 16790
+CLIENT_PORT = 16791
+
+
+def _transport():
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+    transport.open()
+    return transport
+
+
+def _fast_backoff():
+    return retransmit_delays(initial=0.05, maximum=0.2, jitter=0)
+
+
+def test_dora_without_root():
+    print("--- Testing a full D-O-R-A against the loopback server ---")
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server:
+        transport = _transport()
+        try:
+            client = DHCPClient("0A:0B:0C:0D:0E:0F", transport=transport)
+            assert client.request_ip_address() == "10.99.0.1"
+            assert client.lease.lease_time == 3600 and client.lease.server_id == "127.0.0.1"
+            assert server.stats["discovers"] == 1 and server.stats["acks"] == 1
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def test_loss_and_naks():
+    print("--- Testing injected loss and NAKs ---")
+    profile = ServerProfile(loss=0.3, nak_rate=0.2, latency=0.005, jitter=0.005)
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=[profile], seed=7) as server:
+        transport = _transport()
+        try:
+            macs = [f"02:00:00:06:00:{i:02x}" for i in range(100)]
+            result = acquire_many(macs, concurrency=20, transport=transport, timeout=3, backoff=_fast_backoff)
+        finally:
+            transport.close()
+
+    assert server.stats["dropped"] > 0 and server.stats["naks"] > 0
+    assert len(result.leases) + len(result.failed) == 100
+    assert all("NAK" in reason for reason in result.failed.values())
+    assert len(result.failed) == server.stats["naks"]
+    print(f"Test successful: {len(result.leases)} leases, {len(result.failed)} NAKs, "
+          f"{server.stats['dropped']} packets lost and recovered.")
+
+
+def test_competing_servers():
+    print("--- Testing two competing servers ---")
+    fast = ServerProfile(server_id="127.0.0.2", pool="10.50.0.0")
+    slow = ServerProfile(server_id="127.0.0.3", pool="10.60.0.0", latency=0.2)
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=[fast, slow]) as server:
+        transport = _transport()
+        try:
+            result = acquire_many([f"02:00:00:07:00:{i:02x}" for i in range(10)], transport=transport, timeout=3)
+            assert server.stats["offers"] == 20
+            # the first OFFER wins, and only that server commits the lease
+            assert all(lease.server_id == "127.0.0.2" for lease in result.leases)
+            assert len(fast.leases) == 10 and not slow.leases
+
+            # releases are unicast to the server id, which loopback delivers to the right profile
+            assert release_many(result.leases, transport=transport) == {}
+            for _ in range(50):
+                if len(fast.released) == 10: break
+                time.sleep(0.02)
+            assert sorted(fast.released) == sorted(lease.ip for lease in result.leases)
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def run_tests():
+    test_dora_without_root()
+    test_loss_and_naks()
+    test_competing_servers()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_loopback_server
+
+No sudo or DHCP server is needed: the server runs in-process on loopback ports.
+
+"""
@@ -0,0 +1,145 @@
+# test_metrics.py
+
+import logging
+import time
+from dhcp_logic.backoff import retransmit_delays
+from dhcp_logic.bulk import acquire_many
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_transport import DHCPTransport
+from dhcp_logic.loopback_server import LoopbackDHCPServer, ServerProfile
+from dhcp_logic.metrics import (MetricsRegistry, REGISTRY, MESSAGES_SENT, MESSAGES_RECEIVED, OFFER_LATENCY,
+                                ACK_LATENCY, TIMEOUTS, NON_MATCHING, IN_FLIGHT, _Metric)
+
+SERVER_PORT = 16798
+CLIENT_PORT = 16799
+
+
+def test_prometheus_rendering():
+    print("--- Testing the Prometheus text format ---")
+    registry = MetricsRegistry()
+    sent = registry.counter('test_sent', "Packets sent.", ('type',))
+    sent.labels('discover').inc()
+    sent.labels('discover').inc(2)
+    latency = registry.histogram('test_latency_seconds', "Latency.", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+    gauge = registry.gauge('test_inflight', "In flight.")
+    gauge.inc(3)
+    gauge.dec()
+
+    text = registry.render()
+    print(text)
+    assert '# TYPE test_sent counter' in text
+    assert 'test_sent_total{type="discover"} 3' in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count 3' in text
+    assert 'test_inflight 2' in text
+
+    # registering the same name again returns the existing metric
+    assert registry.counter('test_sent', "Packets sent.", ('type',)) is sent
+    gauge.set_function(lambda: 42)
+    assert 'test_inflight 42' in registry.render()
+
+    # a metric type missing its sample methods fails when created, not when scraped
+    try:
+        type("Incomplete", (_Metric,), {'kind': 'untyped'})('test_incomplete', "Incomplete.")
+        assert False, "an incomplete metric type should not be instantiable"
+    except TypeError:
+        pass
+    print("Test successful!")
+
+
+def test_dora_is_counted():
+    print("--- Testing metrics of D-O-R-A against the loopback server ---")
+    discovers, offers = MESSAGES_SENT.value('discover'), MESSAGES_RECEIVED.value('offer')
+    acks, offer_count, ack_count = MESSAGES_RECEIVED.value('ack'), OFFER_LATENCY.count(), ACK_LATENCY.count()
+    unclaimed, in_flight = NON_MATCHING.value('unknown_xid'), IN_FLIGHT.value()
+
+    # two servers answer every DISCOVER, so the slower OFFERs arrive after their transaction ended
+    profiles = [ServerProfile(server_id="127.0.0.1", pool="10.99.0.0"),
+                ServerProfile(server_id="127.0.0.2", pool="10.98.0.0", latency=0.05)]
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=profiles):
+        transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+        transport.open()
+        try:
+            client = DHCPClient("0A:0B:0C:0D:0E:10", transport=transport)
+            assert client.request_ip_address() is not None
+            result = acquire_many([f"02:00:00:00:01:{i:02x}" for i in range(20)], transport=transport)
+            assert len(result.leases) == 20
+            assert transport.pending() == 0 and IN_FLIGHT.value() == in_flight
+            time.sleep(0.2) # let the slower server's OFFERs arrive
+        finally:
+            transport.close()
+
+    assert MESSAGES_SENT.value('discover') - discovers == 21
+    assert MESSAGES_RECEIVED.value('offer') - offers >= 21
+    assert MESSAGES_RECEIVED.value('ack') - acks == 21
+    assert OFFER_LATENCY.count() - offer_count == 21
+    assert ACK_LATENCY.count() - ack_count == 21
+    assert NON_MATCHING.value('unknown_xid') - unclaimed > 0
+
+    text = REGISTRY.render()
+    assert 'dhcp_messages_sent_total{type="discover"}' in text
+    assert 'dhcp_ack_latency_seconds_bucket{le="+Inf"}' in text
+    print("Test successful!")
+
+
+def test_timeouts_are_counted():
+    print("--- Testing the timeout counter ---")
+    timeouts = TIMEOUTS.value('offer')
+    # no server listens on this port
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+    transport.open()
+    try:
+        client = DHCPClient("0A:0B:0C:0D:0E:11", transport=transport, timeout=0.3,
+                            backoff=lambda: retransmit_delays(initial=0.1, maximum=0.1, jitter=0))
+        assert client.request_ip_address() is None
+    finally:
+        transport.close()
+    assert TIMEOUTS.value('offer') - timeouts == 1
+    print("Test successful!")
+
+
+def test_disabled_logging_skips_formatting():
+    print("--- Testing that disabled log levels cost nothing ---")
+    calls = []
+
+    class Expensive:
+        def __str__(self):
+            calls.append(1)
+            return "expensive"
+
+    logger = logging.getLogger('dhcp_logic.dhcp_client')
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        logger.info("[O] Received DHCPOFFER from %s", Expensive())
+    finally:
+        logger.setLevel(level)
+    assert calls == []
+    print("Test successful!")
+
+
+def run_tests():
+    test_prometheus_rendering()
+    test_dora_is_counted()
+    test_timeouts_are_counted()
+    test_disabled_logging_skips_formatting()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_metrics
+
+"""
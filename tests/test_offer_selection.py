@@ -0,0 +1,134 @@
+# test_offer_selection.py
+
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_message import DHCPMessage, BOOTREPLY, DHCPOFFER
+from dhcp_logic.dhcp_transport import DHCPTransport
+from dhcp_logic.loopback_server import LoopbackDHCPServer, ServerProfile
+from dhcp_logic.offer_selection import (Offer, ServerStats, first_arrival, lowest_rtt, preferred_servers,
+                                        requested_ip)
+
+SERVER_PORT = 16800
+CLIENT_PORT = 16801
+
+
+def _offer(server_id: str, ip: str, rtt: float = None) -> Offer:
+    msg = DHCPMessage("02:00:00:00:00:01")
+    msg.op = BOOTREPLY
+    msg.yiaddr = ip
+    msg.options[53] = DHCPOFFER
+    msg.options[54] = server_id
+    return Offer(msg, (server_id, 67), rtt)
+
+
+def test_policies():
+    print("--- Testing offer selection policies ---")
+    stats = ServerStats()
+    a, b, c = _offer("10.0.0.1", "10.0.1.5", 0.030), _offer("10.0.0.2", "10.0.2.5", 0.010), _offer("10.0.0.3", "10.0.3.5")
+    offers = [a, b, c]
+
+    assert first_arrival(offers, stats) == [a, b, c]
+    # no history yet: the RTT of this very offer decides, and unknown RTTs go last
+    assert lowest_rtt(offers, stats) == [b, a, c]
+    assert preferred_servers(["10.0.0.3", "10.0.0.1"])(offers, stats) == [c, a, b]
+    assert requested_ip("10.0.2.5")(offers, stats) == [b, a, c]
+    assert requested_ip("10.9.9.9")(offers, stats) == [a, b, c]
+
+    # a server that keeps NAKing costs more than a slightly slower one
+    for _ in range(10):
+        stats.observe_reply("10.0.0.2", nak=True, rtt=0.010)
+        stats.observe_reply("10.0.0.1", nak=False, rtt=0.030)
+    assert lowest_rtt(offers, stats)[0] is a
+    print(stats.to_dict())
+    print("Test successful!")
+
+
+def test_server_stats_ewma():
+    print("--- Testing the per-server EWMA ---")
+    stats = ServerStats(alpha=0.5)
+    stats.observe_offer("s", 0.100)
+    stats.observe_offer("s", 0.200)
+    assert abs(stats.rtt("s") - 0.150) < 1e-9
+    stats.observe_reply("s", nak=True)
+    assert stats.nak_rate("s") == 0.5
+    stats.observe_reply("s", nak=False)
+    assert stats.nak_rate("s") == 0.25
+    assert stats.rtt("unknown") is None and stats.cost("unknown") == float('inf')
+    assert stats.to_dict()["s"]["naks"] == 1 and stats.to_dict()["s"]["offers"] == 2
+    print("Test successful!")
+
+
+def test_collection_window():
+    print("--- Testing the OFFER collection window ---")
+    profiles = [ServerProfile(server_id="127.0.0.1", pool="10.99.0.0", latency=0.01),
+                ServerProfile(server_id="127.0.0.2", pool="10.98.0.0", latency=0.05)]
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=profiles) as server:
+        transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+        transport.open()
+        try:
+            # the slower server is preferred, so it wins although it answers last
+            client = DHCPClient("0A:0B:0C:0D:0E:20", transport=transport, offer_window=0.2,
+                                offer_policy=preferred_servers(["127.0.0.2"]), stats=ServerStats())
+            assert client.request_ip_address() == "10.98.0.1"
+            assert client.lease.server_id == "127.0.0.2"
+            assert [offer.server_id for offer in client.offers] == ["127.0.0.1"]
+            assert client.stats.rtt("127.0.0.1") < client.stats.rtt("127.0.0.2")
+
+            # lowest RTT now prefers the faster server, from history and from this window alike
+            client = DHCPClient("0A:0B:0C:0D:0E:21", transport=transport, offer_window=0.2,
+                                offer_policy=lowest_rtt, stats=client.stats)
+            assert client.request_ip_address() == "10.99.0.2"
+            assert server.stats["discovers"] == 2
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def test_failover_on_nak():
+    print("--- Testing failover to the next-best offer on NAK ---")
+    profiles = [ServerProfile(server_id="127.0.0.1", pool="10.99.0.0", nak_rate=1.0),
+                ServerProfile(server_id="127.0.0.2", pool="10.98.0.0", latency=0.02)]
+    events = []
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=profiles) as server:
+        transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+        transport.open()
+        try:
+            stats = ServerStats()
+            client = DHCPClient("0A:0B:0C:0D:0E:22", transport=transport, offer_window=0.1, stats=stats)
+            client.add_listener(lambda event: events.append(event.type))
+            assert client.request_ip_address() == "10.98.0.1"
+            assert client.lease.server_id == "127.0.0.2"
+            # the second server was asked without starting over
+            assert server.stats["discovers"] == 1 and server.stats["naks"] == 1 and server.stats["acks"] == 1
+            assert stats.nak_rate("127.0.0.1") > 0 and stats.nak_rate("127.0.0.2") == 0
+            assert events == ["discover_sent", "offer_received", "request_sent", "nak_received",
+                              "request_sent", "ack_received"]
+
+            # without a window there is nothing to fall back on
+            client = DHCPClient("0A:0B:0C:0D:0E:23", transport=transport, timeout=2, stats=stats)
+            assert client.request_ip_address() is None
+            assert client.state == "FAILED: Server denied the request (NAK)."
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def run_tests():
+    test_policies()
+    test_server_stats_ewma()
+    test_collection_window()
+    test_failover_on_nak()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_offer_selection
+
+"""
@@ -0,0 +1,145 @@
+# test_packet_transport.py
+
+import socket
+import time
+from dhcp_logic.bulk import release_many
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_message import DHCPMessage, DHCPDISCOVER
+from dhcp_logic.frames import BROADCAST_MAC, udp_payload
+from dhcp_logic.loopback_server import LoopbackDHCPServer, ServerProfile
+from dhcp_logic.metrics import MALFORMED
+from dhcp_logic.packet_transport import PacketTransport, udp_port_filter
+
+SERVER_PORT = 16808
+CLIENT_PORT = 16809
+
+
+def _packet_sockets_available() -> bool:
+    # AF_PACKET is Linux-only and needs CAP_NET_RAW
+    try:
+        socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0).close()
+        return True
+    except (AttributeError, OSError):
+        return False
+
+
+def _local_address() -> str:
+    # frames injected on lo go through input routing, which drops 127.0.0.0/8 as a
+    # destination (route_localnet=0); a unicast test needs one of the host's own addresses
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect(("192.0.2.1", 9))
+        address = probe.getsockname()[0]
+    except OSError:
+        return None
+    finally:
+        probe.close()
+    return None if address.startswith("127.") else address
+
+
+def _transport():
+    transport = PacketTransport(interface="lo", client_port=CLIENT_PORT, server_port=SERVER_PORT,
+                                broadcast_address="255.255.255.255")
+    transport.open()
+    return transport
+
+
+def test_frame_per_virtual_client():
+    print("--- Testing the frames built for each virtual client ---")
+    transport = PacketTransport(interface="lo", client_port=CLIENT_PORT, server_port=SERVER_PORT)
+    msg = DHCPMessage("0a:0b:0c:0d:0e:40")
+    msg.options[53] = DHCPDISCOVER
+    frame = transport.frame(msg.pack(), ('<broadcast>', SERVER_PORT))
+    # the virtual client's own MAC at the Ethernet layer, no IP address yet
+    assert frame[:6] == BROADCAST_MAC and frame[6:12] == bytes.fromhex("0a0b0c0d0e40")
+    assert udp_payload(frame)[:4] == ("0.0.0.0", "255.255.255.255", CLIENT_PORT, SERVER_PORT)
+
+    # once a server's MAC is known, unicasts go straight to it, from the leased address
+    msg.ciaddr = "10.99.0.5"
+    transport.neighbours["10.99.0.254"] = bytes.fromhex("020000000001")
+    frame = transport.frame(msg.pack(), ("10.99.0.254", SERVER_PORT))
+    assert frame[:6] == bytes.fromhex("020000000001")
+    assert udp_payload(frame)[:2] == ("10.99.0.5", "10.99.0.254")
+    assert len(udp_port_filter(68)) == 11
+    print("Test successful!")
+
+
+def test_kernel_filter():
+    print("--- Testing that the BPF filter drops other traffic ---")
+    if not _packet_sockets_available():
+        print("AF_PACKET sockets are not available here; skipped.")
+        return
+    transport = _transport()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        before = MALFORMED.value()
+        # not the client port: filtered out before Python sees it
+        for _ in range(50):
+            sender.sendto(b'not dhcp', ("127.0.0.1", CLIENT_PORT + 100))
+        time.sleep(0.2)
+        assert MALFORMED.value() == before
+
+        # the client port gets through, and is rejected by the decoder
+        sender.sendto(b'not dhcp', ("127.0.0.1", CLIENT_PORT))
+        for _ in range(100):
+            if MALFORMED.value() > before:
+                break
+            time.sleep(0.01)
+        assert MALFORMED.value() == before + 1
+    finally:
+        sender.close()
+        transport.close()
+    print("Test successful!")
+
+
+def test_dora_over_packet_socket():
+    print("--- Testing D-O-R-A and RELEASE over a packet socket on lo ---")
+    if not _packet_sockets_available():
+        print("AF_PACKET sockets are not available here; skipped.")
+        return
+    server_id = _local_address()
+    profile = ServerProfile(server_id=server_id or "127.0.0.1")
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=[profile]) as server:
+        transport = _transport()
+        try:
+            client = DHCPClient("0A:0B:0C:0D:0E:41", transport=transport, timeout=5)
+            assert client.request_ip_address() == "10.99.0.1"
+            # the MAC replies come from is learned per source address
+            assert "127.0.0.1" in transport.neighbours
+
+            client = DHCPClient("0A:0B:0C:0D:0E:42", transport=transport, timeout=5)
+            assert client.request_ip_address() == "10.99.0.2"
+            if server_id is None:
+                print("No non-loopback address to unicast to; RELEASE skipped.")
+                return
+            # unicast from the leased address
+            assert release_many([client.lease], transport=transport) == {}
+            for _ in range(100):
+                if profile.released:
+                    break
+                time.sleep(0.01)
+            assert profile.released == ["10.99.0.2"]
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def run_tests():
+    test_frame_per_virtual_client()
+    test_kernel_filter()
+    test_dora_over_packet_socket()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal (as root, for AF_PACKET).
+2.  Run the script with the following command:
+
+    python -m tests.test_packet_transport
+
+"""
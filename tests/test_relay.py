@@ -0,0 +1,77 @@
+# test_relay.py
+
+from dhcp_logic.bulk import acquire_many
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_message import DHCPMessage, DHCPDISCOVER
+from dhcp_logic.dhcp_options import RELAY_AGENT_INFORMATION, AGENT_CIRCUIT_ID, AGENT_REMOTE_ID
+from dhcp_logic.loopback_server import LoopbackDHCPServer
+from dhcp_logic.relay import RelayTransport, VirtualSubnet
+
+SERVER_PORT = 16796
+RELAY_PORT = 16797
+
+
+def test_relay_stamps_requests():
+    print("--- Testing giaddr, hops and option 82 on relayed packets ---")
+    subnet = VirtualSubnet("10.20.30.1", circuit_id="vlan30", remote_id=b"\x00\x11\x22\x33\x44\x55")
+    transport = RelayTransport(["127.0.0.1"], [subnet], client_port=RELAY_PORT, server_port=SERVER_PORT)
+    discover = DHCPMessage("0A:0B:0C:0D:0E:0F")
+    discover.options[53] = DHCPDISCOVER
+
+    relayed = DHCPMessage.unpack(transport.relay(discover.pack(), subnet))
+    assert relayed.hops == 1 and relayed.giaddr == "10.20.30.1"
+    assert relayed.options[53] == DHCPDISCOVER
+    assert relayed.options[RELAY_AGENT_INFORMATION] == {AGENT_CIRCUIT_ID: b"vlan30",
+                                                        AGENT_REMOTE_ID: b"\x00\x11\x22\x33\x44\x55"}
+    assert list(relayed.options)[-1] == RELAY_AGENT_INFORMATION
+
+    # a second relay keeps the first giaddr
+    again = DHCPMessage.unpack(transport.relay(relayed.pack(), VirtualSubnet("10.99.0.1")))
+    assert again.hops == 2 and again.giaddr == "10.20.30.1"
+    print("Test successful!")
+
+
+def test_many_subnets_through_one_socket():
+    print("--- Testing D-O-R-A for many subnets without broadcasts ---")
+    # every 127.0.0.0/8 address is local, so the loopback server can answer each giaddr
+    subnets = VirtualSubnet.many("127.0.1.1", 50)
+    assert subnets[1].giaddr == "127.0.2.1" and subnets[49].circuit_id == "subnet-49"
+
+    with LoopbackDHCPServer(port=SERVER_PORT) as server:
+        transport = RelayTransport(["127.0.0.1"], subnets, client_port=RELAY_PORT, server_port=SERVER_PORT)
+        transport.open()
+        try:
+            macs = [f"02:00:00:0b:{i // 256:02x}:{i % 256:02x}" for i in range(500)]
+            result = acquire_many(macs, concurrency=64, transport=transport, timeout=5)
+            assert len(result.leases) == 500 and not result.failed
+            assert len(server.relayed) == 50 and sum(server.relayed.values()) == 1000
+
+            chaddr = DHCPMessage("02:00:00:0c:00:01").chaddr
+            transport.assign(chaddr, subnets[7])
+            assert transport.subnet_for(chaddr) is subnets[7]
+            pinned = DHCPClient("02:00:00:0c:00:01", transport=transport)
+            assert pinned.request_ip_address() is not None
+            assert pinned.lease.options[RELAY_AGENT_INFORMATION][AGENT_CIRCUIT_ID] == b"subnet-7"
+        finally:
+            transport.close()
+    print("Test successful: 500 leases over 50 relayed subnets.")
+
+
+def run_tests():
+    test_relay_stamps_requests()
+    test_many_subnets_through_one_socket()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_relay
+
+"""
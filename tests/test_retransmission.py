@@ -0,0 +1,121 @@
+# test_retransmission.py
+
+import queue
+import time
+from dhcp_logic.backoff import retransmit_delays
+from dhcp_logic.bulk import acquire_many
+from dhcp_logic.dhcp_client import DHCPClient
+from dhcp_logic.dhcp_message import DHCPMessage, BOOTREPLY, DHCPDISCOVER, DHCPOFFER, DHCPACK
+
+
+def _fast_backoff():
+    return retransmit_delays(initial=0.05, maximum=0.2, jitter=0)
+
+
+class _LossyTransport:
+    """Stands in for DHCPTransport: drops the first `drop` copies of every packet and answers the rest."""
+
+    def __init__(self, drop: int = 1, noise: bool = False, silent: bool = False):
+        self.socket = object()
+        self.drop = drop
+        self.noise = noise # also deliver a stray OFFER while waiting for the ACK
+        self.silent = silent
+        self.seen = {}
+        self.inboxes = {}
+        self._next_xid = 1
+
+    def open(self):
+        pass
+
+    def register(self, chaddr, xid=None, inbox=None):
+        xid, self._next_xid = self._next_xid, self._next_xid + 1
+        self.inboxes[xid] = inbox if inbox is not None else queue.Queue()
+        return xid, self.inboxes[xid]
+
+    def unregister(self, xid):
+        self.inboxes.pop(xid, None)
+
+    def broadcast(self, packet):
+        request = DHCPMessage.unpack(packet)
+        key = (request.xid, request.options[53])
+        self.seen[key] = self.seen.get(key, 0) + 1
+        if self.silent or self.seen[key] <= self.drop:
+            return
+
+        reply = DHCPMessage(request.chaddr_str)
+        reply.op = BOOTREPLY
+        reply.xid = request.xid
+        reply.yiaddr = f"10.3.0.{request.xid}"
+        reply.options[54] = "10.3.0.254"
+        if request.options[53] == DHCPDISCOVER:
+            reply.options[53] = DHCPOFFER
+        else:
+            if self.noise:
+                self.inboxes[request.xid].put((DHCPMessage.unpack(reply.pack()), ("10.3.0.254", 67)))
+            reply.options[53] = DHCPACK
+        self.inboxes[request.xid].put((DHCPMessage.unpack(reply.pack()), ("10.3.0.254", 67)))
+
+
+def test_backoff_schedule():
+    print("--- Testing the retransmission schedule ---")
+    delays = retransmit_delays(rng=lambda low, high: 0)
+    assert [next(delays) for _ in range(7)] == [2, 4, 8, 16, 32, 64, 64]
+
+    delays = retransmit_delays(rng=lambda low, high: low)
+    assert [next(delays) for _ in range(3)] == [1, 3, 7]
+    print("Test successful!")
+
+
+def test_lost_packets_are_retransmitted():
+    print("--- Testing recovery from a lost DISCOVER and a lost REQUEST ---")
+    client = DHCPClient("0A:0B:0C:0D:0E:0F", transport=_LossyTransport(drop=1, noise=True),
+                        timeout=5, backoff=_fast_backoff)
+    started = time.monotonic()
+    assert client.request_ip_address() == "10.3.0.1"
+    assert client.retransmissions == 2
+    assert time.monotonic() - started < 1
+    print("Test successful!")
+
+
+def test_budget_bounds_the_exchange():
+    print("--- Testing the overall timeout budget ---")
+    client = DHCPClient("0A:0B:0C:0D:0E:0F", transport=_LossyTransport(silent=True),
+                        timeout=0.3, backoff=_fast_backoff)
+    started = time.monotonic()
+    assert client.request_ip_address() is None
+    assert 0.3 <= time.monotonic() - started < 1
+    assert client.retransmissions >= 2
+    assert client.state == "FAILED: Timeout waiting for OFFER."
+    print("Test successful!")
+
+
+def test_bulk_retransmits():
+    print("--- Testing retransmission in the bulk driver ---")
+    macs = [f"02:00:00:05:00:{i:02x}" for i in range(50)]
+    transport = _LossyTransport(drop=2)
+    result = acquire_many(macs, concurrency=10, transport=transport, timeout=5, backoff=_fast_backoff)
+    assert len(result.leases) == 50 and not result.failed
+    assert all(count == 3 for count in transport.seen.values())
+    print("Test successful!")
+
+
+def run_tests():
+    test_backoff_schedule()
+    test_lost_packets_are_retransmitted()
+    test_budget_bounds_the_exchange()
+    test_bulk_retransmits()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_retransmission
+
+"""
@@ -0,0 +1,138 @@
+# test_task_store.py
+
+from dhcp_logic.task_store import MemoryTaskStore, RedisTaskStore, TaskRecord, TaskStore
+
+
+class _FakeClient:
+    def __init__(self):
+        self.state = "Waiting for OFFER..."
+        self.assigned_ip = None
+        self.server_id = None
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _DictRedis:
+    """Minimal stand-in for the redis-py hash commands the store uses."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k.encode(): str(v).encode() for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def delete(self, key):
+        self.hashes.pop(key, None)
+
+
+def test_finished_tasks_keep_only_their_outcome():
+    print("--- Testing that finished tasks drop the client ---")
+    store = MemoryTaskStore()
+    client = _FakeClient()
+    store.put(TaskRecord("task-1", client=client))
+    assert store.get("task-1").to_dict()["status"] == "Waiting for OFFER..."
+
+    client.state, client.assigned_ip, client.server_id = "SUCCESS", "10.0.0.5", "10.0.0.1"
+    store.finish("task-1")
+    record = store.get("task-1")
+    assert record.client is None
+    assert record.to_dict() == dict(status="SUCCESS", assigned_ip="10.0.0.5", server_id="10.0.0.1")
+    print("Test successful!")
+
+
+def test_lru_and_ttl_eviction():
+    print("--- Testing size and age limits ---")
+    clock = _FakeClock()
+    store = MemoryTaskStore(max_size=3, ttl=60, clock=clock)
+    for i in range(3):
+        store.put(TaskRecord(f"task-{i}", status="SUCCESS"))
+
+    store.get("task-0") # task-1 is now the least recently used
+    store.put(TaskRecord("task-3", status="SUCCESS"))
+    assert len(store) == 3
+    assert store.get("task-1") is None and store.get("task-0") is not None
+
+    clock.now += 61
+    assert store.get("task-0") is None
+    store.put(TaskRecord("task-4", status="SUCCESS"))
+    assert len(store) == 1
+    print("Test successful!")
+
+
+def test_ttl_slides_with_use():
+    print("--- Testing that reading a task restarts its time-to-live ---")
+    clock = _FakeClock()
+    store = MemoryTaskStore(max_size=10, ttl=60, clock=clock)
+    store.put(TaskRecord("old", status="SUCCESS"))
+    clock.now += 40
+    store.put(TaskRecord("fresh", status="SUCCESS"))
+    clock.now += 10
+    assert store.get("old") is not None # now behind "fresh" in LRU order, and used last
+
+    clock.now += 55 # 55 s after "old" was read, 65 s after "fresh" was written
+    store.put(TaskRecord("new", status="SUCCESS"))
+    assert len(store) == 2 and store.get("fresh") is None and store.get("old") is not None
+
+    clock.now += 61 # neither read nor written for over a minute: gone at the next eviction
+    store.put(TaskRecord("newest", status="SUCCESS"))
+    assert len(store) == 1
+
+    try:
+        type("Incomplete", (TaskStore,), {})()
+        assert False, "a TaskStore without its methods should not be instantiable"
+    except TypeError:
+        pass
+    print("Test successful!")
+
+
+def test_redis_backend_shares_finished_tasks():
+    print("--- Testing the Redis-compatible backend ---")
+    redis = _DictRedis()
+    worker_a = RedisTaskStore(redis, ttl=120)
+    worker_b = RedisTaskStore(redis, ttl=120)
+
+    client = _FakeClient()
+    worker_a.put(TaskRecord("task-9", client=client))
+    assert worker_b.get("task-9").status == "Waiting for OFFER..."
+
+    client.state, client.assigned_ip, client.server_id = "SUCCESS", "10.0.0.9", "10.0.0.1"
+    worker_a.finish("task-9")
+    assert len(worker_a) == 0
+    assert worker_b.get("task-9").to_dict() == dict(status="SUCCESS", assigned_ip="10.0.0.9", server_id="10.0.0.1")
+    assert redis.ttls["dhcp:task:task-9"] == 120
+    print("Test successful!")
+
+
+def run_tests():
+    test_finished_tasks_keep_only_their_outcome()
+    test_lru_and_ttl_eviction()
+    test_ttl_slides_with_use()
+    test_redis_backend_shares_finished_tasks()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_task_store
+
+"""
@@ -0,0 +1,163 @@
+# test_transmit_scheduler.py
+
+import threading
+import time
+from dhcp_logic.bulk import acquire_many
+from dhcp_logic.dhcp_message import DHCPMessage, DHCPDISCOVER, DHCPREQUEST, DHCPRELEASE
+from dhcp_logic.dhcp_transport import DHCPTransport
+from dhcp_logic.loopback_server import LoopbackDHCPServer
+from dhcp_logic.transmit_scheduler import TransmitScheduler
+
+SERVER_PORT = 16812
+CLIENT_PORT = 16813
+
+
+class _Recorder:
+    """Stands in for a transport's send: keeps (time, packet, addr) of everything sent."""
+
+    def __init__(self):
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, packet, addr):
+        with self.lock:
+            self.sent.append((time.monotonic(), DHCPMessage.unpack(bytes(packet)), addr))
+
+    def wait_for(self, count: int, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while len(self.sent) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.sent)
+
+
+def _packet(msg_type: int, xid: int, secs: int = 0) -> bytes:
+    msg = DHCPMessage("0A:0B:0C:0D:12:01")
+    msg.xid = xid
+    msg.secs = secs
+    msg.options[53] = msg_type
+    return msg.pack()
+
+
+def test_secs_field():
+    print("--- Testing the secs field ---")
+    recorder = _Recorder()
+    scheduler = TransmitScheduler(recorder).start()
+    server = ("127.0.0.1", 67)
+    scheduler.submit(_packet(DHCPDISCOVER, 1), server)
+    # the exchange started 5 s ago: the retransmitted DISCOVER says so
+    scheduler._exchanges[1][0] -= 5
+    scheduler.submit(_packet(DHCPDISCOVER, 1), server)
+    # the REQUEST after it repeats the DISCOVER's value, however long the OFFER took
+    scheduler._exchanges[1][0] -= 2
+    scheduler.submit(_packet(DHCPREQUEST, 1), server)
+    # RELEASE and DECLINE always carry 0
+    scheduler.submit(_packet(DHCPRELEASE, 2, secs=9), server)
+    assert [msg.secs for _, msg, _ in recorder.sent] == [0, 5, 5, 0]
+
+    # a new exchange starts from 0, and a finished one is forgotten
+    scheduler.submit(_packet(DHCPREQUEST, 3), server)
+    assert recorder.sent[-1][1].secs == 0
+    scheduler.forget(1)
+    assert 1 not in scheduler._exchanges
+    print("Test successful!")
+
+
+def test_global_rate():
+    print("--- Testing the global rate limit ---")
+    recorder = _Recorder()
+    scheduler = TransmitScheduler(recorder, rate=200).start()
+    try:
+        started = time.monotonic()
+        for xid in range(100):
+            scheduler.submit(_packet(DHCPDISCOVER, xid + 1), ("255.255.255.255", 67))
+        assert recorder.wait_for(100) == 100
+        elapsed = time.monotonic() - started
+    finally:
+        scheduler.stop()
+    stats = scheduler.to_dict()
+    print(f"100 packets at 200/s in {elapsed:.2f}s: {stats}")
+    # a burst of 10, then 90 more at 200/s
+    assert 0.35 < elapsed < 1.0
+    assert stats['sent'] == 100 and stats['peak_depth'] > 50 and stats['mean_wait'] > 0.1
+    print("Test successful!")
+
+
+def test_server_rate_and_replacement():
+    print("--- Testing per-server limits and retransmission replacement ---")
+    recorder = _Recorder()
+    scheduler = TransmitScheduler(recorder, server_rate=50).start()
+    try:
+        for xid in range(10):
+            scheduler.submit(_packet(DHCPREQUEST, xid + 1), ("10.0.0.1", 67))
+            scheduler.submit(_packet(DHCPREQUEST, xid + 101), ("10.0.0.2", 67))
+        # a retransmission while the first copy waits is sent once
+        scheduler.submit(_packet(DHCPREQUEST, 10), ("10.0.0.1", 67))
+        assert recorder.wait_for(20) == 20
+        time.sleep(0.1)
+    finally:
+        scheduler.stop()
+    assert len(recorder.sent) == 20 and scheduler.replaced == 1
+    # each server gets its own 50/s: both take about 0.15 s, side by side
+    for server in ("10.0.0.1", "10.0.0.2"):
+        times = [at for at, _, addr in recorder.sent if addr[0] == server]
+        assert 0.1 < times[-1] - times[0] < 0.4
+    print("Test successful!")
+
+
+def test_start_jitter():
+    print("--- Testing start jitter ---")
+    recorder = _Recorder()
+    scheduler = TransmitScheduler(recorder, jitter=0.3, seed=1).start()
+    try:
+        started = time.monotonic()
+        for xid in range(50):
+            scheduler.submit(_packet(DHCPDISCOVER, xid + 1), ("255.255.255.255", 67))
+        assert recorder.wait_for(50) == 50
+    finally:
+        scheduler.stop()
+    offsets = sorted(at - started for at, _, _ in recorder.sent)
+    # spread over the jitter window instead of all at once
+    assert offsets[0] < 0.05 and 0.2 < offsets[-1] < 0.4
+    assert sum(offset < 0.15 for offset in offsets) < 40
+    print("Test successful!")
+
+
+def test_paced_bulk_run():
+    print("--- Testing a paced bulk run against the loopback server ---")
+    macs = [f"0A:0B:0C:0D:13:{i:02X}" for i in range(50)]
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT) as server:
+        transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1",
+                                  transmit_rate=500, start_jitter=0.1)
+        transport.open()
+        try:
+            result = acquire_many(macs, concurrency=50, transport=transport, timeout=5)
+            stats = transport.scheduler.to_dict()
+        finally:
+            transport.close()
+    print(result.to_dict()['elapsed'], stats)
+    assert len(result.leases) == 50 and not result.failed
+    assert stats['paced'] and stats['sent'] == server.stats['discovers'] + server.stats['requests']
+    print("Test successful!")
+
+
+def run_tests():
+    test_secs_field()
+    test_global_rate()
+    test_server_rate_and_replacement()
+    test_start_jitter()
+    test_paced_bulk_run()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_transmit_scheduler
+
+"""
@@ -0,0 +1,139 @@
+# test_virtual_clients.py
+
+import time
+from dhcp_logic.bulk import acquire_many, release_many, PoolExhaustion, ACQUIRED, NO_OFFER, NAK
+from dhcp_logic.dhcp_transport import DHCPTransport
+from dhcp_logic.loopback_server import LoopbackDHCPServer, ServerProfile
+from dhcp_logic.rate_limit import TokenBucket
+from dhcp_logic.virtual_clients import VirtualClients, client_id_for
+
+SERVER_PORT = 16806
+CLIENT_PORT = 16807
+
+
+def _transport():
+    transport = DHCPTransport(client_port=CLIENT_PORT, server_port=SERVER_PORT, broadcast_address="127.0.0.1")
+    transport.open()
+    return transport
+
+
+def test_virtual_clients():
+    print("--- Testing the virtual client generator ---")
+    clients = VirtualClients(100000, seed=42)
+    macs = list(clients)
+    # unique, locally administered, and the same on every run and through indexing
+    assert len(set(macs)) == 100000
+    assert all(mac.startswith("02:") for mac in macs[:1000])
+    assert macs[12345] == clients[12345] == VirtualClients(100000, seed=42).mac(12345)
+    assert clients[-1] == macs[-1]
+    assert list(VirtualClients(10, seed=42, start=500)) == macs[500:510]
+    assert VirtualClients(10, seed=43)[0] != macs[0]
+
+    # a million clients cost nothing until they are read
+    huge = VirtualClients(10 ** 9, seed=1, prefix="02:00")
+    assert len(huge) == 10 ** 9 and huge[10 ** 9 - 1].startswith("02:00:")
+    for bad in (dict(count=1 << 32, prefix="02:00:00"), dict(count=1, prefix="01"), dict(count=1, client_id="uuid")):
+        try:
+            VirtualClients(**bad)
+            assert False, f"{bad} should be rejected"
+        except ValueError:
+            pass
+
+    assert client_id_for("0a:0b:0c:0d:0e:0f") == bytes.fromhex("010a0b0c0d0e0f")
+    duid = VirtualClients(1, client_id="duid").client_id("0a:0b:0c:0d:0e:0f")
+    assert duid[0] == 0xff and duid[5:9] == b'\x00\x03\x00\x01' and duid.endswith(bytes.fromhex("0a0b0c0d0e0f"))
+    print("Test successful!")
+
+
+def test_token_bucket():
+    print("--- Testing the token bucket ---")
+    now = [0.0]
+    bucket = TokenBucket(rate=10, burst=3, clock=lambda: now[0])
+    assert [bucket.try_take() for _ in range(4)] == [True, True, True, False]
+    assert abs(bucket.wait_time() - 0.1) < 1e-9
+    now[0] = 0.25 # 2.5 tokens back
+    assert bucket.try_take() and bucket.try_take() and not bucket.try_take()
+    now[0] = 10.0 # never more than the burst
+    assert sum(bucket.try_take() for _ in range(10)) == 3
+    print("Test successful!")
+
+
+def test_pool_exhaustion_tracking():
+    print("--- Testing pool exhaustion tracking ---")
+    pool = PoolExhaustion(window=4)
+    for outcome in [ACQUIRED] * 6 + [NAK] + [ACQUIRED] + [NO_OFFER] * 4:
+        pool.record(outcome)
+    report = pool.to_dict()
+    print(report)
+    assert report['first_nak']['leases'] == 6 and report['first_nak']['exchange'] == 7
+    assert report['first_no_offer']['leases'] == 7
+    assert report['no_offer'] == 4 and report['naks'] == 1
+    # the last window is all no-offers although the run as a whole is not
+    assert report['recent_no_offer_rate'] == 1.0 and report['no_offer_rate'] == round(4 / 12, 4)
+    assert report['samples'] == [(4, 4, 0.0), (8, 7, 0.0), (12, 7, 1.0)]
+    print("Test successful!")
+
+
+def test_rate_limited_bulk_until_pool_exhaustion():
+    print("--- Testing a rate-limited bulk run against a small pool ---")
+    clients = VirtualClients(30, seed=7)
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=[ServerProfile(pool_size=20)]):
+        transport = _transport()
+        try:
+            started = time.monotonic()
+            result = acquire_many(clients, concurrency=8, transport=transport, timeout=0.5, rate=60)
+            elapsed = time.monotonic() - started
+        finally:
+            transport.close()
+    pool = result.to_dict()['pool']
+    print(f"{elapsed:.2f}s {pool}")
+    assert len(result.leases) == 20 and len(result.failed) == 10
+    # 30 starts at 60/s with a burst of 3 take at least 0.45 s
+    assert elapsed >= 0.4
+    assert pool['first_no_offer']['leases'] == 20 and pool['no_offer'] == 10 and pool['first_nak'] is None
+    print("Test successful!")
+
+
+def test_client_ids():
+    print("--- Testing leases keyed by client id ---")
+    clients = VirtualClients(5, seed=3, client_id="duid")
+    profile = ServerProfile()
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=CLIENT_PORT, profiles=[profile]) as server:
+        transport = _transport()
+        try:
+            result = acquire_many(clients, transport=transport, timeout=5, client_ids=clients.client_id)
+            assert len(result.leases) == 5
+            # the server knows them by DUID, not by MAC
+            assert sorted(profile.leases) == sorted(clients.client_id(mac).hex() for mac in clients)
+
+            assert release_many(result.leases, transport=transport, client_ids=clients.client_id) == {}
+            while server.stats["releases"] < 5:
+                time.sleep(0.01)
+            time.sleep(0.05)
+            assert not profile.leases and len(profile.released) == 5
+        finally:
+            transport.close()
+    print("Test successful!")
+
+
+def run_tests():
+    test_virtual_clients()
+    test_token_bucket()
+    test_pool_exhaustion_tracking()
+    test_rate_limited_bulk_until_pool_exhaustion()
+    test_client_ids()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_virtual_clients
+
+"""
@@ -0,0 +1,142 @@
+# test_worker_pool.py
+
+import pickle
+import time
+from dhcp_logic.dhcp_transport import DHCPTransport, TransportConfig
+from dhcp_logic.loopback_server import LoopbackDHCPServer
+from dhcp_logic.virtual_clients import VirtualClients
+from dhcp_logic.worker_pool import WorkerPool, _Shard, shard_for
+
+SERVER_PORT = 16792
+FIRST_CLIENT_PORT = 16793
+
+
+def _broken_client_id(mac):
+    raise RuntimeError("no client id for you")
+
+
+def test_shards_are_stable_and_balanced():
+    print("--- Testing MAC partitioning ---")
+    macs = [f"02:00:00:08:{i // 256:02x}:{i % 256:02x}" for i in range(4000)]
+    shards = [shard_for(mac, 4) for mac in macs]
+    assert shard_for("02:00:00:08:00:01", 4) == shard_for("02-00-00-08-00-01".upper(), 4)
+    assert all(800 < shards.count(worker) < 1200 for worker in range(4))
+    print("Test successful!")
+
+
+def test_pool_acquires_and_releases():
+    print("--- Testing lease acquisition across two worker processes ---")
+    configs = [TransportConfig(client_port=FIRST_CLIENT_PORT + worker, server_port=SERVER_PORT,
+                               broadcast_address="127.0.0.1") for worker in range(2)]
+    macs = [f"02:00:00:09:{i // 256:02x}:{i % 256:02x}" for i in range(400)]
+    streamed = []
+
+    # the server answers each worker on the port its request came from
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=None) as server, WorkerPool(configs=configs) as pool:
+        result = pool.acquire(macs, concurrency=32, timeout=10, on_lease=streamed.append)
+        assert len(result.leases) == 400 and not result.failed
+        assert streamed == result.leases and len(result.lease_times) == 400
+        assert {lease.mac_addr_str for lease in result.leases} == set(macs)
+        assert all(lease.lease_time == 3600 and lease.renew_at - lease.acquired_at == 1800 for lease in result.leases)
+
+        assert pool.release(result.leases) == {}
+        for _ in range(50):
+            if server.stats["releases"] == 400: break
+            time.sleep(0.02)
+        assert server.stats["releases"] == 400
+    print(f"Test successful: 400 leases in {result.elapsed:.3f}s.")
+
+
+def test_virtual_clients_are_sharded_in_the_workers():
+    print("--- Testing VirtualClients generated shard by shard in the workers ---")
+    # a worker receives the population's spec, never its MACs
+    assert len(pickle.dumps(_Shard(VirtualClients(10 ** 9, seed=1, prefix="02:00"), 0, 4))) < 300
+    clients = VirtualClients(1000, seed=5)
+    shards = [_Shard(clients, worker, 3) for worker in range(3)]
+    # each worker generates only its own indexes, not the whole population
+    assert [len(shard) for shard in shards] == [334, 333, 333]
+    assert all(list(shard) == [clients[i] for i in range(worker, 1000, 3)] for worker, shard in enumerate(shards))
+    assert not _Shard(VirtualClients(2), 2, 3)
+
+    configs = [TransportConfig(client_port=FIRST_CLIENT_PORT + worker, server_port=SERVER_PORT,
+                               broadcast_address="127.0.0.1") for worker in range(2)]
+    clients = VirtualClients(200, seed=6, client_id="mac")
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=None), WorkerPool(configs=configs) as pool:
+        result = pool.acquire(clients, concurrency=32, timeout=10, client_ids=clients.client_id)
+    assert len(result.leases) == 200 and not result.failed
+    assert {lease.mac_addr_str for lease in result.leases} == set(clients)
+    print("Test successful!")
+
+
+def test_bind_failure_is_reported_per_mac():
+    print("--- Testing a worker that cannot bind ---")
+    configs = [TransportConfig(client_port=FIRST_CLIENT_PORT, interface="no-such-nic0")]
+    with WorkerPool(configs=configs) as pool:
+        result = pool.acquire(["02:00:00:0a:00:01"], timeout=1)
+    assert result.failed["02:00:00:0a:00:01"].startswith("ERROR: Could not bind")
+    print("Test successful!")
+
+
+def test_pool_survives_failed_batches_and_dead_workers():
+    print("--- Testing a batch that fails in a worker, and a worker that dies ---")
+    configs = [TransportConfig(client_port=FIRST_CLIENT_PORT + worker, server_port=SERVER_PORT,
+                               broadcast_address="127.0.0.1") for worker in range(2)]
+    macs = [f"02:00:00:0c:00:{i:02x}" for i in range(20)]
+    with LoopbackDHCPServer(port=SERVER_PORT, client_port=None), WorkerPool(configs=configs) as pool:
+        # an exception inside the bulk driver fails the batch, not the worker processes
+        pids = [process.pid for process in pool._processes]
+        result = pool.acquire(macs, timeout=2, client_ids=_broken_client_id)
+        assert sorted(result.failed) == sorted(macs) and not result.leases
+        assert all(reason.startswith("ERROR: DHCP worker failed") for reason in result.failed.values())
+        assert [process.pid for process in pool._processes] == pids
+
+        # a worker killed between batches is replaced by the next one
+        pool._processes[0].kill()
+        pool._processes[0].join()
+        result = pool.acquire(macs, timeout=5)
+        assert len(result.leases) == 20 and not result.failed
+        assert pool._processes[0].pid != pids[0] and all(process.is_alive() for process in pool._processes)
+    print("Test successful!")
+
+
+def test_shared_transport_next_to_pool():
+    print("--- Testing the shared transport alongside the worker processes ---")
+    # what app.py does with DHCP_WORKERS > 1: the parent's socket shares the port with the workers'
+    previous = DHCPTransport.shared_config()
+    DHCPTransport.configure(TransportConfig(client_port=FIRST_CLIENT_PORT + 2, server_port=SERVER_PORT,
+                                            broadcast_address="127.0.0.1", reuse_port=True))
+    try:
+        shared = DHCPTransport.shared()
+        with WorkerPool(workers=2) as pool:
+            # replies may land on any of the sockets, so only the binds are checked
+            result = pool.acquire([f"02:00:00:0b:00:{i:02x}" for i in range(4)], timeout=0.5)
+            assert not any(reason.startswith("ERROR") for reason in result.failed.values())
+            assert DHCPTransport.shared() is shared and shared.socket
+    finally:
+        DHCPTransport.shared().close()
+        DHCPTransport.configure(previous)
+    print("Test successful!")
+
+
+def run_tests():
+    test_shards_are_stable_and_balanced()
+    test_pool_acquires_and_releases()
+    test_virtual_clients_are_sharded_in_the_workers()
+    test_bind_failure_is_reported_per_mac()
+    test_pool_survives_failed_batches_and_dead_workers()
+    test_shared_transport_next_to_pool()
+
+
+if __name__ == "__main__":
+    run_tests()
+
+"""
+
+Run Test:
+
+1.  Make sure you are in your `dhcp-client` directory in the terminal.
+2.  Run the script with the following command:
+
+    python -m tests.test_worker_pool
+
+"""